@@ -3,14 +3,26 @@ ASGI config for alamana_repair project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server, e.g. ``uvicorn alamana_repair.asgi:application``
+or gunicorn with ``-k uvicorn.workers.UvicornWorker``. The tracking page and
+the dashboard and summary partials are async views: they wait for the
+database on the event loop instead of holding a worker thread. Compare both
+handlers with ``manage.py bench_load``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alamana_repair.settings')
 
 application = get_asgi_application()
+
+if settings.WARMUP_ON_START:
+    from alamana_repair.warmup import warm_up
+
+    warm_up()
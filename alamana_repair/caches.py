@@ -0,0 +1,59 @@
+"""
+Cache and session store profiles for alamana_repair.
+
+The cache is selected with the ``CACHE_PROFILE`` environment variable:
+
+* ``file`` (default) - a file cache in ``CACHE_DIR``, shared by every worker
+  process on the host.
+* ``locmem`` - in-process memory. Only for a single worker process: a logout
+  or user change in one process is not seen by the others.
+
+Both count their hits and misses for /metrics (repairs/metrics.py).
+
+Sessions and the logged-in user (repairs/auth.py) are cached there. Where
+sessions are stored is selected with ``SESSION_STORE``:
+
+* ``cached_db`` (default) - read from the cache and written through to the
+  database, so sessions survive a cache wipe or restart.
+* ``cache`` - the cache only; wiping it logs everyone out.
+* ``db`` - the database only, Django's default.
+"""
+
+import os
+
+CACHE_PROFILES = ('file', 'locmem')
+SESSION_STORES = ('cached_db', 'cache', 'db')
+
+# Sessions and cached users for every staff member, with plenty of headroom
+CACHE_MAX_ENTRIES = 5000
+
+
+def get_caches():
+    """Build settings.CACHES from the CACHE_PROFILE environment variable"""
+    profile = os.environ.get('CACHE_PROFILE', 'file')
+    if profile == 'file':
+        config = {
+            'BACKEND': 'repairs.metrics.MeteredFileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', '/var/tmp/alamanajo-cache'),
+        }
+    elif profile == 'locmem':
+        config = {
+            'BACKEND': 'repairs.metrics.MeteredLocMemCache',
+            'LOCATION': 'alamanajo',
+        }
+    else:
+        raise ValueError(
+            f"Unknown CACHE_PROFILE '{profile}'. Use one of: {', '.join(CACHE_PROFILES)}"
+        )
+    config['OPTIONS'] = {'MAX_ENTRIES': CACHE_MAX_ENTRIES}
+    return {'default': config}
+
+
+def get_session_engine():
+    """settings.SESSION_ENGINE for the SESSION_STORE environment variable"""
+    store = os.environ.get('SESSION_STORE', 'cached_db')
+    if store not in SESSION_STORES:
+        raise ValueError(
+            f"Unknown SESSION_STORE '{store}'. Use one of: {', '.join(SESSION_STORES)}"
+        )
+    return f'django.contrib.sessions.backends.{store}'
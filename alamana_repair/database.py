@@ -0,0 +1,159 @@
+"""
+Database connection profiles for alamana_repair.
+
+The profile is selected with the ``DATABASE_PROFILE`` environment variable:
+
+* ``sqlite`` (default) - the shop's SQLite file, tuned for concurrent staff
+  use: WAL journaling, a busy timeout, ``synchronous=NORMAL``, memory-mapped
+  I/O and a larger page cache, applied on every new connection.
+* ``sqlite-baseline`` - the untuned SQLite file, kept for benchmarking.
+* ``postgresql`` - PostgreSQL with a psycopg connection pool, configured
+  from the ``POSTGRES_*`` environment variables.
+
+Reporting reads (summaries, stats, exports) can go to a second database,
+selected with ``REPORTING_DATABASE_PROFILE`` - see repairs/reporting.py:
+
+* ``sqlite-snapshot`` - a copy of the SQLite file at ``REPORTING_SQLITE_PATH``,
+  refreshed by the scheduler's reporting_snapshot task.
+* ``postgresql-replica`` - a streaming replica at ``POSTGRES_REPLICA_HOST``.
+"""
+
+import os
+
+# PRAGMAs applied to every new SQLite connection
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SQLITE_MMAP_SIZE = 128 * 1024 * 1024  # 128MB
+SQLITE_CACHE_SIZE_KB = 16 * 1024  # 16MB (negative cache_size means KiB)
+
+SQLITE_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('busy_timeout', SQLITE_BUSY_TIMEOUT_MS),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', SQLITE_MMAP_SIZE),
+    ('cache_size', -SQLITE_CACHE_SIZE_KB),
+]
+
+# Persistent connections: reuse each worker's connection for 10 minutes and
+# check it is still usable before handing it to a new request.
+CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', 600))
+
+PROFILES = ('sqlite', 'sqlite-baseline', 'postgresql')
+
+REPORTING_ALIAS = 'reporting'
+REPORTING_PROFILES = ('sqlite-snapshot', 'postgresql-replica')
+
+
+def sqlite_init_command(pragmas=None):
+    """Build the init_command string that applies the SQLite PRAGMAs"""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    return ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas)
+
+
+def sqlite_config(name, tuned=True):
+    """Database settings for a SQLite file, with or without tuning"""
+    if not tuned:
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': name,
+        }
+
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': sqlite_init_command(),
+            'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+            # Take the write lock at BEGIN so concurrent writers queue on the
+            # busy timeout instead of failing with "database is locked" when
+            # a read transaction tries to upgrade.
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+
+
+def postgresql_config():
+    """Database settings for PostgreSQL with a psycopg connection pool"""
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'alamanajo_repair'),
+        'USER': os.environ.get('POSTGRES_USER', 'alamanajo'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # The pool owns the connections, so Django must not keep them itself
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.environ.get('POSTGRES_POOL_MIN', 2)),
+                'max_size': int(os.environ.get('POSTGRES_POOL_MAX', 10)),
+                'timeout': int(os.environ.get('POSTGRES_POOL_TIMEOUT', 10)),
+            },
+        },
+    }
+
+
+def get_database_config(profile, sqlite_name):
+    """Return the database settings for the given profile name"""
+    if profile == 'sqlite':
+        return sqlite_config(sqlite_name)
+    elif profile == 'sqlite-baseline':
+        return sqlite_config(sqlite_name, tuned=False)
+    elif profile == 'postgresql':
+        return postgresql_config()
+    raise ValueError(
+        f"Unknown DATABASE_PROFILE '{profile}'. Use one of: {', '.join(PROFILES)}"
+    )
+
+
+def get_databases(base_dir):
+    """Build settings.DATABASES from the DATABASE_PROFILE environment variable"""
+    profile = os.environ.get('DATABASE_PROFILE', 'sqlite')
+    sqlite_name = os.environ.get('SQLITE_PATH', base_dir / 'alamanajo_repair.db')
+    databases = {
+        'default': get_database_config(profile, sqlite_name),
+    }
+    reporting_profile = os.environ.get('REPORTING_DATABASE_PROFILE', '')
+    if reporting_profile:
+        databases[REPORTING_ALIAS] = get_reporting_config(reporting_profile, sqlite_name)
+    return databases
+
+
+def get_reporting_config(profile, sqlite_name):
+    """Return the settings for the read-only reporting database"""
+    if profile == 'sqlite-snapshot':
+        config = sqlite_config(os.environ.get('REPORTING_SQLITE_PATH', f'{sqlite_name}.reporting'))
+    elif profile == 'postgresql-replica':
+        config = postgresql_config()
+        config['HOST'] = os.environ.get('POSTGRES_REPLICA_HOST', config['HOST'])
+        config['PORT'] = os.environ.get('POSTGRES_REPLICA_PORT', config['PORT'])
+    else:
+        raise ValueError(
+            f"Unknown REPORTING_DATABASE_PROFILE '{profile}'. Use one of: {', '.join(REPORTING_PROFILES)}"
+        )
+    # Tests have no replica; reporting reads see the test database
+    config['TEST'] = {'MIRROR': 'default'}
+    return config
+
+
+def register_database(alias, config):
+    """Add a database alias at runtime (benchmarks, snapshots, replicas)"""
+    from django.db import connections
+
+    connections.settings[alias] = connections.configure_settings(
+        {'default': {}, alias: config}
+    )[alias]
+    return connections[alias]
+
+
+def unregister_database(alias):
+    """Close and forget a database alias added with register_database()"""
+    from django.db import connections
+
+    if alias in connections.settings:
+        connections[alias].close()
+        # Otherwise registering the alias again would hand back this closed connection
+        del connections[alias]
+        del connections.settings[alias]
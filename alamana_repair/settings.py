@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from . import caches, database, storages
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'alamana-jo-production-secret-key-change-this'
@@ -18,23 +20,38 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Keep first: compresses the finished response, after the ETag is computed
+    'repairs.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'repairs.sessions.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'repairs.reporting.ReportingStickinessMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Keep last: profiles the view behind the CSRF and auth checks
+    'repairs.middleware.PerformanceMiddleware',
 ]
 
 ROOT_URLCONF = 'alamana_repair.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to PerformanceMiddleware
+        'BACKEND': 'repairs.template_backends.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Project templates are loaded with indentation and comments stripped,
+            # once per process; app templates (admin) are loaded as they are
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'repairs.template_loaders.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -47,12 +64,29 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'alamana_repair.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'alamanajo_repair.db',
-    }
-}
+# Database profile is selected with the DATABASE_PROFILE environment variable
+# (sqlite, sqlite-baseline or postgresql) - see alamana_repair/database.py
+DATABASES = database.get_databases(BASE_DIR)
+
+# Summaries, stats and exports read from the 'reporting' database when one is
+# configured (REPORTING_DATABASE_PROFILE) - see repairs/reporting.py
+DATABASE_ROUTERS = ['repairs.reporting.ReportingRouter']
+REPORTING_MAX_LAG_SECONDS = int(os.environ.get('REPORTING_MAX_LAG_SECONDS', 900))
+REPORTING_STICKY_SECONDS = 300
+REPORTING_LAG_CHECK_SECONDS = 30
+
+# Worker threads (and connections) per process for the concurrent reads of
+# async views - see repairs/concurrency.py; 0 runs them on the request thread
+DB_READ_THREADS = int(os.environ.get('DB_READ_THREADS', 4))
+
+# Cache profile (file or locmem, CACHE_PROFILE) and session store (cached_db,
+# cache or db, SESSION_STORE) - see alamana_repair/caches.py
+CACHES = caches.get_caches()
+SESSION_ENGINE = caches.get_session_engine()
+
+# The logged-in user is cached for this long, and dropped when it is saved
+AUTHENTICATION_BACKENDS = ['repairs.auth.CachedModelBackend']
+AUTH_USER_CACHE_SECONDS = 300
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -75,6 +109,10 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/var/www/alamanajo.eu/media'
 
+# Photo storage (filesystem under MEDIA_ROOT, or an S3-compatible bucket,
+# PHOTO_STORAGE) - see alamana_repair/storages.py
+STORAGES = storages.get_storages()
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Login settings
@@ -92,6 +130,12 @@ SMS_GATEWAY_USERNAME = os.environ.get('SMS_USERNAME', '')
 SMS_GATEWAY_PASSWORD = os.environ.get('SMS_PASSWORD', '')
 SMS_GATEWAY_URL = 'https://api.sms-gate.app/3rdparty/v1/message'
 
+# Bearer tokens for the read-only JSON API (/api/jobs/), comma-separated
+API_TOKENS = [token for token in os.environ.get('API_TOKENS', '').split(',') if token]
+
+# Phone numbers without a country code are assumed to be Belgian
+PHONE_DEFAULT_COUNTRY_CODE = '32'
+
 # Alamana Jo Shop Information
 SHOP_NAME = "Alamana Jo"
 SHOP_ADDRESS = "Quellinstraat 45, 2018 Antwerpen"
@@ -107,16 +151,109 @@ ABANDONMENT_MONTHS = 3
 DIAGNOSTIC_FEE_MIN = 25
 DIAGNOSTIC_FEE_MAX = 50
 
-# File upload settings - INCREASED LIMITS FOR PHOTOS
-FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 52 * 1024 * 1024  # 52MB  
+# Archival of finished jobs (python manage.py archive_jobs)
+ARCHIVE_COMPLETED_AFTER_DAYS = 90
+ARCHIVE_BATCH_SIZE = 500
+
+# Online backups of the SQLite database and a manifest of MEDIA_ROOT
+# (python manage.py backup_db) - see repairs/backups.py. Copied 256 pages
+# (1MB at the default page size) per step, pausing between steps
+BACKUP_DIR = os.environ.get('BACKUP_DIR', '/var/backups/alamanajo')
+BACKUP_KEEP_LATEST = int(os.environ.get('BACKUP_KEEP_LATEST', 24))
+BACKUP_KEEP_DAILY = int(os.environ.get('BACKUP_KEEP_DAILY', 14))
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.01
+
+# Periodic sweeps (python manage.py run_scheduler), cron syntax in local time
+SCHEDULER_TASKS = {
+    'pickup_reminders': '*/15 9-18 * * *',
+    'abandonment_flags': '5 * * * *',
+    'rollup_refresh': '*/10 * * * *',
+    'expire_uploads': '30 3 * * *',
+    'reporting_snapshot': '*/5 * * * *',
+}
+SCHEDULER_LEASE_SECONDS = 600
+SCHEDULER_BATCH_SIZE = 200
+PICKUP_REMINDER_DAYS = [7, 14]
+
+# File upload settings
+# Photos go through the chunked upload endpoints (repairs/uploads.py); the
+# plain multipart fallback spools anything over 2.5MB to FILE_UPLOAD_TEMP_DIR
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB, form fields only
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000
 FILE_UPLOAD_TEMP_DIR = '/tmp'
 
+# Chunked photo uploads; the temp dir should be on disk, not tmpfs
+PHOTO_UPLOAD_TEMP_DIR = os.environ.get('PHOTO_UPLOAD_TEMP_DIR', '/var/tmp/alamanajo-uploads')
+PHOTO_UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB per PUT
+PHOTO_UPLOAD_MAX_SIZE = 50 * 1024 * 1024  # 50MB per photo
+PHOTO_UPLOAD_EXPIRY_HOURS = 24
+PHOTO_UPLOAD_WRITE_TIMEOUT = 300  # seconds before a chunk claimed by a PUT that died can be sent again
+
+# Cached PDF reports for periods that have ended (repairs/reports.py)
+REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR', '/var/tmp/alamanajo-reports')
+
 # Image processing settings
 IMAGE_MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB per image
 IMAGE_MAX_TOTAL_SIZE = 50 * 1024 * 1024  # 50MB total
 
+# Performance instrumentation (repairs.middleware.PerformanceMiddleware)
+PERF_SLOW_REQUEST_MS = int(os.environ.get('PERF_SLOW_REQUEST_MS', 500))
+PERF_PROFILE_SAMPLE_RATE = float(os.environ.get('PERF_PROFILE_SAMPLE_RATE', 0))
+PERF_PROFILE_DIR = '/tmp/alamanajo-profiles'
+
+# Prometheus metrics (repairs/metrics.py): each process writes its totals to
+# METRICS_DIR, which /metrics adds up; clear it when the server starts. An
+# empty METRICS_DIR keeps metrics in the scraped process only
+METRICS_DIR = os.environ.get('METRICS_DIR', '/var/tmp/alamanajo-metrics')
+METRICS_FLUSH_SECONDS = 5
+# Lets a scraper read /metrics with `Authorization: Bearer <token>` instead of a staff session
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Identical dashboard and summary partials requested at the same time are
+# computed once per process, and with SINGLE_FLIGHT_CACHE_LOCK=1 once across
+# worker processes through the cache (repairs/single_flight.py)
+SINGLE_FLIGHT_CACHE_LOCK = os.environ.get('SINGLE_FLIGHT_CACHE_LOCK', '') == '1'
+SINGLE_FLIGHT_TIMEOUT = 10
+SINGLE_FLIGHT_POLL_SECONDS = 0.025
+
+# Response compression (repairs.middleware.CompressionMiddleware); Brotli is
+# used when the brotli package is installed, gzip otherwise
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+
+# Worker warm-up (alamana_repair/warmup.py): build URL resolvers, compile
+# templates, import lazily loaded modules and connect to the database before
+# wsgi.py/asgi.py hand the application to the server
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', '') == '1'
+WARMUP_MODULES = ['qrcode']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'performance': {'format': '%(asctime)s %(levelname)s %(message)s'},
+    },
+    'handlers': {
+        'performance': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'performance',
+        },
+    },
+    'loggers': {
+        'repairs.performance': {
+            'handlers': ['performance'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'repairs.scheduler': {
+            'handlers': ['performance'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # Security settings for production
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -0,0 +1,61 @@
+"""
+Photo storage profiles for alamana_repair.
+
+Photos are saved and served through Django's default storage
+(RepairJobPhoto.photo, repairs/blobs.py), selected with the
+``PHOTO_STORAGE`` environment variable:
+
+* ``filesystem`` (default) - files under MEDIA_ROOT, served from /media/.
+  Every app server needs the same MEDIA_ROOT.
+* ``s3`` - a bucket of an S3-compatible object store (repairs/s3.py),
+  configured from the ``S3_*`` environment variables. Photo URLs are
+  presigned, so browsers fetch the bytes from the store, not from Django.
+
+``manage.py copy_media_to_storage`` copies the existing photos from
+MEDIA_ROOT into the configured storage.
+"""
+
+import os
+
+PHOTO_STORAGES = ('filesystem', 's3')
+
+# Photos up to this size go up in one PUT; larger ones as a multipart upload
+# of S3_MULTIPART_CHUNK_SIZE parts, S3_UPLOAD_THREADS at a time
+S3_MULTIPART_THRESHOLD = 8 * 1024 * 1024
+S3_MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+S3_UPLOAD_THREADS = 4
+# Presigned photo URLs stay valid for this long, and unchanged for half of it
+S3_URL_EXPIRY_SECONDS = 3600
+
+
+def s3_options():
+    """OPTIONS of repairs.s3.S3Storage from the S3_* environment variables"""
+    return {
+        'endpoint_url': os.environ.get('S3_ENDPOINT_URL', 'https://s3.amazonaws.com'),
+        'bucket': os.environ.get('S3_BUCKET', 'alamanajo-photos'),
+        'region': os.environ.get('S3_REGION', 'us-east-1'),
+        'access_key_id': os.environ.get('S3_ACCESS_KEY_ID', ''),
+        'secret_access_key': os.environ.get('S3_SECRET_ACCESS_KEY', ''),
+        'max_connections': int(os.environ.get('S3_MAX_CONNECTIONS', 10)),
+        'multipart_threshold': S3_MULTIPART_THRESHOLD,
+        'multipart_chunk_size': S3_MULTIPART_CHUNK_SIZE,
+        'upload_threads': S3_UPLOAD_THREADS,
+        'url_expiry': S3_URL_EXPIRY_SECONDS,
+    }
+
+
+def get_storages():
+    """Build settings.STORAGES from the PHOTO_STORAGE environment variable"""
+    profile = os.environ.get('PHOTO_STORAGE', 'filesystem')
+    if profile == 'filesystem':
+        default = {'BACKEND': 'django.core.files.storage.FileSystemStorage'}
+    elif profile == 's3':
+        default = {'BACKEND': 'repairs.s3.S3Storage', 'OPTIONS': s3_options()}
+    else:
+        raise ValueError(
+            f"Unknown PHOTO_STORAGE '{profile}'. Use one of: {', '.join(PHOTO_STORAGES)}"
+        )
+    return {
+        'default': default,
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    }
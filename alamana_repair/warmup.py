@@ -0,0 +1,83 @@
+"""
+Worker warm-up, run from wsgi.py/asgi.py when WARMUP_ON_START is enabled.
+
+A fresh worker otherwise pays for building the URL resolver, compiling
+every template it renders, importing the modules views load lazily and
+connecting to the database on its first requests. warm_up() does that work
+before the worker is handed to the server, so the first customer at the
+counter gets the same latency as the hundredth.
+
+Database connections are per thread and must not cross a fork: with
+gunicorn's --preload, call warm_up() from a post_fork hook instead.
+"""
+
+import importlib
+import json
+import logging
+import time
+from pathlib import Path
+
+logger = logging.getLogger('repairs.performance')
+
+
+def warm_url_resolver():
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    # Populating the reverse dict imports every view module and compiles the patterns
+    resolver.reverse_dict
+    return len(resolver.url_patterns)
+
+
+def warm_templates():
+    """Compile every project template into the cached loader"""
+    from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+
+    count = 0
+    for engine in engines.all():
+        for directory in getattr(engine, 'dirs', ()):
+            for path in sorted(Path(directory).rglob('*.html')):
+                try:
+                    engine.get_template(path.relative_to(directory).as_posix())
+                    count += 1
+                except (TemplateDoesNotExist, TemplateSyntaxError):
+                    logger.exception('Warm-up could not load template %s', path)
+    return count
+
+
+def warm_modules(names):
+    for name in names:
+        importlib.import_module(name)
+    return len(names)
+
+
+def warm_databases():
+    from django.db import connections
+
+    for connection in connections.all():
+        connection.ensure_connection()
+    return len(connections.all())
+
+
+def warm_up():
+    """Run every warm-up step and log how long each took"""
+    from django.conf import settings
+
+    steps = [
+        ('urls', warm_url_resolver),
+        ('templates', warm_templates),
+        ('modules', lambda: warm_modules(getattr(settings, 'WARMUP_MODULES', []))),
+        ('databases', warm_databases),
+    ]
+    timings = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            count = step()
+        except Exception:
+            # A worker that can't warm up can still serve; the first request just pays for it
+            logger.exception('Warm-up step %s failed', name)
+            count = None
+        timings[name] = {'count': count, 'ms': round((time.perf_counter() - start) * 1000, 1)}
+    logger.info(json.dumps({'event': 'warmup', 'steps': timings}))
+    return timings
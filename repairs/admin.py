@@ -1,9 +1,27 @@
 from django.contrib import admin
 from django.contrib import messages
+from django.db import transaction
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.utils.html import format_html
-from .models import RepairJob, RepairJobPhoto
-from .views import send_sms_notification
+from .models import Customer, RepairJob, RepairJobPhoto, ArchivedRepairJob, ScheduledTask
+from .sms import send_sms_notification
+from . import blobs, tasks
+
+class ReleasePhotoFilesMixin:
+    """Deleting jobs cascades to their photo rows; release the photo files too and recount the daily rollups"""
+    
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, type(obj).objects.filter(pk=obj.pk))
+    
+    def delete_queryset(self, request, queryset):
+        photos = list(self.model.photos.rel.related_model.objects.filter(repair_job__in=queryset))
+        # rollup_refresh only sees jobs that still exist; recount their days now
+        days = list(queryset.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct())
+        with transaction.atomic():
+            queryset.delete()
+            tasks.refresh_rollup_days(days)
+        blobs.release_photos(photos)
 
 class RepairJobPhotoInline(admin.TabularInline):
     model = RepairJobPhoto
@@ -21,7 +39,7 @@ class RepairJobPhotoInline(admin.TabularInline):
     photo_preview.short_description = "Preview"
 
 @admin.register(RepairJob)
-class RepairJobAdmin(admin.ModelAdmin):
+class RepairJobAdmin(ReleasePhotoFilesMixin, admin.ModelAdmin):
     list_display = ['job_id', 'customer_name', 'phone_number', 'status', 'estimated_repair_time', 'created_at', 'created_by', 'ready_notified_at', 'photo_count']
     list_filter = ['status', 'estimated_repair_time', 'created_at', 'created_by']
     search_fields = ['job_id', 'customer_name', 'phone_number', 'created_by__username']
@@ -80,7 +98,7 @@ Thank you for choosing Alamana Jo!"""
                 success, error_msg = send_sms_notification(job.phone_number, message)
                 if success:
                     success_count += 1
-                    job.ready_notified_at = timezone.now()
+                    job.mark_ready_notified()
                     job.save()
                     messages.success(request, f"SMS sent to {job.customer_name}")
         
@@ -91,7 +109,8 @@ Thank you for choosing Alamana Jo!"""
     
     def mark_completed(self, request, queryset):
         """Mark jobs as completed"""
-        updated = queryset.update(status='COMPLETED')
+        # update() skips auto_now; the API's ETags and since= sync go by updated_at
+        updated = queryset.update(status='COMPLETED', due_at=None, updated_at=timezone.now())
         messages.success(request, f"Marked {updated} jobs as completed")
     
     mark_completed.short_description = "✅ Mark as Completed"
@@ -101,7 +120,7 @@ class RepairJobPhotoAdmin(admin.ModelAdmin):
     list_display = ['repair_job', 'photo_preview', 'description', 'uploaded_at']
     list_filter = ['uploaded_at', 'repair_job__status']
     search_fields = ['repair_job__job_id', 'repair_job__customer_name', 'description']
-    readonly_fields = ['uploaded_at', 'photo_preview']
+    readonly_fields = ['uploaded_at', 'photo_preview', 'blob']
     
     def photo_preview(self, obj):
         if obj.photo:
@@ -111,3 +130,31 @@ class RepairJobPhotoAdmin(admin.ModelAdmin):
             )
         return "No photo"
     photo_preview.short_description = "Photo Preview"
+    
+    def delete_queryset(self, request, queryset):
+        photos = list(queryset)
+        queryset.delete()
+        blobs.release_photos(photos)
+
+@admin.register(ArchivedRepairJob)
+class ArchivedRepairJobAdmin(ReleasePhotoFilesMixin, admin.ModelAdmin):
+    list_display = ['job_id', 'customer_name', 'phone_number', 'status', 'created_at', 'archived_at']
+    list_filter = ['status', 'archived_at']
+    search_fields = ['job_id', 'customer_name', 'phone_number']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ScheduledTask)
+class ScheduledTaskAdmin(admin.ModelAdmin):
+    list_display = ['name', 'last_run_at', 'last_result', 'watermark', 'lease_owner', 'lease_expires_at']
+    readonly_fields = ['name', 'last_run_at', 'last_result', 'lease_owner', 'lease_expires_at']
+
+@admin.register(Customer)
+class CustomerAdmin(admin.ModelAdmin):
+    list_display = ['name', 'phone', 'created_at', 'updated_at']
+    search_fields = ['phone', 'name']
+    readonly_fields = ['created_at', 'updated_at']
@@ -0,0 +1,258 @@
+"""
+Read-only JSON API for workshop screens and tablet apps.
+
+    GET /api/jobs/                 list, newest first
+    GET /api/jobs/?since=<iso>     delta sync: jobs updated at or after `since`,
+                                   oldest change first
+    GET /api/jobs/<job_id>/        one job with its photos
+
+Rows are serialized straight from .values(), so no model instances or
+templates are involved. List responses carry a keyset `next_cursor` and a
+`sync_token` to pass as `since=` on the next poll. Every response has an
+ETag; a list poll that sends it back in If-None-Match gets a 304 after one
+aggregate query, without reading any rows. Deleted and archived jobs simply stop appearing, so delta
+clients should do a full refresh now and then.
+
+Authenticate with a staff session or `Authorization: Bearer <token>` using
+one of settings.API_TOKENS.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Q
+from django.http import JsonResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils.http import parse_etags, quote_etag
+
+from .models import RepairJob, RepairJobPhoto
+
+# Fields a client may ask for with ?fields=
+JOB_FIELDS = [
+    'job_id', 'customer_name', 'phone_number', 'bike_description', 'status',
+    'estimated_repair_time', 'estimated_cost', 'repair_details', 'internal_notes',
+    'created_at', 'updated_at', 'ready_notified_at', 'due_at', 'storage_days', 'storage_fee',
+]
+DEFAULT_FIELDS = [
+    'job_id', 'customer_name', 'status', 'estimated_repair_time', 'estimated_cost',
+    'created_at', 'updated_at',
+]
+# Computed in SQL by with_storage(), only annotated when requested
+STORAGE_FIELDS = {'storage_days', 'storage_fee'}
+PHOTO_FIELDS = ['photo', 'description', 'uploaded_at']
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class ApiError(Exception):
+    pass
+
+
+def api_error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_auth_required(view_func):
+    """Allow staff sessions or a bearer token from settings.API_TOKENS"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.user.is_authenticated and request.user.is_staff:
+            return view_func(request, *args, **kwargs)
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and any(
+            hmac.compare_digest(token.encode(), valid.encode()) for valid in settings.API_TOKENS
+        ):
+            return view_func(request, *args, **kwargs)
+        return api_error('Authentication required', status=401)
+    return wrapper
+
+
+def parse_fields(request):
+    requested = request.GET.get('fields')
+    if not requested:
+        return DEFAULT_FIELDS
+    fields = [f.strip() for f in requested.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in JOB_FIELDS]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}. Choose from: {', '.join(JOB_FIELDS)}")
+    return fields
+
+
+def parse_moment(value, name):
+    moment = parse_datetime(value.replace(' ', '+'))
+    if moment is None:
+        raise ApiError(f"'{name}' must be an ISO 8601 datetime")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_day(value, name):
+    day = parse_date(value)
+    if day is None:
+        raise ApiError(f"'{name}' must be a date (YYYY-MM-DD)")
+    return day
+
+
+def encode_cursor(values):
+    # isoformat keeps the microseconds that DjangoJSONEncoder would drop
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ApiError('Invalid cursor')
+
+
+def annotate_fields(jobs, fields):
+    """Add the storage annotations only when a requested field needs them"""
+    if STORAGE_FIELDS.intersection(fields):
+        jobs = jobs.with_storage()
+    return jobs
+
+
+def make_etag(*parts):
+    digest = hashlib.md5(json.dumps(parts, cls=DjangoJSONEncoder).encode(), usedforsecurity=False)
+    return quote_etag(digest.hexdigest())
+
+
+def not_modified(request, etag):
+    return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+
+def etag_response(data, etag):
+    response = JsonResponse(data)
+    response['ETag'] = etag
+    # Clients must revalidate, which is a cheap 304 when nothing changed
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@api_auth_required
+def job_list(request):
+    """Jobs with ?fields=, ?status=, ?created_after=, ?created_before=, ?since=, ?cursor=, ?limit="""
+    if request.method != 'GET':
+        return api_error('Method not allowed', status=405)
+    try:
+        fields = parse_fields(request)
+        jobs = RepairJob.objects.all()
+
+        statuses = [s for s in request.GET.get('status', '').upper().split(',') if s]
+        if statuses:
+            valid = dict(RepairJob.STATUS_CHOICES)
+            if any(s not in valid for s in statuses):
+                raise ApiError(f"'status' must be one or more of: {', '.join(valid)}")
+            jobs = jobs.filter(status__in=statuses)
+        if request.GET.get('created_after'):
+            jobs = jobs.filter(created_at__date__gte=parse_day(request.GET['created_after'], 'created_after'))
+        if request.GET.get('created_before'):
+            jobs = jobs.filter(created_at__date__lte=parse_day(request.GET['created_before'], 'created_before'))
+
+        since = request.GET.get('since')
+        if since:
+            # Delta sync walks the updated_at index in change order
+            since = parse_moment(since, 'since')
+            jobs = jobs.filter(updated_at__gte=since)
+            ordering = ['updated_at', 'id']
+        else:
+            ordering = ['-id']
+
+        try:
+            limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            raise ApiError("'limit' must be a number")
+        if limit < 1:
+            raise ApiError("'limit' must be at least 1")
+
+        cursor = request.GET.get('cursor')
+        page = jobs
+        if cursor:
+            key = decode_cursor(cursor)
+            if not isinstance(key, list) or len(key) != (2 if since else 1):
+                raise ApiError('Invalid cursor')
+            # Decoded JSON can hold anything; a bad key is the client's error, not a 500
+            try:
+                last_id = int(key[-1])
+                updated_at = parse_moment(key[0], 'cursor') if since else None
+            except (TypeError, ValueError, AttributeError):
+                raise ApiError('Invalid cursor')
+            if since:
+                page = page.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=last_id))
+            else:
+                page = page.filter(id__lt=last_id)
+    except ApiError as e:
+        return api_error(str(e))
+
+    # Count and newest change identify the filtered set; compare before reading any rows
+    state = jobs.aggregate(count=Count('id'), last_update=Max('updated_at'))
+    # Storage days and fees grow with the calendar, not with updated_at
+    today = timezone.localdate() if STORAGE_FIELDS.intersection(fields) else None
+    etag = make_etag(request.GET.urlencode(), state['count'], state['last_update'], today)
+    if not_modified(request, etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    key_fields = ['updated_at', 'id'] if since else ['id']
+    rows = list(
+        annotate_fields(page, fields).order_by(*ordering)
+        .values(*dict.fromkeys(fields + key_fields))[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([rows[-1][f] for f in key_fields])
+    for row in rows:
+        for f in key_fields:
+            if f not in fields:
+                del row[f]
+
+    return etag_response({
+        'results': rows,
+        'next_cursor': next_cursor,
+        # Pass back as ?since= on the next poll
+        'sync_token': (state['last_update'] or since or timezone.now()).isoformat(),
+    }, etag)
+
+
+@api_auth_required
+def job_detail(request, job_id):
+    """One job with ?fields= plus its photos"""
+    if request.method != 'GET':
+        return api_error('Method not allowed', status=405)
+    try:
+        fields = parse_fields(request)
+    except ApiError as e:
+        return api_error(str(e))
+
+    job = annotate_fields(RepairJob.objects.filter(job_id=job_id.upper()), fields).values('id', *fields).first()
+    if job is None:
+        return api_error('Job not found', status=404)
+    job_pk = job.pop('id')
+
+    photos = list(RepairJobPhoto.objects.filter(repair_job_id=job_pk).values(*PHOTO_FIELDS))
+    for photo in photos:
+        photo['url'] = default_storage.url(photo.pop('photo'))
+    job['photos'] = photos
+
+    etag = make_etag(job)
+    if not_modified(request, etag):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    return etag_response(job, etag)
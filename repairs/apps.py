@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
 
 
 class RepairsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'repairs'
+
+    def ready(self):
+        # Queries reach the per-request observers of repairs.middleware.observe_queries
+        from .middleware import install_query_dispatch
+        connection_created.connect(install_query_dispatch, dispatch_uid='repairs_query_observers')
+
+        # Cached users (repairs.auth) are dropped when they change
+        from .auth import forget_user
+        post_save.connect(forget_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='repairs_forget_user_save')
+        post_delete.connect(forget_user, sender=settings.AUTH_USER_MODEL, dispatch_uid='repairs_forget_user_delete')
@@ -0,0 +1,155 @@
+"""
+Hot/cold storage for repair jobs.
+
+Completed jobs older than ARCHIVE_COMPLETED_AFTER_DAYS and bikes abandoned
+for ABANDONMENT_MONTHS are moved, with their photo rows, from RepairJob into
+ArchivedRepairJob so dashboard queries only scan active work. The helpers
+below read from both tables for tracking, job detail, search and summaries.
+"""
+
+import asyncio
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404
+from django.utils import timezone
+
+from . import fees
+from .concurrency import db_read
+from .models import RepairJob, RepairJobPhoto, ArchivedRepairJob, ArchivedRepairJobPhoto
+
+JOB_FIELDS = [f.attname for f in RepairJob._meta.concrete_fields]
+PHOTO_FIELDS = [f.attname for f in RepairJobPhoto._meta.concrete_fields]
+
+
+def archive_candidates(now=None):
+    """Active jobs that are due to move to the archive"""
+    now = now or timezone.now()
+    completed_before = now - timedelta(days=settings.ARCHIVE_COMPLETED_AFTER_DAYS)
+    return RepairJob.objects.filter(
+        Q(status='COMPLETED', updated_at__lt=completed_before) |
+        Q(status='READY', ready_notified_at__lt=fees.abandoned_before(now))
+    )
+
+
+def archive_batch(job_ids):
+    """Move one batch of jobs and their photo rows in a short transaction"""
+    with transaction.atomic():
+        jobs = list(RepairJob.objects.filter(id__in=job_ids).values(*JOB_FIELDS))
+        photos = list(RepairJobPhoto.objects.filter(repair_job_id__in=job_ids).values(*PHOTO_FIELDS))
+        now = timezone.now()
+        ArchivedRepairJob.objects.bulk_create(
+            ArchivedRepairJob(archived_at=now, **job) for job in jobs
+        )
+        ArchivedRepairJobPhoto.objects.bulk_create(
+            ArchivedRepairJobPhoto(**photo) for photo in photos
+        )
+        RepairJobPhoto.objects.filter(repair_job_id__in=job_ids).delete()
+        RepairJob.objects.filter(id__in=job_ids).delete()
+    return len(jobs), len(photos)
+
+
+def archive_jobs(batch_size=None, pause=0.0, limit=None, now=None, progress=None):
+    """
+    Archive all candidates in batches of `batch_size`, sleeping `pause`
+    seconds between batches so other writers can get the lock.
+    Returns (jobs_archived, photos_archived).
+    """
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    jobs_archived = photos_archived = 0
+    # Walk by primary key so each batch query is a bounded index range scan
+    last_id = 0
+    while limit is None or jobs_archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - jobs_archived)
+        job_ids = list(
+            archive_candidates(now).filter(id__gt=last_id)
+            .order_by('id').values_list('id', flat=True)[:size]
+        )
+        if not job_ids:
+            break
+        jobs, photos = archive_batch(job_ids)
+        jobs_archived += jobs
+        photos_archived += photos
+        last_id = job_ids[-1]
+        if progress:
+            progress(jobs_archived, photos_archived)
+        if pause:
+            time.sleep(pause)
+    return jobs_archived, photos_archived
+
+
+def find_job(**lookups):
+    """Get a job from the active table, falling back to the archive"""
+    try:
+        return RepairJob.objects.with_storage().select_related('created_by').get(**lookups)
+    except RepairJob.DoesNotExist:
+        try:
+            return ArchivedRepairJob.objects.with_storage().select_related('created_by').get(**lookups)
+        except ArchivedRepairJob.DoesNotExist:
+            raise RepairJob.DoesNotExist(f"No active or archived job matches {lookups}")
+
+
+def _get_or_none(model, lookups):
+    try:
+        return model.objects.with_storage().select_related('created_by').get(**lookups)
+    except model.DoesNotExist:
+        return None
+
+
+async def afind_job(**lookups):
+    """find_job() for async views, looking in both tables at once"""
+    active, archived = await asyncio.gather(
+        db_read(_get_or_none, RepairJob, lookups),
+        db_read(_get_or_none, ArchivedRepairJob, lookups),
+    )
+    if active is None and archived is None:
+        raise RepairJob.DoesNotExist(f"No active or archived job matches {lookups}")
+    return active or archived
+
+
+def get_job_or_404(**lookups):
+    try:
+        return find_job(**lookups)
+    except RepairJob.DoesNotExist:
+        raise Http404('No repair job matches the given query.')
+
+
+def search_archive(search_query='', limit=20):
+    """Most recent archived jobs matching the dashboard search"""
+    jobs = ArchivedRepairJob.objects.select_related('created_by')
+    if search_query:
+        jobs = jobs.filter(
+            Q(job_id__icontains=search_query) |
+            Q(customer_name__icontains=search_query) |
+            Q(phone_number__icontains=search_query) |
+            Q(created_by__username__icontains=search_query)
+        )
+    return jobs.order_by('-created_at')[:limit]
+
+
+def all_job_querysets():
+    """Active and archived job querysets, for summaries over every job"""
+    return [RepairJob.objects.all(), ArchivedRepairJob.objects.all()]
+
+
+HISTORY_FIELDS = ['job_id', 'status', 'bike_description', 'estimated_cost', 'created_at']
+
+
+def customer_history(job, limit=10):
+    """The customer's other jobs, active and archived, newest first, in one UNION query"""
+    if not job.customer_id:
+        return []
+    active = RepairJob.objects.filter(customer_id=job.customer_id).exclude(job_id=job.job_id)
+    archived = ArchivedRepairJob.objects.filter(customer_id=job.customer_id).exclude(job_id=job.job_id)
+    history = list(
+        active.order_by().values(*HISTORY_FIELDS)
+        .union(archived.order_by().values(*HISTORY_FIELDS), all=True)
+        .order_by('-created_at')[:limit]
+    )
+    statuses = dict(RepairJob.STATUS_CHOICES)
+    for item in history:
+        item['status_display'] = statuses.get(item['status'], item['status'])
+    return history
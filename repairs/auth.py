@@ -0,0 +1,46 @@
+"""
+Authentication backend that caches the logged-in user.
+
+Every staff request, down to the dashboard's 30-second stats poll, loads the
+User behind staff_member_required. CachedModelBackend keeps it in the cache
+for AUTH_USER_CACHE_SECONDS, shared by all of that user's sessions. Saving
+or deleting the user drops the entry (RepairsConfig.ready() connects
+forget_user), so a password change, deactivation or lost staff flag applies
+on the next request. Bulk QuerySet.update() calls send no signal; they apply
+once the entry expires.
+"""
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that reads the session's user from the cache"""
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.AUTH_USER_CACHE_SECONDS)
+        return user
+
+    async def aget_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(key, user, settings.AUTH_USER_CACHE_SECONDS)
+        return user
+
+
+def forget_user(sender, instance, **kwargs):
+    """post_save/post_delete receiver for the user model"""
+    cache.delete(user_cache_key(instance.pk))
@@ -0,0 +1,322 @@
+"""
+Online backups of the SQLite database, with a manifest of MEDIA_ROOT.
+
+online_backup() copies the live file with SQLite's backup API in steps of
+BACKUP_PAGES_PER_STEP pages, sleeping BACKUP_STEP_SLEEP between them. In WAL
+mode the source connection holds one read transaction for the whole copy,
+so the snapshot is the database as of its first step and writers carry on
+(the WAL cannot be checkpointed past that point until the copy ends). In
+rollback-journal mode a reader would block writers, so the read lock is only
+held during each step; a write between steps restarts the copy.
+
+take_snapshot() copies into BACKUP_DIR/<db>-<UTC time>.db.partial, runs
+PRAGMA integrity_check on the copy and only then gives it its final name,
+so every .db / .db.gz in BACKUP_DIR has been verified. Compression runs in
+a background thread while MEDIA_ROOT is walked for the manifest. The
+manifest lists every media file with its size, mtime and SHA-256, hashing
+only files that are new or changed since the previous manifest, and names
+the photos referenced by the snapshot that are not in MEDIA_ROOT. With
+photos in an object store (PHOTO_STORAGE=s3) there is no manifest of them.
+
+Rotation keeps the newest BACKUP_KEEP_LATEST snapshots and the newest of
+each of the last BACKUP_KEEP_DAILY days.
+"""
+
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+STAMP_FORMAT = '%Y%m%dT%H%M%SZ'
+SNAPSHOT_RE = re.compile(r'^(?P<stem>.+)-(?P<stamp>\d{8}T\d{6}Z)\.db(?:\.gz)?$')
+
+REFERENCED_PHOTOS_SQL = (
+    'SELECT photo FROM repairs_repairjobphoto '
+    'UNION SELECT photo FROM repairs_archivedrepairjobphoto'
+)
+
+
+class BackupError(Exception):
+    pass
+
+
+def primary_path():
+    """The primary SQLite file, or None when the default database is not SQLite"""
+    primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+    if 'sqlite3' not in primary['ENGINE']:
+        return None
+    return str(primary['NAME'])
+
+
+def online_backup(source_path, target_path, pages=None, sleep=None, progress=None):
+    """
+    Copy the SQLite file at `source_path` into `target_path` with the backup
+    API, `pages` at a time. Calls progress(remaining, total) after each step
+    and returns the number of pages copied.
+    """
+    pages = pages or settings.BACKUP_PAGES_PER_STEP
+    sleep = settings.BACKUP_STEP_SLEEP if sleep is None else sleep
+    timeout = settings.DATABASES[DEFAULT_DB_ALIAS].get('OPTIONS', {}).get('timeout', 5)
+
+    def step_done(status, remaining, total):
+        if progress:
+            progress(remaining, total)
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    source = sqlite3.connect(source_path, timeout=timeout, isolation_level=None)
+    target = sqlite3.connect(target_path, timeout=timeout)
+    try:
+        pinned = source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        if pinned:
+            source.execute('BEGIN')
+            source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        try:
+            source.backup(target, pages=pages, progress=step_done)
+        finally:
+            if pinned:
+                source.execute('COMMIT')
+        return target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+
+
+def verify(path, quick=False):
+    """Problems PRAGMA integrity_check (or quick_check) finds in the file, [] if none"""
+    connection = sqlite3.connect(path)
+    try:
+        check = 'quick_check' if quick else 'integrity_check'
+        rows = [row[0] for row in connection.execute(f'PRAGMA {check}')]
+    finally:
+        connection.close()
+    return [] if rows == ['ok'] else rows
+
+
+def referenced_photos(path):
+    """Storage names of the active and archived photos in a snapshot"""
+    connection = sqlite3.connect(path)
+    try:
+        return {name for name, in connection.execute(REFERENCED_PHOTOS_SQL) if name}
+    finally:
+        connection.close()
+
+
+def snapshots(backup_dir=None):
+    """(stamp, [paths]) of every finished snapshot in BACKUP_DIR, newest first"""
+    backup_dir = Path(backup_dir or settings.BACKUP_DIR)
+    found = {}
+    if backup_dir.is_dir():
+        for path in backup_dir.iterdir():
+            match = SNAPSHOT_RE.match(path.name)
+            if match:
+                found.setdefault(match['stamp'], []).append(path)
+    return sorted(found.items(), reverse=True)
+
+
+def latest_snapshot(backup_dir=None):
+    """Path of the newest verified snapshot, .db or .db.gz, or None"""
+    found = snapshots(backup_dir)
+    return sorted(found[0][1])[0] if found else None
+
+
+def manifest_path(snapshot_path):
+    return Path(str(snapshot_path).removesuffix('.gz').removesuffix('.db') + '.media.json')
+
+
+def latest_manifest(backup_dir):
+    manifests = sorted(Path(backup_dir).glob('*.media.json'), reverse=True)
+    for path in manifests:
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(COPY_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def media_files(media_root, previous=None):
+    """
+    relative path -> [size, mtime_ns, sha256] for every file under `media_root`.
+    Files with the same size and mtime as in `previous` keep its checksum.
+    """
+    previous = previous or {}
+    files = {}
+    for directory, _, names in os.walk(media_root):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Deleted while we walked
+                continue
+            relative = os.path.relpath(path, media_root).replace(os.sep, '/')
+            known = previous.get(relative)
+            if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+                files[relative] = known
+                continue
+            try:
+                files[relative] = [stat.st_size, stat.st_mtime_ns, _sha256(path)]
+            except FileNotFoundError:
+                continue
+    return files
+
+
+def _seal(path, compress, result):
+    """Checksum the snapshot and, if asked, replace it with a gzipped copy; runs in a thread"""
+    try:
+        if not compress:
+            result['sha256'], result['path'] = _sha256(path), Path(path)
+            return
+        digest = hashlib.sha256()
+        partial = Path(f'{path}.gz.partial')
+        with open(path, 'rb') as source, gzip.open(partial, 'wb', compresslevel=6) as target:
+            while block := source.read(COPY_BLOCK_SIZE):
+                digest.update(block)
+                target.write(block)
+        os.replace(partial, f'{path}.gz')
+        os.remove(path)
+        result['sha256'], result['path'] = digest.hexdigest(), Path(f'{path}.gz')
+    except Exception as e:
+        result['error'] = e
+
+
+def rotate(backup_dir=None, keep_latest=None, keep_daily=None, now=None):
+    """Delete snapshots (and their manifests) outside the retention policy; returns the stamps removed"""
+    keep_latest = settings.BACKUP_KEEP_LATEST if keep_latest is None else keep_latest
+    keep_daily = settings.BACKUP_KEEP_DAILY if keep_daily is None else keep_daily
+    now = now or timezone.now()
+    found = snapshots(backup_dir)
+
+    keep = {stamp for stamp, paths in found[:keep_latest]}
+    first_day = (now - timedelta(days=keep_daily - 1)).strftime('%Y%m%d')
+    days_seen = set()
+    for stamp, paths in found:
+        day = stamp[:8]
+        if day >= first_day and day not in days_seen:
+            days_seen.add(day)
+            keep.add(stamp)
+
+    removed = []
+    for stamp, paths in found:
+        if stamp in keep:
+            continue
+        for path in paths:
+            path.unlink(missing_ok=True)
+            manifest_path(path).unlink(missing_ok=True)
+        removed.append(stamp)
+    return removed
+
+
+def take_snapshot(backup_dir=None, compress=False, quick_check=False, reporting=False, progress=None):
+    """
+    Back up the primary database into BACKUP_DIR, verify it, write its media
+    manifest and rotate old snapshots. Returns a dict describing the snapshot.
+    """
+    from . import reporting as reporting_db
+
+    source = primary_path()
+    if source is None:
+        raise BackupError('backup_db only backs up a SQLite database')
+    backup_dir = Path(backup_dir or settings.BACKUP_DIR)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(backup_dir / '.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise BackupError(f'Another backup is running in {backup_dir}')
+        # Left behind by an interrupted run; we hold the lock, so nobody is writing them
+        for partial in backup_dir.glob('*.partial'):
+            partial.unlink()
+
+        now = timezone.now()
+        stem = Path(source).stem
+        path = backup_dir / f'{stem}-{now:{STAMP_FORMAT}}.db'
+        if path.exists() or Path(f'{path}.gz').exists():
+            raise BackupError(f'{path.name} already exists; snapshots are at most one per second')
+        partial = Path(f'{path}.partial')
+        began = time.perf_counter()
+        pages = online_backup(source, partial, progress=progress)
+        copy_seconds = time.perf_counter() - began
+
+        # One self-contained file: no -wal to copy along
+        connection = sqlite3.connect(partial)
+        connection.execute('PRAGMA journal_mode=DELETE').fetchone()
+        connection.close()
+        problems = verify(partial, quick=quick_check)
+        if problems:
+            failed = Path(f'{path}.failed')
+            os.replace(partial, failed)
+            raise BackupError(f'{failed} failed its integrity check: {"; ".join(problems[:5])}')
+        os.replace(partial, path)
+        size = path.stat().st_size
+        referenced = referenced_photos(path)
+
+        if reporting:
+            reporting_db.refresh_snapshot(source=str(path))
+
+        sealed = {}
+        sealer = threading.Thread(target=_seal, args=(path, compress, sealed), name='backup-seal')
+        sealer.start()
+        previous = latest_manifest(backup_dir)
+        # Photos in an object store (PHOTO_STORAGE=s3) are not under MEDIA_ROOT
+        media_root = settings.MEDIA_ROOT if isinstance(default_storage, FileSystemStorage) else None
+        files = media_files(media_root, previous['files'] if previous else None) if media_root else {}
+        sealer.join()
+        if 'error' in sealed:
+            raise BackupError(f'Could not seal {path}: {sealed["error"]}')
+
+        manifest = {
+            'snapshot': sealed['path'].name,
+            'created_at': now.isoformat(),
+            'database': {'source': source, 'pages': pages, 'size': size, 'sha256': sealed['sha256']},
+            'media_root': str(media_root) if media_root else None,
+            'files': files,
+            'missing': sorted(referenced - files.keys()) if media_root else [],
+        }
+        target = manifest_path(path)
+        temp = target.with_suffix('.partial')
+        temp.write_text(json.dumps(manifest))
+        os.replace(temp, target)
+
+        removed = rotate(backup_dir, now=now)
+
+    changed = previous_files = None
+    if previous:
+        previous_files = previous['files']
+        changed = sum(1 for name, entry in files.items() if previous_files.get(name) != entry)
+    return {
+        'path': sealed['path'],
+        'manifest': target,
+        'pages': pages,
+        'size': size,
+        'copy_seconds': copy_seconds,
+        'media_files': len(files),
+        'media_bytes': sum(entry[0] for entry in files.values()),
+        'media_changed': changed,
+        'media_removed': len(previous_files.keys() - files.keys()) if previous_files is not None else None,
+        'missing': manifest['missing'],
+        'rotated': removed,
+    }
@@ -0,0 +1,140 @@
+"""
+Content-addressed photo storage.
+
+Every photo file is stored once, as photos/<aa>/<bb>/<sha256><ext>, and
+described by a PhotoBlob row whose refcount is the number of
+RepairJobPhoto/ArchivedRepairJobPhoto rows pointing at it. Uploading the same
+bytes again (a re-upload in job_detail, a phone retrying) adds a reference
+instead of another file. The file is deleted when its last reference goes.
+
+Moving photo rows between the active and archive tables keeps their blob, so
+archival does not touch refcounts. Photos from before this scheme have no
+blob until `manage.py migrate_photo_blobs` converts them.
+"""
+
+import hashlib
+import os
+import tempfile
+from collections import Counter
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import metrics
+from .models import PhotoBlob
+
+BLOB_DIR = 'photos'
+
+
+def blob_name(sha256, filename):
+    extension = os.path.splitext(filename)[1].lower()[:10] or '.jpg'
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+def get_or_create_blob(sha256, size, filename, content):
+    """The blob for `sha256`, saving `content` to storage only if it is new"""
+    blob = PhotoBlob.objects.filter(sha256=sha256).first()
+    if blob:
+        return blob
+    name = default_storage.save(blob_name(sha256, filename), content)
+    try:
+        with transaction.atomic():
+            return PhotoBlob.objects.create(sha256=sha256, name=name, size=size)
+    except IntegrityError:
+        # Someone stored the same bytes at the same moment; keep theirs
+        default_storage.delete(name)
+        return PhotoBlob.objects.get(sha256=sha256)
+
+
+def store_blob(content, filename):
+    """
+    Stream `content` to a temporary file while hashing it, then keep one
+    stored copy per hash. Returns the PhotoBlob with a reference added.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR, suffix='.blob') as spool:
+        for chunk in content.chunks():
+            digest.update(chunk)
+            spool.write(chunk)
+            size += len(chunk)
+        spool.flush()
+        spool.seek(0)
+        blob = get_or_create_blob(digest.hexdigest(), size, filename, File(spool))
+    retain([blob.pk])
+    metrics.PHOTO_UPLOAD_BYTES.observe(size)
+    return blob
+
+
+def store_file(path, sha256, filename):
+    """
+    store_blob() for a file on disk whose hash is already known, such as a
+    verified chunked upload: it is read once, only if its blob is new.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        blob = get_or_create_blob(sha256, size, filename, File(f))
+    retain([blob.pk])
+    metrics.PHOTO_UPLOAD_BYTES.observe(size)
+    return blob
+
+
+def store_photo(photo):
+    """
+    Point a photo row with a new, unsaved file at the blob for its content.
+    Returns the (blob_id, name) the row used before, to pass to
+    release_references() once the row has been saved, or None.
+    """
+    previous = None
+    if photo.pk:
+        previous = type(photo).objects.filter(pk=photo.pk).values_list('blob_id', 'photo').first()
+
+    blob = store_blob(photo.photo.file, photo.photo.name)
+    photo.blob = blob
+    photo.photo = blob.name
+    return previous
+
+
+def retain(blob_ids):
+    for blob_id, count in Counter(blob_ids).items():
+        PhotoBlob.objects.filter(pk=blob_id).update(refcount=F('refcount') + count)
+
+
+def release(blob_ids):
+    """Drop references; blobs left with none are deleted with their file after commit"""
+    blob_ids = list(blob_ids)
+    for blob_id, count in Counter(blob_ids).items():
+        PhotoBlob.objects.filter(pk=blob_id).update(refcount=F('refcount') - count)
+    orphans = list(PhotoBlob.objects.filter(pk__in=blob_ids, refcount=0).values_list('pk', 'name'))
+    if orphans:
+        PhotoBlob.objects.filter(pk__in=[pk for pk, _ in orphans], refcount=0).delete()
+        delete_files_on_commit([name for _, name in orphans])
+
+
+def release_references(blob_id, name):
+    if blob_id:
+        release([blob_id])
+    elif name:
+        # Photos from before content addressing own their file outright
+        delete_files_on_commit([name])
+
+
+def release_photos(photos):
+    """Release the files of photo rows that have been deleted"""
+    release([photo.blob_id for photo in photos if photo.blob_id])
+    delete_files_on_commit([photo.photo.name for photo in photos if not photo.blob_id and photo.photo])
+
+
+def delete_files_on_commit(names):
+    def delete_files():
+        for name in names:
+            try:
+                default_storage.delete(name)
+            except OSError:
+                pass  # Already gone
+
+    if names:
+        transaction.on_commit(delete_files)
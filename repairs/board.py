@@ -0,0 +1,78 @@
+"""
+Status board: one column per RepairJob status, for the workshop screen.
+
+board_columns() reads the first BOARD_PAGE_SIZE cards of every column and
+each column's total in one query, numbering the jobs of each status with
+ROW_NUMBER() and counting them with COUNT() over the same partition.
+Further cards are read one column at a time by column_page() as the
+column is scrolled.
+
+Open jobs are ordered by due date, most urgent first; jobs without one
+(ready, completed, no estimate) by their last change, newest first. The
+window functions have to read every row they number, so the Completed
+column only holds jobs finished in the last BOARD_COMPLETED_DAYS.
+"""
+
+from datetime import timedelta
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .models import RepairJob
+
+BOARD_PAGE_SIZE = 12
+BOARD_COMPLETED_DAYS = 7
+
+CARD_FIELDS = ['job_id', 'customer_name', 'bike_description', 'status', 'estimated_repair_time', 'due_at', 'updated_at']
+
+
+def card_ordering():
+    return [F('due_at').asc(nulls_last=True), F('updated_at').desc(), F('pk').desc()]
+
+
+def board_jobs(now=None):
+    """Jobs shown on the board: everything but older completed jobs"""
+    completed_before = (now or timezone.now()) - timedelta(days=BOARD_COMPLETED_DAYS)
+    return RepairJob.objects.only(*CARD_FIELDS).exclude(status='COMPLETED', updated_at__lt=completed_before)
+
+
+def board_columns(per_column=BOARD_PAGE_SIZE, now=None):
+    """One dict per status with its first cards, total and the offset of the next page"""
+    by_status = F('status')
+    jobs = (
+        board_jobs(now)
+        .annotate(
+            position=Window(RowNumber(), partition_by=[by_status], order_by=card_ordering()),
+            column_size=Window(Count('pk'), partition_by=[by_status]),
+        )
+        .filter(position__lte=per_column)
+        .order_by('status', 'position')
+    )
+    cards = {}
+    for job in jobs:
+        cards.setdefault(job.status, []).append(job)
+
+    columns = []
+    for status, label in RepairJob.STATUS_CHOICES:
+        column_jobs = cards.get(status, [])
+        total = column_jobs[0].column_size if column_jobs else 0
+        columns.append({
+            'status': status,
+            'label': label,
+            'jobs': column_jobs,
+            'total': total,
+            'next_offset': per_column if total > per_column else None,
+        })
+    return columns
+
+
+def column_page(status, offset, per_column=BOARD_PAGE_SIZE, now=None):
+    """The cards of one column after `offset`, and the offset of the page after, if any"""
+    jobs = list(
+        board_jobs(now)
+        .filter(status=status)
+        .order_by(*card_ordering())[offset:offset + per_column + 1]
+    )
+    next_offset = offset + per_column if len(jobs) > per_column else None
+    return jobs[:per_column], next_offset
@@ -0,0 +1,56 @@
+"""
+Concurrent database reads for async views.
+
+Django's async ORM methods (acount(), aaggregate(), async for) run their
+queries one after another on the request's sync thread, so gathering them
+overlaps nothing. db_read() runs a read-only function on a small pool of
+DB_READ_THREADS worker threads instead, each with its own persistent
+connection, so independent queries passed to asyncio.gather() really run
+at the same time:
+
+    summary, storage = await asyncio.gather(
+        db_read(reports.period_summary, start, end),
+        db_read(storage_summary),
+    )
+
+Only use it for reads: the worker's connection is outside any transaction
+the request has open. Context variables - the reporting database chosen by
+@reporting_reads and the request's query observers - follow the call to the
+worker. With DB_READ_THREADS = 0 the reads run on the request's thread.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def read_executor():
+    """The shared pool of database read threads, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.DB_READ_THREADS, thread_name_prefix='db-read'
+            )
+    return _executor
+
+
+def _read(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # Keep the worker's connection for CONN_MAX_AGE, as a request thread would
+        close_old_connections()
+
+
+async def db_read(func, *args, **kwargs):
+    """Run func(*args, **kwargs) on a database read thread and return its result"""
+    if not settings.DB_READ_THREADS:
+        return await sync_to_async(func)(*args, **kwargs)
+    return await sync_to_async(_read, thread_sensitive=False, executor=read_executor())(func, args, kwargs)
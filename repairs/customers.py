@@ -0,0 +1,36 @@
+"""
+Bulk linking of repair jobs to Customer rows.
+
+Used by seed_jobs, which creates jobs in batches where a get_or_create per
+job would be one round trip each. Migration 0009 has its own frozen copy.
+"""
+
+from .phones import fits_customer, normalize_phone
+
+
+def link_customers(customer_model, jobs, using='default'):
+    """
+    Set customer_id on each job, creating missing customers in one bulk
+    insert. The last job in the batch wins for a customer's name.
+    Returns the number of customers created.
+    """
+    names = {}
+    for job in jobs:
+        phone = normalize_phone(job.phone_number)
+        if fits_customer(phone):
+            names[phone] = job.customer_name
+
+    customers = customer_model.objects.using(using)
+    ids = dict(customers.filter(phone__in=names).values_list('phone', 'id'))
+    missing = [
+        customer_model(phone=phone, name=name, name_key=name.casefold())
+        for phone, name in names.items() if phone not in ids
+    ]
+    if missing:
+        # ignore_conflicts: another writer may have created the same customer meanwhile
+        customers.bulk_create(missing, ignore_conflicts=True)
+        ids.update(customers.filter(phone__in=[c.phone for c in missing]).values_list('phone', 'id'))
+
+    for job in jobs:
+        job.customer_id = ids.get(normalize_phone(job.phone_number))
+    return len(missing)
@@ -0,0 +1,62 @@
+"""
+Due dates for open repair jobs.
+
+estimated_repair_time is a label ('1-2_DAYS', '1_WEEK'); RepairJob.due_at
+stores the end of the last day it promises, so the dashboard can sort by it
+and the work queue can ask for late bikes with an indexed range on
+(status, due_at). The estimate counts from drop-off, or from the moment
+staff change it or reopen a finished job. Jobs that are READY or
+COMPLETED, and jobs with no estimate yet, have no due date.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+# Calendar days promised by each estimate, counting the longest end of a range
+ESTIMATE_DAYS = {
+    'TODAY': 0,
+    '1-2_DAYS': 2,
+    '3-5_DAYS': 5,
+    '1_WEEK': 7,
+    '2_WEEKS': 14,
+    '3_WEEKS': 21,
+    '1_MONTH': 30,
+}
+
+OPEN_STATUSES = ('RECEIVED', 'DIAGNOSED', 'IN_PROGRESS', 'WAITING_PARTS')
+
+DUE_TIME = time(23, 59, 59)
+
+
+def end_of_day(day):
+    return timezone.make_aware(datetime.combine(day, DUE_TIME))
+
+
+def due_at(estimate, since):
+    """End of the last day of `estimate` counted from `since`, or None for UNKNOWN"""
+    days = ESTIMATE_DAYS.get(estimate)
+    if days is None:
+        return None
+    return end_of_day(timezone.localtime(since).date() + timedelta(days=days))
+
+
+def next_due_at(job, loaded, now=None):
+    """
+    due_at for `job` as it is about to be saved. `loaded` is the
+    (status, estimated_repair_time) it was read with, None for a new job.
+    """
+    if job.status not in OPEN_STATUSES:
+        return None
+    now = now or timezone.now()
+    if loaded is None:
+        return due_at(job.estimated_repair_time, job.created_at or now)
+    status, estimate = loaded
+    if estimate != job.estimated_repair_time or status not in OPEN_STATUSES:
+        return due_at(job.estimated_repair_time, now)
+    return job.due_at
+
+
+def due_today_end(now=None):
+    """Jobs due at or before this moment are late or due today"""
+    return end_of_day(timezone.localtime(now or timezone.now()).date())
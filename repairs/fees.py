@@ -0,0 +1,95 @@
+"""
+Storage fee policy for bikes left after they are ready for pickup.
+
+Fees start after STORAGE_FREE_DAYS at STORAGE_FEE_PER_DAY, counted from
+ready_notified_at. A bike is abandoned once it has been waiting for
+ABANDONMENT_MONTHS. Everything here is computed in SQL so any number of
+jobs can be listed, sorted and filtered by fee in a single query.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Case, When, Value, F, Q, Func, IntegerField, BooleanField, DateTimeField
+
+
+class DaysSince(Func):
+    """Whole days elapsed between a datetime column and `now`"""
+    output_field = IntegerField()
+
+    def __init__(self, expression, now, **extra):
+        super().__init__(Value(now, output_field=DateTimeField()), expression, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context,
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template='FLOOR(EXTRACT(EPOCH FROM (%(expressions)s)) / 86400)::integer',
+            arg_joiner=' - ',
+            **extra_context,
+        )
+
+
+def months_before(moment, months):
+    """Same day-of-month `months` calendar months earlier, clamped to month end"""
+    month_index = moment.year * 12 + moment.month - 1 - months
+    year, month = divmod(month_index, 12)
+    month += 1
+    for day in (moment.day, 30, 29, 28):
+        try:
+            return moment.replace(year=year, month=month, day=day)
+        except ValueError:
+            continue
+
+
+def fee_starts_before(now):
+    """Bikes notified before this moment are accruing storage fees"""
+    # The first fee is charged once a full day past the free period has elapsed
+    return now - timedelta(days=settings.STORAGE_FREE_DAYS + 1)
+
+
+def abandoned_before(now):
+    """Bikes notified before this moment count as abandoned"""
+    return months_before(now, settings.ABANDONMENT_MONTHS)
+
+
+def storage_annotations(now):
+    """
+    Annotations for a RepairJob queryset: storage_days, storage_fee,
+    is_overdue (fee accruing) and is_abandoned. Only READY jobs with a
+    ready notification are in storage; everything else gets 0/False.
+    """
+    in_storage = Q(status='READY', ready_notified_at__isnull=False)
+    return {
+        'storage_days': Case(
+            When(in_storage, then=DaysSince(F('ready_notified_at'), now)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        'storage_fee': Case(
+            When(
+                in_storage & Q(ready_notified_at__lt=fee_starts_before(now)),
+                then=(DaysSince(F('ready_notified_at'), now) - settings.STORAGE_FREE_DAYS)
+                * settings.STORAGE_FEE_PER_DAY,
+            ),
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        'is_overdue': Case(
+            When(in_storage & Q(ready_notified_at__lt=fee_starts_before(now)), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+        'is_abandoned': Case(
+            When(in_storage & Q(ready_notified_at__lt=abandoned_before(now)), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    }
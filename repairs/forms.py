@@ -1,5 +1,15 @@
 from django import forms
+from django.urls import reverse_lazy
 from .models import RepairJob, RepairJobPhoto
+from .phones import normalize_phone, is_valid_e164
+
+# Drop-off fields that suggest existing customers as staff type
+CUSTOMER_AUTOCOMPLETE = {
+    'hx-get': reverse_lazy('customer_lookup'),
+    'hx-trigger': 'keyup changed delay:250ms',
+    'hx-target': '#customer-suggestions',
+    'autocomplete': 'off',
+}
 
 class DropOffForm(forms.ModelForm):
     class Meta:
@@ -9,13 +19,15 @@ class DropOffForm(forms.ModelForm):
             'customer_name': forms.TextInput(attrs={
                 'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-amber-500 focus:border-transparent',
                 'placeholder': 'Enter your full name',
-                'required': True
+                'required': True,
+                **CUSTOMER_AUTOCOMPLETE,
             }),
             'phone_number': forms.TextInput(attrs={
                 'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-amber-500 focus:border-transparent',
                 'placeholder': '+32 499 12 34 56',
                 'required': True,
-                'type': 'tel'
+                'type': 'tel',
+                **CUSTOMER_AUTOCOMPLETE,
             }),
             'bike_description': forms.Textarea(attrs={
                 'class': 'w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-amber-500 focus:border-transparent',
@@ -32,6 +44,12 @@ class DropOffForm(forms.ModelForm):
             'bike_description': 'Bike Description (Optional)',
             'estimated_repair_time': 'Estimated Repair Time',
         }
+    
+    def clean_phone_number(self):
+        phone = normalize_phone(self.cleaned_data['phone_number'])
+        if not is_valid_e164(phone):
+            raise forms.ValidationError('Enter a valid phone number, e.g. +32 499 12 34 56.')
+        return phone
 
 class TrackingForm(forms.Form):
     job_id = forms.CharField(
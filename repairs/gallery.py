@@ -0,0 +1,43 @@
+"""
+Photo gallery of job_detail, a page at a time.
+
+job_detail renders the first GALLERY_PAGE_SIZE photos; the rest of the grid
+is fetched by job_photos as it is scrolled into view, and the modal asks
+job_photo for a photo that is not in the grid yet. Pages are read with
+.values(), so no model instances or related jobs are built, and numbered
+from 0 in upload order, which is also the order of the ZIP download. The
+first page also counts the job's photos, with COUNT() OVER (), so the page
+costs one query however many photos there are.
+"""
+
+from django.core.files.storage import default_storage
+from django.db.models import Count, Window
+
+GALLERY_PAGE_SIZE = 12
+
+GALLERY_FIELDS = ('pk', 'photo', 'description')
+
+
+def _page(job, offset, per_page, **annotations):
+    rows = list(
+        job.photos.order_by('uploaded_at', 'pk')
+        .values(*GALLERY_FIELDS, **annotations)[offset:offset + per_page + 1]
+    )
+    photos = [
+        {'index': offset + number, 'url': default_storage.url(row['photo']), 'description': row['description']}
+        for number, row in enumerate(rows[:per_page])
+    ]
+    return photos, rows
+
+
+def photo_page(job, offset=0, per_page=GALLERY_PAGE_SIZE):
+    """Photo dicts (index, url, description) of `job` after `offset`, and the offset of the page after, if any"""
+    photos, rows = _page(job, offset, per_page)
+    return photos, offset + per_page if len(rows) > per_page else None
+
+
+def first_page(job, per_page=GALLERY_PAGE_SIZE):
+    """The first page, the offset of the second and the number of photos, counted in the same query"""
+    photos, rows = _page(job, 0, per_page, total=Window(Count('pk')))
+    count = rows[0]['total'] if rows else 0
+    return photos, per_page if count > per_page else None, count
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from repairs.archive import archive_jobs, archive_candidates
+
+
+class Command(BaseCommand):
+    help = (
+        "Move completed jobs older than ARCHIVE_COMPLETED_AFTER_DAYS and jobs abandoned "
+        "for ABANDONMENT_MONTHS, with their photo rows, into the archive tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches so other writers get the lock')
+        parser.add_argument('--limit', type=int, default=None, help='Archive at most this many jobs')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the jobs due for archival')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            self.stdout.write(f"{archive_candidates().count()} jobs are due for archival")
+            return
+
+        def progress(jobs, photos):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  archived {jobs} jobs, {photos} photos")
+
+        start = time.perf_counter()
+        jobs, photos = archive_jobs(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            limit=options['limit'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {jobs} jobs and {photos} photos in {time.perf_counter() - start:.1f}s"
+        ))
@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from repairs import backups
+
+
+class Command(BaseCommand):
+    help = (
+        "Take a verified point-in-time copy of the SQLite database with the online backup API, "
+        "write a manifest of MEDIA_ROOT next to it and rotate old snapshots. Writers on the "
+        "live database are not blocked while it runs"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=settings.BACKUP_DIR, help='Snapshot directory (BACKUP_DIR)')
+        parser.add_argument('--compress', action='store_true', help='Gzip the snapshot once it is verified')
+        parser.add_argument('--quick-check', action='store_true',
+                            help='Verify with PRAGMA quick_check instead of the slower integrity_check')
+        parser.add_argument('--reporting', action='store_true',
+                            help='Also refresh the SQLite reporting snapshot from the verified copy')
+
+    def handle(self, *args, **options):
+        def progress(remaining, total):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {total - remaining}/{total} pages copied")
+
+        try:
+            snapshot = backups.take_snapshot(
+                backup_dir=options['dir'],
+                compress=options['compress'],
+                quick_check=options['quick_check'],
+                reporting=options['reporting'],
+                progress=progress,
+            )
+        except backups.BackupError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backed up {snapshot['pages']} pages ({snapshot['size'] / 1024 / 1024:.1f} MiB) "
+            f"in {snapshot['copy_seconds']:.1f}s to {snapshot['path']}"
+        ))
+        media = f"{snapshot['media_files']} media files ({snapshot['media_bytes'] / 1024 / 1024:.1f} MiB)"
+        if snapshot['media_changed'] is not None:
+            media += f", {snapshot['media_changed']} new or changed and {snapshot['media_removed']} removed since the last manifest"
+        self.stdout.write(f"Manifest {snapshot['manifest']}: {media}")
+        if snapshot['missing']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(snapshot['missing'])} photos in the snapshot are missing from MEDIA_ROOT, listed in the manifest"
+            ))
+        if snapshot['rotated']:
+            self.stdout.write(f"Rotated out {len(snapshot['rotated'])} old snapshots")
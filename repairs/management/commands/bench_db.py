@@ -0,0 +1,149 @@
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction, OperationalError, IntegrityError
+
+from alamana_repair import database
+from repairs.models import RepairJob
+
+# A write that waits longer than this was blocked behind another writer
+LOCK_WAIT_THRESHOLD = 0.1
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent drop-offs and dashboard reads under each database "
+        "profile and report throughput, latency and lock waits"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='sqlite-baseline,sqlite',
+                            help=f"Comma-separated profiles ({', '.join(database.PROFILES)})")
+        parser.add_argument('--writers', type=int, default=4, help='Parallel drop-off threads')
+        parser.add_argument('--readers', type=int, default=4, help='Parallel dashboard threads')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per profile')
+        parser.add_argument('--seed', type=int, default=1000, help='Jobs created before the run')
+
+    def handle(self, *args, **options):
+        profiles = [p.strip() for p in options['profiles'].split(',') if p.strip()]
+        for profile in profiles:
+            if profile not in database.PROFILES:
+                raise CommandError(f"Unknown profile '{profile}'")
+
+        for profile in profiles:
+            workdir = Path(tempfile.mkdtemp(prefix='bench_db_'))
+            alias = f"bench_{profile.replace('-', '_')}"
+            try:
+                self.setup_alias(alias, profile, workdir)
+                results = self.run_profile(alias, options)
+                self.report(profile, results, options['duration'])
+            finally:
+                database.unregister_database(alias)
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    def setup_alias(self, alias, profile, workdir):
+        """Register a throwaway database for the profile and migrate it"""
+        config = database.get_database_config(profile, workdir / 'bench.db')
+        if profile == 'postgresql':
+            config['NAME'] = f"{config['NAME']}_bench"
+        database.register_database(alias, config)
+        call_command('migrate', database=alias, verbosity=0, interactive=False)
+
+    def run_profile(self, alias, options):
+        RepairJob.objects.using(alias).bulk_create(
+            RepairJob(
+                job_id=f"AJ-{1001 + i}",
+                customer_name=f"Seed Customer {i}",
+                phone_number=f"+32499{i:06d}",
+                status=RepairJob.STATUS_CHOICES[i % len(RepairJob.STATUS_CHOICES)][0],
+            )
+            for i in range(options['seed'])
+        )
+
+        results = {
+            'write': [], 'read': [],
+            'lock_errors': 0, 'conflicts': 0,
+        }
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+
+        def record(kind, elapsed=None, error=None):
+            with lock:
+                if error:
+                    results[error] += 1
+                else:
+                    results[kind].append(elapsed)
+
+        def writer(n):
+            i = 0
+            while time.perf_counter() < deadline:
+                i += 1
+                start = time.perf_counter()
+                try:
+                    with transaction.atomic(using=alias):
+                        RepairJob(
+                            customer_name=f"Bench Writer {n}-{i}",
+                            phone_number='+32499000000',
+                            bike_description='Concurrent drop-off benchmark',
+                        ).save(using=alias)
+                    record('write', time.perf_counter() - start)
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    record('write', error='lock_errors')
+                except IntegrityError:
+                    # Two writers read the same last job_id
+                    record('write', error='conflicts')
+            connections[alias].close()
+
+        def reader():
+            jobs = RepairJob.objects.using(alias)
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    jobs.exclude(status='COMPLETED').count()
+                    jobs.filter(status='READY').count()
+                    jobs.filter(status='COMPLETED').count()
+                    list(jobs.select_related('created_by').exclude(status='COMPLETED')
+                         .order_by('-created_at')[:20])
+                    record('read', time.perf_counter() - start)
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    record('read', error='lock_errors')
+            connections[alias].close()
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(options['writers'])]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def report(self, profile, results, duration):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Profile: {profile}"))
+        for kind in ('write', 'read'):
+            latencies = sorted(results[kind])
+            if not latencies:
+                self.stdout.write(f"  {kind}s: none completed")
+                continue
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+            self.stdout.write(
+                f"  {kind}s: {len(latencies) / duration:8.1f}/s  "
+                f"p50 {statistics.median(latencies) * 1000:7.1f}ms  "
+                f"p95 {p95 * 1000:7.1f}ms  "
+                f"max {latencies[-1] * 1000:7.1f}ms"
+            )
+        lock_waits = sum(1 for t in results['write'] if t > LOCK_WAIT_THRESHOLD)
+        self.stdout.write(
+            f"  lock waits (>{LOCK_WAIT_THRESHOLD * 1000:.0f}ms): {lock_waits}  "
+            f"lock errors: {results['lock_errors']}  "
+            f"job_id conflicts: {results['conflicts']}"
+        )
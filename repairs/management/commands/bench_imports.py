@@ -0,0 +1,105 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+# What a web worker does before it can serve: set up Django and load the URLconf
+STARTUP = (
+    "import django; django.setup(); "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+# Heavy modules that are imported where they are used, never at startup
+LAZY_MODULES = ['qrcode', 'reportlab', 'requests', 'PIL']
+
+
+def parse_importtime(output):
+    """{module: (self_us, cumulative_us, depth)} from `python -X importtime` stderr"""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker startup import time with `python -X importtime` in fresh "
+        "interpreters, and fail if heavy modules are imported at startup or the "
+        "total grows beyond a baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters to measure')
+        parser.add_argument('--top', type=int, default=15, help='Show the slowest N top-level imports')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against a previous --output file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed growth of the median total over the baseline (0.2 = 20%%)')
+
+    def measure(self):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'alamana_repair.settings')}
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP],
+            capture_output=True, text=True, env=env,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Startup failed:\n{result.stderr[-2000:]}')
+        return parse_importtime(result.stderr)
+
+    def handle(self, *args, **options):
+        runs = [self.measure() for _ in range(max(options['repeat'], 1))]
+        totals = [sum(cumulative for _, cumulative, depth in run.values() if depth == 0) for run in runs]
+        total_ms = statistics.median(totals) / 1000
+
+        # Per-module cumulative time, median over the runs
+        modules = {}
+        for name, (_, _, depth) in runs[-1].items():
+            if depth == 0:
+                modules[name] = statistics.median(run[name][1] for run in runs if name in run) / 1000
+        self.stdout.write(f"Startup imports: {total_ms:.1f}ms median over {len(runs)} run(s), "
+                          f"{len(runs[-1])} modules")
+        for name, ms in sorted(modules.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f"  {name:48} {ms:8.1f}ms")
+
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'repeat': len(runs),
+            },
+            'total_ms': round(total_ms, 1),
+            'modules': {name: round(ms, 2) for name, ms in modules.items()},
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        problems = []
+        eager = [name for name in LAZY_MODULES if name in runs[-1]]
+        for name in eager:
+            problems.append(f"{name} is imported at startup; import it where it is used")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            if total_ms > baseline['total_ms'] * (1 + options['tolerance']):
+                problems.append(f"startup imports {baseline['total_ms']}ms -> {total_ms:.1f}ms")
+            new = sorted(set(modules) - set(baseline['modules']))
+            if new:
+                self.stdout.write(f"New top-level imports: {', '.join(new)}")
+
+        for problem in problems:
+            self.stdout.write(self.style.ERROR(f"REGRESSION {problem}"))
+        if problems:
+            raise CommandError(f"{len(problems)} import-time regression(s)")
+        self.stdout.write(self.style.SUCCESS('No import-time regressions'))
@@ -0,0 +1,87 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.template import engines
+from django.template.backends.django import Template as DjangoTemplate
+from django.test import RequestFactory
+
+from alamana_repair import database
+from repairs.middleware import PerformanceMiddleware, RequestMetrics, _current_metrics, observe_queries
+
+
+def view(request):
+    return HttpResponse('ok')
+
+
+class Command(BaseCommand):
+    help = "Measure the idle overhead of PerformanceMiddleware per request, query and template render"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        n = options['iterations']
+        self.stdout.write(self.style.MIGRATE_HEADING(f"PerformanceMiddleware overhead ({n} iterations)"))
+        self.report('request', *self.bench_request(n))
+        self.report('query', *self.bench_query(n))
+        self.report('template render', *self.bench_template(n))
+
+    def report(self, label, bare, instrumented, n):
+        overhead = (instrumented - bare) / n * 1e6
+        self.stdout.write(
+            f"  {label:16} bare {bare / n * 1e6:8.2f}us  "
+            f"instrumented {instrumented / n * 1e6:8.2f}us  "
+            f"overhead {overhead:+7.2f}us"
+        )
+
+    def timed(self, func, n, rounds=5):
+        """Best of several rounds, scaled back up to n calls"""
+        per_round = max(n // rounds, 1)
+        best = None
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(per_round):
+                func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best * n / per_round
+
+    def bench_request(self, n):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        middleware = None
+
+        def get_response(r):
+            return middleware.process_view(r, view, (), {}) or view(r)
+
+        middleware = PerformanceMiddleware(get_response)
+        bare = self.timed(lambda: view(request), n)
+        instrumented = self.timed(lambda: middleware(request), n)
+        return bare, instrumented, n
+
+    def bench_query(self, n):
+        connection = database.register_database(
+            'bench_instrumentation', {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        )
+        try:
+            with connection.cursor() as cursor:
+                bare = self.timed(lambda: cursor.execute('SELECT 1'), n)
+                with observe_queries(RequestMetrics()):
+                    instrumented = self.timed(lambda: cursor.execute('SELECT 1'), n)
+        finally:
+            database.unregister_database('bench_instrumentation')
+        return bare, instrumented, n
+
+    def bench_template(self, n):
+        template = engines['django'].from_string('{% for i in items %}{{ i }}{% endfor %}')
+        context = {'items': range(10)}
+        bare = self.timed(lambda: DjangoTemplate.render(template, context), n)
+        token = _current_metrics.set(RequestMetrics())
+        try:
+            instrumented = self.timed(lambda: template.render(context), n)
+        finally:
+            _current_metrics.reset(token)
+        return bare, instrumented, n
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import platform
+import threading
+import time
+from http.cookies import SimpleCookie
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.utils import timezone
+
+from repairs.management.commands.bench_urls import build_scenarios, percentile
+from repairs.middleware import observe_queries
+from repairs.models import RepairJob
+
+# The async views and the scenarios that exercise them
+ASYNC_SCENARIOS = [
+    'track_repair:qr',
+    'dashboard_content',
+    'dashboard_content:completed',
+    'dashboard_stats',
+    'total_summary_filtered',
+]
+
+
+def query_latency(seconds):
+    """execute_wrapper hook adding a network round trip to every query"""
+    def add_latency(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+    return add_latency
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test one process: the same requests through the WSGI handler with a fixed "
+        "number of worker threads, then through the ASGI handler on one event loop, with "
+        "the same number of concurrent clients, and compare throughput and latency. "
+        "Measures the handler and database side only; slow client sockets are not simulated"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients')
+        parser.add_argument('--threads', type=int, default=4,
+                            help='WSGI worker threads per process, e.g. gunicorn --threads')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario and mode')
+        parser.add_argument('--only', default='', help='Comma-separated scenario keys')
+        parser.add_argument('--mode', choices=['both', 'wsgi', 'asgi'], default='both')
+        parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                            help='Add this round trip to every query, as with a database over the network')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        job = (RepairJob.objects.filter(photos__isnull=False).first()
+               or RepairJob.objects.first())
+        if job is None:
+            raise CommandError('No repair jobs found. Run seed_jobs first.')
+
+        staff, _ = User.objects.get_or_create(username='bench-staff', defaults={'is_staff': True})
+        if not staff.is_staff:
+            raise CommandError("User 'bench-staff' exists but is not staff")
+
+        keys = [k.strip() for k in options['only'].split(',') if k.strip()] or ASYNC_SCENARIOS
+        scenarios = [s for s in build_scenarios(job) if s.key in keys]
+        modes = ['wsgi', 'asgi'] if options['mode'] == 'both' else [options['mode']]
+
+        self.stdout.write(
+            f"{options['concurrency']} clients, {options['threads']} WSGI threads, "
+            f"{settings.DB_READ_THREADS} DB read threads, {options['requests']} requests per run, "
+            f"{options['db_latency_ms']}ms added per query"
+        )
+        results = {}
+        logging.getLogger('repairs.performance').disabled = True
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for scenario in scenarios:
+                results[scenario.key] = {}
+                for mode in modes:
+                    run = self.run_wsgi if mode == 'wsgi' else self.run_asgi
+                    result = run(scenario, staff, options)
+                    results[scenario.key][mode] = result
+                    self.print_result(f'{scenario.key} [{mode}]', result)
+                if len(modes) == 2 and results[scenario.key]['wsgi']['throughput_rps']:
+                    ratio = results[scenario.key]['asgi']['throughput_rps'] / results[scenario.key]['wsgi']['throughput_rps']
+                    self.stdout.write(f"{'':40} ASGI/WSGI throughput x{ratio:.2f}")
+
+        if options['output']:
+            report = {
+                'meta': {
+                    'timestamp': timezone.now().isoformat(),
+                    'python': platform.python_version(),
+                    'jobs': RepairJob.objects.count(),
+                    'concurrency': options['concurrency'],
+                    'threads': options['threads'],
+                    'db_read_threads': settings.DB_READ_THREADS,
+                    'requests': options['requests'],
+                    'db_latency_ms': options['db_latency_ms'],
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def session_cookies(self, scenario, staff):
+        """Log in once up front, so logins don't count against either handler"""
+        client = Client()
+        if scenario.staff:
+            client.force_login(staff)
+        return client.cookies
+
+    def run_wsgi(self, scenario, staff, options):
+        """Each client on its own thread; a semaphore stands in for the worker threads"""
+        latencies, statuses = [], {}
+        lock = threading.Lock()
+        workers = threading.Semaphore(options['threads'])
+        ready = threading.Barrier(options['concurrency'] + 1)
+        remaining = [options['requests']]
+        cookies = self.session_cookies(scenario, staff)
+
+        def client_loop():
+            client = Client(raise_request_exception=False)
+            client.cookies = SimpleCookie(cookies)
+            request = getattr(client, scenario.method)
+            ready.wait()
+            with observe_queries(query_latency(options['db_latency_ms'] / 1000)):
+                while True:
+                    with lock:
+                        if remaining[0] <= 0:
+                            break
+                        remaining[0] -= 1
+                    start = time.perf_counter()
+                    with workers:
+                        response = request(scenario.url, scenario.data, headers=scenario.headers, secure=True)
+                        b''.join(response) if response.streaming else response.content
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            connections.close_all()
+
+        threads = [threading.Thread(target=client_loop) for _ in range(options['concurrency'])]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return self.summarize(latencies, statuses, time.perf_counter() - start)
+
+    def run_asgi(self, scenario, staff, options):
+        """Every client as a task on one event loop, as under an ASGI server"""
+        return asyncio.run(self.asgi_clients(scenario, self.session_cookies(scenario, staff), options))
+
+    async def asgi_clients(self, scenario, cookies, options):
+        latencies, statuses = [], {}
+        remaining = [options['requests']]
+
+        async def client_loop():
+            client = AsyncClient(raise_request_exception=False)
+            client.cookies = SimpleCookie(cookies)
+            request = getattr(client, scenario.method)
+            with observe_queries(query_latency(options['db_latency_ms'] / 1000)):
+                while remaining[0] > 0:
+                    remaining[0] -= 1
+                    start = time.perf_counter()
+                    # The ASGI server gives each request its own thread for sync code
+                    async with ThreadSensitiveContext():
+                        response = await request(scenario.url, scenario.data, headers=scenario.headers, secure=True)
+                        if response.streaming:
+                            async for _ in response:
+                                pass
+                    latencies.append(time.perf_counter() - start)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(options['concurrency'])))
+        return self.summarize(latencies, statuses, time.perf_counter() - start)
+
+    def summarize(self, latencies, statuses, wall):
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': sum(count for status, count in statuses.items() if status >= 500),
+            'status_codes': {str(status): count for status, count in sorted(statuses.items())},
+            'throughput_rps': round(len(latencies) / wall, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        }
+
+    def print_result(self, key, result):
+        style = self.style.ERROR if result['errors'] else (lambda s: s)
+        self.stdout.write(style(
+            f"{key:40} {result['throughput_rps']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.1f}ms  p90 {result['p90_ms']:7.1f}ms  p99 {result['p99_ms']:7.1f}ms  "
+            f"errors {result['errors']}"
+        ))
@@ -0,0 +1,94 @@
+import logging
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from repairs.management.commands.bench_urls import HTMX, percentile
+from repairs.middleware import observe_queries
+
+# Django's defaults: every request reads the session row and the user
+BEFORE = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+}
+
+
+class QueryLog:
+    """execute_wrapper hook counting queries, and those touching the session or user tables"""
+
+    def __init__(self):
+        self.total = self.session = self.session_writes = self.user = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        if 'django_session' in sql:
+            self.session += 1
+            if not sql.lstrip().upper().startswith('SELECT'):
+                self.session_writes += 1
+        elif sql.lstrip().upper().startswith('SELECT') and 'FROM "auth_user"' in sql:
+            self.user += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a staff member's polling (dashboard stats and summary refresh) with "
+        "Django's database sessions and uncached user, then with the configured cache "
+        "sessions and CachedModelBackend, and report queries per poll"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--polls', type=int, default=50, help='Requests per endpoint and setup')
+
+    def handle(self, *args, **options):
+        staff, _ = User.objects.get_or_create(username='bench-staff', defaults={'is_staff': True})
+        if not staff.is_staff:
+            raise CommandError("User 'bench-staff' exists but is not staff")
+
+        polls = [
+            ('dashboard_stats', reverse('dashboard_stats')),
+            ('total_summary_filtered', f"{reverse('total_summary_filtered')}?filter=all"),
+        ]
+        setups = [
+            ('before', 'db sessions, ModelBackend', BEFORE),
+            ('after', f"{settings.SESSION_ENGINE.rsplit('.', 1)[-1]} sessions on "
+                      f"{settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1]}, CachedModelBackend", {}),
+        ]
+
+        logging.getLogger('repairs.performance').disabled = True
+        for label, description, overrides in setups:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{label}: {description}"))
+            with override_settings(ALLOWED_HOSTS=['testserver'], **overrides):
+                cache.clear()
+                client = Client()
+                client.force_login(staff)
+                for name, url in polls:
+                    self.report(name, self.poll(client, url, options['polls']))
+
+    def poll(self, client, url, count):
+        latencies, logs = [], []
+        for _ in range(count):
+            with observe_queries(QueryLog()) as log:
+                start = time.perf_counter()
+                response = client.get(url, headers=HTMX, secure=True)
+                latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}")
+            logs.append(log)
+        latencies.sort()
+        return latencies, logs
+
+    def report(self, name, result):
+        latencies, logs = result
+        mean = lambda attr: statistics.fmean(getattr(log, attr) for log in logs)
+        self.stdout.write(
+            f"  {name:24} queries/poll {mean('total'):5.2f}  session {mean('session'):4.2f} "
+            f"(writes {mean('session_writes'):4.2f})  user {mean('user'):4.2f}  "
+            f"p50 {percentile(latencies, 50) * 1000:6.1f}ms"
+        )
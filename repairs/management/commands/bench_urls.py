@@ -0,0 +1,266 @@
+import json
+import logging
+import platform
+import statistics
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from repairs import urls as repair_urls
+from repairs.middleware import RequestMetrics, observe_queries
+from repairs.models import RepairJob
+
+HTMX = {'HX-Request': 'true'}
+
+# URL names that are deliberately not replayed
+SKIPPED = {
+    'logout': 'ends the benchmark session',
+    'job_delete': 'destructive',
+    'upload_create': 'stateful chunked upload protocol',
+    'upload_chunk': 'stateful chunked upload protocol',
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    index = max(int(round(pct / 100 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class Scenario:
+    def __init__(self, key, url, method='get', data=None, headers=None, staff=True, writes=False):
+        self.key = key
+        self.url = url
+        self.method = method
+        self.data = data or {}
+        self.headers = headers or {}
+        self.staff = staff
+        self.writes = writes
+
+
+def build_scenarios(job):
+    """One or more request scenarios per URL name in repairs/urls.py"""
+    today = timezone.now().date()
+    job_kwargs = {'job_id': job.job_id}
+    track_params = urlencode({'job_id': job.job_id, 'phone': job.phone_number})
+    return [
+        Scenario('home', reverse('home'), staff=False),
+        Scenario('login', reverse('login'), staff=False),
+        Scenario('drop_off', reverse('drop_off')),
+        Scenario('drop_off:post', reverse('drop_off'), 'post', {
+            'customer_name': 'Benchmark Customer',
+            'phone_number': '+32 499 00 00 00',
+            'bike_description': 'Load test',
+            'estimated_repair_time': '1-2_DAYS',
+        }, HTMX, writes=True),
+        Scenario('customer_lookup', f"{reverse('customer_lookup')}?phone_number=0499", headers=HTMX),
+        Scenario('customer_lookup:name', f"{reverse('customer_lookup')}?customer_name=so", headers=HTMX),
+        Scenario('receipt', reverse('receipt', kwargs=job_kwargs)),
+        Scenario('track_repair', reverse('track_repair'), staff=False),
+        Scenario('track_repair:qr', f"{reverse('track_repair')}?{track_params}", staff=False),
+        Scenario('track_repair:post', reverse('track_repair'), 'post',
+                 {'job_id': job.job_id, 'phone_number': job.phone_number}, HTMX, staff=False),
+        Scenario('dashboard', reverse('dashboard')),
+        Scenario('dashboard_content', reverse('dashboard_content'), headers=HTMX),
+        Scenario('dashboard_content:search', f"{reverse('dashboard_content')}?search=an&sort=-estimated_cost",
+                 headers=HTMX),
+        Scenario('dashboard_content:completed', f"{reverse('dashboard_content')}?show_completed=true&page=2",
+                 headers=HTMX),
+        Scenario('dashboard_content:due', f"{reverse('dashboard_content')}?due=today", headers=HTMX),
+        Scenario('dashboard_content:due_sort', f"{reverse('dashboard_content')}?sort=-due_at", headers=HTMX),
+        Scenario('dashboard_stats', reverse('dashboard_stats'), headers=HTMX),
+        Scenario('status_board', reverse('status_board')),
+        Scenario('status_board_content', reverse('status_board_content'), headers=HTMX),
+        Scenario('status_board_cards', f"{reverse('status_board_cards')}?status=COMPLETED&offset=12", headers=HTMX),
+        Scenario('job_status_update', reverse('job_status_update', kwargs=job_kwargs), 'post',
+                 {'status': 'IN_PROGRESS'}, HTMX, writes=True),
+        Scenario('job_detail', reverse('job_detail', kwargs=job_kwargs)),
+        Scenario('job_photos', f"{reverse('job_photos', kwargs=job_kwargs)}?offset=0", headers=HTMX),
+        Scenario('job_photo', reverse('job_photo', kwargs={**job_kwargs, 'index': 0})),
+        Scenario('job_quick_action', reverse('job_quick_action', kwargs=job_kwargs), 'post',
+                 {'action': 'mark_ready'}, HTMX, writes=True),
+        Scenario('job_delete_confirm', reverse('job_delete_confirm', kwargs=job_kwargs), headers=HTMX),
+        Scenario('api_job_list', reverse('api_job_list')),
+        Scenario('api_job_list:filtered', f"{reverse('api_job_list')}?" + urlencode({
+            'fields': 'job_id,status,storage_days,storage_fee',
+            'status': 'READY',
+            'limit': 200,
+        })),
+        Scenario('api_job_list:since', f"{reverse('api_job_list')}?" + urlencode({
+            'since': (timezone.now() - timedelta(hours=1)).isoformat(),
+        })),
+        Scenario('api_job_detail', reverse('api_job_detail', kwargs=job_kwargs)),
+        Scenario('total_summary', reverse('total_summary')),
+        Scenario('total_summary_filtered', f"{reverse('total_summary_filtered')}?filter=month", headers=HTMX),
+        Scenario('total_summary_filtered:all', f"{reverse('total_summary_filtered')}?filter=all", headers=HTMX),
+        Scenario('total_summary_filtered:custom', f"{reverse('total_summary_filtered')}?" + urlencode({
+            'filter': 'custom',
+            'start_date': (today.replace(day=1)).isoformat(),
+            'end_date': today.isoformat(),
+        }), headers=HTMX),
+        Scenario('summary_report', f"{reverse('summary_report')}?filter=month"),
+        Scenario('photo_archive', f"{reverse('photo_archive')}?job_id={job.job_id}"),
+        Scenario('photo_archive:period', f"{reverse('photo_archive')}?filter=today"),
+        Scenario('metrics', reverse('metrics')),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay every URL in repairs/urls.py under concurrency against the current "
+        "database and report latency percentiles, throughput and query counts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=50, help='Requests per scenario')
+        parser.add_argument('--only', default='', help='Comma-separated scenario keys or URL names')
+        parser.add_argument('--writes', action='store_true', help='Include scenarios that modify data')
+        parser.add_argument('--accept-encoding', default='',
+                            help="Send this Accept-Encoding header, e.g. 'gzip, br', to measure compressed sizes")
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against a previous --output file')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed p90 latency growth over the baseline (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        job = (RepairJob.objects.filter(photos__isnull=False).first()
+               or RepairJob.objects.first())
+        if job is None:
+            raise CommandError('No repair jobs found. Run seed_jobs first.')
+
+        staff, _ = User.objects.get_or_create(username='bench-staff', defaults={'is_staff': True})
+        if not staff.is_staff:
+            raise CommandError("User 'bench-staff' exists but is not staff")
+
+        scenarios = build_scenarios(job)
+        only = {k.strip() for k in options['only'].split(',') if k.strip()}
+        if only:
+            scenarios = [s for s in scenarios if s.key in only or s.key.split(':')[0] in only]
+        if not options['writes']:
+            scenarios = [s for s in scenarios if not s.writes]
+
+        covered = {s.key.split(':')[0] for s in build_scenarios(job)} | set(SKIPPED)
+        for pattern in repair_urls.urlpatterns:
+            if pattern.name not in covered:
+                self.stderr.write(self.style.WARNING(f"No benchmark scenario for URL '{pattern.name}'"))
+
+        results = {}
+        # Every request would otherwise land in the slow-request log
+        logging.getLogger('repairs.performance').disabled = True
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for scenario in scenarios:
+                results[scenario.key] = self.run_scenario(scenario, staff, options)
+                self.print_result(scenario.key, results[scenario.key])
+
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'jobs': RepairJob.objects.count(),
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = self.compare(results, baseline['results'], options['tolerance'])
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def run_scenario(self, scenario, staff, options):
+        latencies, queries, sizes, statuses = [], [], [], {}
+        headers = dict(scenario.headers)
+        if options['accept_encoding']:
+            headers['Accept-Encoding'] = options['accept_encoding']
+        lock = threading.Lock()
+        remaining = [options['requests']]
+
+        def worker():
+            # Count server errors instead of aborting the run
+            client = Client(raise_request_exception=False)
+            if scenario.staff:
+                client.force_login(staff)
+            request = getattr(client, scenario.method)
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+                # Also counts the queries async views run on the read threads
+                with observe_queries(RequestMetrics()) as captured:
+                    start = time.perf_counter()
+                    response = request(scenario.url, scenario.data, headers=headers, secure=True)
+                    size = len(b''.join(response) if response.streaming else response.content)
+                    elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    queries.append(captured.query_count)
+                    sizes.append(size)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['concurrency'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': sum(count for status, count in statuses.items() if status >= 500),
+            'status_codes': {str(status): count for status, count in sorted(statuses.items())},
+            'throughput_rps': round(len(latencies) / wall, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else 0,
+            'queries_mean': round(statistics.fmean(queries), 1) if queries else 0,
+            'queries_max': max(queries, default=0),
+            'bytes_mean': round(statistics.fmean(sizes)) if sizes else 0,
+        }
+
+    def print_result(self, key, result):
+        style = self.style.ERROR if result['errors'] else (lambda s: s)
+        self.stdout.write(style(
+            f"{key:32} {result['throughput_rps']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.1f}ms  p90 {result['p90_ms']:7.1f}ms  p99 {result['p99_ms']:7.1f}ms  "
+            f"queries {result['queries_mean']:5.1f} (max {result['queries_max']})  "
+            f"{result.get('bytes_mean', 0) / 1024:7.1f}KB  "
+            f"errors {result['errors']}"
+        ))
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for key, result in results.items():
+            base = baseline.get(key)
+            if not base:
+                continue
+            if result['p90_ms'] > base['p90_ms'] * (1 + tolerance):
+                regressions.append(f"{key}: p90 {base['p90_ms']}ms -> {result['p90_ms']}ms")
+            if result['queries_max'] > base['queries_max']:
+                regressions.append(f"{key}: queries {base['queries_max']} -> {result['queries_max']}")
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(f"REGRESSION {regression}"))
+        return regressions
@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from repairs.models import PhotoBlob, RepairJobPhoto, ArchivedRepairJobPhoto
+
+
+def stored_names():
+    """Every storage name a blob or a photo row points at, active and archived"""
+    names = set(PhotoBlob.objects.values_list('name', flat=True))
+    for model in (RepairJobPhoto, ArchivedRepairJobPhoto):
+        names.update(model.objects.order_by().values_list('photo', flat=True).distinct())
+    names.discard('')
+    return sorted(names)
+
+
+def copy_file(source, target, name, dry_run=False):
+    """('copied'|'present'|'missing', bytes copied) for one name"""
+    try:
+        size = source.size(name)
+    except FileNotFoundError:
+        return 'missing', 0
+    try:
+        if target.size(name) == size:
+            return 'present', 0
+    except FileNotFoundError:
+        pass
+    if dry_run:
+        return 'copied', size
+    # A partial copy from an interrupted run would make save() pick another name
+    if target.exists(name):
+        target.delete(name)
+    with source.open(name, 'rb') as f:
+        saved = target.save(name, f)
+    if saved != name:
+        raise CommandError(f"{name} was stored as {saved}")
+    return 'copied', size
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the photo files of every blob and photo row from MEDIA_ROOT into the configured "
+        "storage (PHOTO_STORAGE), several at a time. Files already there with the same size "
+        "are skipped, so it can be run again after an interruption or before switching over"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=settings.MEDIA_ROOT, help='Directory to copy from (MEDIA_ROOT)')
+        parser.add_argument('--workers', type=int, default=8, help='Files copied in parallel')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be copied')
+
+    def handle(self, *args, **options):
+        source = FileSystemStorage(location=options['source'])
+        target = default_storage
+        if isinstance(target, FileSystemStorage) and target.path('') == source.path(''):
+            raise CommandError('PHOTO_STORAGE stores photos in the source directory already; nothing to copy')
+
+        names = stored_names()
+        start = time.perf_counter()
+        totals = {'copied': 0, 'present': 0, 'missing': 0}
+        copied_bytes = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            results = pool.map(lambda name: copy_file(source, target, name, options['dry_run']), names)
+            for done, (outcome, size) in enumerate(results, 1):
+                totals[outcome] += 1
+                copied_bytes += size
+                if options['verbosity'] > 1 and done % 500 == 0:
+                    self.stdout.write(f"  {done}/{len(names)} files")
+
+        verb = 'would be copied' if options['dry_run'] else 'copied'
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(names)} files checked in {time.perf_counter() - start:.1f}s: {totals['copied']} {verb} "
+            f"({copied_bytes / 1024 / 1024:.1f}MB), {totals['present']} already stored"
+        ))
+        if totals['missing']:
+            self.stdout.write(self.style.WARNING(f"{totals['missing']} files are missing from {options['source']}"))
@@ -0,0 +1,59 @@
+import sys
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from repairs import archive, photo_zip, reports
+from repairs.models import RepairJob
+from repairs.management.commands.period_report import FILTERS
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a ZIP of the photos of one job, or of the jobs created in a period as on the "
+        "Total Summary page. The archive is streamed to the output as it is built"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', help='Job ID, active or archived')
+        parser.add_argument('--filter', choices=FILTERS, default='month')
+        parser.add_argument('--start-date', type=date.fromisoformat, help='YYYY-MM-DD, with --filter custom')
+        parser.add_argument('--end-date', type=date.fromisoformat, help='YYYY-MM-DD, with --filter custom')
+        parser.add_argument('--output', help="File to write, '-' for stdout; defaults to the archive name in the current directory")
+
+    def handle(self, *args, **options):
+        if options['job']:
+            try:
+                job = archive.find_job(job_id=options['job'])
+            except RepairJob.DoesNotExist as e:
+                raise CommandError(str(e))
+            photos = photo_zip.job_photos(job)
+            filename = photo_zip.zip_filename(job_id=job.job_id)
+        else:
+            if options['filter'] == 'custom' and not (options['start_date'] and options['end_date']):
+                raise CommandError('--filter custom needs --start-date and --end-date')
+            start, end = reports.get_date_range(options['filter'], options['start_date'], options['end_date'])
+            photos = photo_zip.period_photos(start, end)
+            filename = photo_zip.zip_filename(start=start, end=end)
+
+        output = options['output'] or filename
+        began = time.perf_counter()
+        missing, written = [], 0
+        f = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in photo_zip.stream_zip(photos, missing):
+                f.write(chunk)
+                written += len(chunk)
+        finally:
+            if f is not sys.stdout.buffer:
+                f.close()
+
+        # Keep stdout clean for the archive itself
+        log = self.stderr if output == '-' else self.stdout
+        if missing:
+            log.write(self.style.WARNING(f"{len(missing)} photo files missing from storage, listed in MISSING.txt"))
+        log.write(self.style.SUCCESS(
+            f"Wrote {len(photos) - len(missing)} photos ({written / 1024 / 1024:.1f} MiB) to {output} "
+            f"in {time.perf_counter() - began:.1f}s"
+        ))
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from repairs import blobs
+from repairs.models import PhotoBlob, RepairJobPhoto, ArchivedRepairJobPhoto
+
+
+def hash_file(name):
+    """(sha256, size) of a stored file, or None if it is missing"""
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with default_storage.open(name, 'rb') as f:
+            while block := f.read(1024 * 1024):
+                digest.update(block)
+                size += len(block)
+    except (FileNotFoundError, OSError):
+        return None
+    return digest.hexdigest(), size
+
+
+def link_file(name, target):
+    """
+    Make the file also available as `target`: a hard link when the storage is
+    local, a copy otherwise. The old name is removed once the rows pointing at
+    the new one have committed.
+    """
+    try:
+        source, destination = default_storage.path(name), default_storage.path(target)
+    except NotImplementedError:
+        with default_storage.open(name, 'rb') as f:
+            return default_storage.save(target, f)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.link(source, destination)
+    except FileExistsError:
+        pass  # Left behind by an interrupted earlier run
+    except OSError:
+        shutil.copyfile(source, destination)
+    return target
+
+
+class Command(BaseCommand):
+    help = (
+        "Move existing photo files into content-addressed storage: hash them in "
+        "parallel, keep one file per distinct content and link photo rows to it"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 4,
+                            help='Threads hashing files in parallel')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only hash and report how much space deduplication would save')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        totals = {'photos': 0, 'files': 0, 'duplicates': 0, 'missing': 0, 'bytes_saved': 0}
+        # Storage name -> blob, for names seen in an earlier batch or table
+        converted = {}
+        seen_hashes = set()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for model in (RepairJobPhoto, ArchivedRepairJobPhoto):
+                last_id = 0
+                while True:
+                    rows = list(
+                        model.objects.filter(blob__isnull=True, id__gt=last_id)
+                        .order_by('id').values_list('id', 'photo')[:options['batch_size']]
+                    )
+                    if not rows:
+                        break
+                    last_id = rows[-1][0]
+                    by_name = {}
+                    for photo_id, name in rows:
+                        by_name.setdefault(name, []).append(photo_id)
+
+                    to_hash = [name for name in by_name if name and name not in converted]
+                    hashes = dict(zip(to_hash, pool.map(hash_file, to_hash)))
+
+                    if options['dry_run']:
+                        for name, result in hashes.items():
+                            if result is None:
+                                totals['missing'] += 1
+                            elif result[0] in seen_hashes:
+                                totals['duplicates'] += 1
+                                totals['bytes_saved'] += result[1]
+                            else:
+                                seen_hashes.add(result[0])
+                                totals['files'] += 1
+                        totals['photos'] += len(rows)
+                        continue
+
+                    self.convert_batch(model, by_name, hashes, converted, totals)
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"  {model.__name__}: {totals['photos']} photos linked")
+
+        verb = 'would be' if options['dry_run'] else 'were'
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['photos']} photos checked in {time.perf_counter() - start:.1f}s: "
+            f"{totals['files']} distinct files, {totals['duplicates']} duplicates {verb} removed "
+            f"({totals['bytes_saved'] / 1024 / 1024:.1f}MB), {totals['missing']} files missing"
+        ))
+
+    def convert_batch(self, model, by_name, hashes, converted, totals):
+        old_files = []
+        with transaction.atomic():
+            for name, photo_ids in by_name.items():
+                blob = converted.get(name)
+                if blob is None:
+                    result = hashes.get(name)
+                    if result is None:
+                        totals['missing'] += 1
+                        continue
+                    sha256, size = result
+                    blob = PhotoBlob.objects.filter(sha256=sha256).first()
+                    if blob is None:
+                        target = link_file(name, blobs.blob_name(sha256, name))
+                        blob = PhotoBlob.objects.create(sha256=sha256, name=target, size=size)
+                        totals['files'] += 1
+                    else:
+                        totals['duplicates'] += 1
+                        totals['bytes_saved'] += size
+                    converted[name] = blob
+                    if name != blob.name:
+                        old_files.append(name)
+
+                model.objects.filter(id__in=photo_ids).update(blob=blob, photo=blob.name)
+                blobs.retain([blob.pk] * len(photo_ids))
+                totals['photos'] += len(photo_ids)
+        # The same bytes are now stored under the blob's name
+        blobs.delete_files_on_commit(old_files)
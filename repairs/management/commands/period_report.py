@@ -0,0 +1,36 @@
+import shutil
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from repairs import reports
+
+FILTERS = ['all', 'today', 'week', 'month', 'quarter', 'year', 'custom']
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the PDF revenue report for a period, as offered on the Total Summary page. "
+        "Reports for periods that have ended are cached in REPORT_CACHE_DIR"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filter', choices=FILTERS, default='month')
+        parser.add_argument('--start-date', type=date.fromisoformat, help='YYYY-MM-DD, with --filter custom')
+        parser.add_argument('--end-date', type=date.fromisoformat, help='YYYY-MM-DD, with --filter custom')
+        parser.add_argument('--output', help='File to write, defaults to the report name in the current directory')
+
+    def handle(self, *args, **options):
+        if options['filter'] == 'custom' and not (options['start_date'] and options['end_date']):
+            raise CommandError('--filter custom needs --start-date and --end-date')
+
+        start, end = reports.get_date_range(options['filter'], options['start_date'], options['end_date'])
+        began = time.perf_counter()
+        report, filename = reports.period_report(start, end)
+        output = options['output'] or filename
+        with report, open(output, 'wb') as f:
+            shutil.copyfileobj(report, f)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {output} in {time.perf_counter() - began:.1f}s"
+        ))
@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from repairs import scheduler
+from repairs.tasks import TASKS
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the periodic tasks in SCHEDULER_TASKS (pickup reminders, abandonment "
+        "flags, rollup refresh). Safe to start on every node; a database lease "
+        "makes sure each task runs on one node at a time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run the tasks due this minute and exit')
+        parser.add_argument('--run', metavar='TASK', action='append', default=[],
+                            help='Run this task now regardless of its schedule, then exit (repeatable)')
+
+    def handle(self, *args, **options):
+        for name, expression in settings.SCHEDULER_TASKS.items():
+            if name not in TASKS:
+                raise CommandError(f"SCHEDULER_TASKS entry '{name}' has no task in repairs/tasks.py")
+            try:
+                scheduler.parse_cron(expression)
+            except ValueError as e:
+                raise CommandError(f"SCHEDULER_TASKS entry '{name}': {e}")
+
+        owner = scheduler.node_name()
+        if options['run']:
+            for name in options['run']:
+                if name not in TASKS:
+                    raise CommandError(f"Unknown task '{name}'. Choose from: {', '.join(TASKS)}")
+                self.report(name, scheduler.run_task(name, TASKS[name], owner, timezone.now(), force=True))
+            return
+
+        self.stdout.write(f"Scheduler {owner} running {', '.join(settings.SCHEDULER_TASKS)}")
+        while True:
+            now = timezone.now()
+            for name in scheduler.due_tasks(now, TASKS):
+                self.report(name, scheduler.run_task(name, TASKS[name], owner, now))
+            if options['once']:
+                return
+            # Don't hold connections open while sleeping until the next minute
+            connections.close_all()
+            time.sleep(60 - timezone.now().second)
+
+    def report(self, name, result):
+        if result is None:
+            self.stdout.write(f"{name}: skipped, another node ran or is running it")
+        else:
+            self.stdout.write(f"{name}: {result}")
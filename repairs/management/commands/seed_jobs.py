@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from repairs.seed import seed_jobs, parse_status_mix
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic repair jobs and photos for benchmarking (1k to 1M jobs)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1000, help='Number of jobs to create')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for a reproducible dataset')
+        parser.add_argument('--status-mix', default='',
+                            help="Weights per status, e.g. 'READY=5,COMPLETED=80'")
+        parser.add_argument('--photos-per-job', type=float, default=0.0,
+                            help='Average photos per job, written under MEDIA_ROOT')
+        parser.add_argument('--days', type=int, default=365, help='Spread jobs over the last N days')
+        parser.add_argument('--media-root', default=None, help='Write photos here instead of MEDIA_ROOT')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['count'] <= 1_000_000:
+            raise CommandError('--count must be between 1 and 1,000,000')
+        try:
+            status_mix = parse_status_mix(options['status_mix']) if options['status_mix'] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        def progress(jobs, photos):
+            self.stdout.write(f"  {jobs} jobs, {photos} photos", ending='\r')
+            self.stdout.flush()
+
+        start = time.perf_counter()
+        jobs, photos = seed_jobs(
+            options['count'],
+            seed=options['seed'],
+            status_mix=status_mix,
+            photos_per_job=options['photos_per_job'],
+            days=options['days'],
+            media_root=options['media_root'],
+            using=options['database'],
+            progress=progress if options['verbosity'] > 0 else None,
+        )
+        if options['verbosity'] > 0:
+            self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {jobs} jobs and {photos} photos in {time.perf_counter() - start:.1f}s"
+        ))
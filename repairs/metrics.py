@@ -0,0 +1,289 @@
+"""
+Prometheus metrics for the repairs app, served on /metrics.
+
+Counters and histograms live in a plain dict per process, so recording one
+on a hot path is a lock and a few additions. gunicorn runs several worker
+processes (and the scheduler runs in its own), so every process also writes
+its totals to METRICS_DIR/<pid>-<start>.json: from a background thread every
+METRICS_FLUSH_SECONDS while something changed, and at exit. A scrape, which
+lands on any one worker, flushes that worker and adds up every file in the
+directory. Files of exited processes are kept so counters never go
+backwards; clear METRICS_DIR when the server is (re)started. With
+METRICS_DIR empty nothing is written and a scrape only sees its own process.
+
+Gauges that describe the data rather than the traffic (jobs per status,
+photo bytes stored) are read from the database at scrape time.
+
+The endpoint is for staff sessions, or for a scraper sending
+`Authorization: Bearer <METRICS_TOKEN>` when METRICS_TOKEN is set.
+"""
+
+import atexit
+import bisect
+import hmac
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count, Sum
+from django.http import HttpResponse
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100_000, 250_000, 500_000, 1_000_000, 2_000_000, 5_000_000, 10_000_000, 20_000_000, 50_000_000)
+
+_registry = {}
+# (metric name, label values, field) -> total in this process; field is
+# 'value' for counters, 'sum', 'count' or a bucket index for histograms
+_values = {}
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_changed = False
+_flusher_started = False
+_started = int(time.time())
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        _registry[name] = self
+
+    def inc(self, amount=1, **labels):
+        key = (self.name, tuple(str(labels[name]) for name in self.labelnames), 'value')
+        with _lock:
+            _values[key] = _values.get(key, 0) + amount
+        _record_changed()
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        _registry[name] = self
+
+    def observe(self, value, **labels):
+        label_values = tuple(str(labels[name]) for name in self.labelnames)
+        # Counts per bucket; they are made cumulative when rendered
+        bucket = (self.name, label_values, bisect.bisect_left(self.buckets, value))
+        total = (self.name, label_values, 'sum')
+        count = (self.name, label_values, 'count')
+        with _lock:
+            _values[bucket] = _values.get(bucket, 0) + 1
+            _values[total] = _values.get(total, 0) + value
+            _values[count] = _values.get(count, 0) + 1
+        _record_changed()
+
+
+REQUEST_LATENCY = Histogram(
+    'repairs_http_request_duration_seconds', 'Time spent in the view, by URL name', ['view', 'method'],
+)
+REQUESTS = Counter('repairs_http_requests_total', 'Responses by URL name and status code', ['view', 'status'])
+DB_QUERIES = Counter('repairs_db_queries_total', 'Database queries made by requests, by URL name', ['view'])
+DB_QUERY_SECONDS = Counter('repairs_db_query_seconds_total', 'Time spent in database queries by requests', ['view'])
+PHOTO_UPLOAD_BYTES = Histogram('repairs_photo_upload_bytes', 'Size of stored photo uploads', buckets=SIZE_BUCKETS)
+SMS_LATENCY = Histogram('repairs_sms_send_duration_seconds', 'Time for the SMS gateway to answer')
+SMS_SENT = Counter('repairs_sms_total', 'SMS send attempts by outcome', ['outcome'])
+CACHE_HITS = Counter('repairs_cache_hits_total', 'Cache reads that found the key')
+CACHE_MISSES = Counter('repairs_cache_misses_total', 'Cache reads that did not find the key')
+COALESCED_REQUESTS = Counter(
+    'repairs_coalesced_requests_total',
+    'Requests given the result of an identical computation already running, by URL name and scope',
+    ['view', 'scope'],
+)
+
+
+def _record_changed():
+    global _changed
+    _changed = True
+    if not _flusher_started and settings.METRICS_DIR:
+        _start_flusher()
+
+
+def _start_flusher():
+    """Start this process's flush thread"""
+    global _flusher_started
+    with _lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+
+
+def _after_fork():
+    """A forked worker inherits the parent's totals but not its thread: start from zero under its own file"""
+    global _changed, _flusher_started, _lock, _flush_lock
+    _lock, _flush_lock = threading.Lock(), threading.Lock()
+    _values.clear()
+    _changed = _flusher_started = False
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(lambda: flush() if _flusher_started else None)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(settings.METRICS_FLUSH_SECONDS)
+        if _changed:
+            flush()
+
+
+def _store_path():
+    return Path(settings.METRICS_DIR) / f'{os.getpid()}-{_started}.json'
+
+
+def flush():
+    """Write this process's totals to its file in METRICS_DIR"""
+    global _changed
+    if not settings.METRICS_DIR:
+        return
+    with _flush_lock:
+        with _lock:
+            _changed = False
+            rows = [[name, list(labels), field, value] for (name, labels, field), value in _values.items()]
+        path = _store_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_suffix('.tmp')
+        temp.write_text(json.dumps(rows))
+        os.replace(temp, path)
+
+
+def collect():
+    """Totals of every process writing to METRICS_DIR, or of this one"""
+    if not settings.METRICS_DIR:
+        with _lock:
+            return dict(_values)
+    flush()
+    totals = {}
+    for path in Path(settings.METRICS_DIR).glob('*.json'):
+        try:
+            rows = json.loads(path.read_text())
+        except (OSError, ValueError):
+            # Removed or being replaced while we listed the directory
+            continue
+        for name, labels, field, value in rows:
+            key = (name, tuple(labels), field)
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+class MetricsCacheMixin:
+    """Count cache hits and misses of get(), which aget() and the session backends go through"""
+
+    _missing = object()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing, version)
+        if value is self._missing:
+            CACHE_MISSES.inc()
+            return default
+        CACHE_HITS.inc()
+        return value
+
+
+class MeteredFileBasedCache(MetricsCacheMixin, FileBasedCache):
+    pass
+
+
+class MeteredLocMemCache(MetricsCacheMixin, LocMemCache):
+    pass
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _number(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def render_metric(metric, totals):
+    """Text exposition lines for one registered metric"""
+    lines = [f'# HELP {metric.name} {metric.help_text}', f'# TYPE {metric.name} {metric.type}']
+    series = sorted({labels for name, labels, field in totals if name == metric.name})
+    for labels in series:
+        if metric.type == 'counter':
+            lines.append(f'{metric.name}{_labels(metric.labelnames, labels)} '
+                         f'{_number(totals[(metric.name, labels, "value")])}')
+            continue
+        cumulative = 0
+        for index, bound in enumerate(metric.buckets + (float('inf'),)):
+            cumulative += totals.get((metric.name, labels, index), 0)
+            le = '+Inf' if bound == float('inf') else _number(bound)
+            lines.append(f'{metric.name}_bucket{_labels(metric.labelnames, labels, [("le", le)])} {_number(cumulative)}')
+        lines.append(f'{metric.name}_sum{_labels(metric.labelnames, labels)} {_number(totals[(metric.name, labels, "sum")])}')
+        lines.append(f'{metric.name}_count{_labels(metric.labelnames, labels)} {_number(totals[(metric.name, labels, "count")])}')
+    return lines
+
+
+def render_gauge(name, help_text, samples, labelname=None):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+    for label, value in samples:
+        labels = _labels((labelname,), (label,)) if labelname else ''
+        lines.append(f'{name}{labels} {_number(value)}')
+    return lines
+
+
+def data_gauges():
+    """Gauges read from the database at scrape time"""
+    from .models import RepairJob, ArchivedRepairJob, PhotoBlob
+
+    by_status = dict(RepairJob.objects.order_by().values_list('status').annotate(count=Count('pk')))
+    blobs = PhotoBlob.objects.aggregate(count=Count('pk'), size=Sum('size'))
+    return [
+        *render_gauge('repairs_jobs', 'Active repair jobs by status',
+                      [(status, by_status.get(status, 0)) for status, _ in RepairJob.STATUS_CHOICES], 'status'),
+        *render_gauge('repairs_archived_jobs', 'Archived repair jobs', [(None, ArchivedRepairJob.objects.count())]),
+        *render_gauge('repairs_photo_blobs', 'Stored photo files', [(None, blobs['count'])]),
+        *render_gauge('repairs_photo_bytes', 'Bytes of stored photo files', [(None, blobs['size'] or 0)]),
+    ]
+
+
+def exposition():
+    totals = collect()
+    lines = []
+    for metric in _registry.values():
+        lines.extend(render_metric(metric, totals))
+    lines.extend(data_gauges())
+    return '\n'.join(lines) + '\n'
+
+
+def _token_matches(request):
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
+def metrics_view(request):
+    """Prometheus text exposition of every process's metrics"""
+    if not _token_matches(request):
+        return staff_member_required(_metrics_response)(request)
+    return _metrics_response(request)
+
+
+def _metrics_response(request):
+    return HttpResponse(exposition(), content_type=CONTENT_TYPE)
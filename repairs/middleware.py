@@ -0,0 +1,339 @@
+import contextvars
+import cProfile
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from .metrics import DB_QUERIES, DB_QUERY_SECONDS, REQUESTS, REQUEST_LATENCY
+
+try:
+    import brotli
+except ImportError:  # Optional: responses fall back to gzip
+    brotli = None
+
+logger = logging.getLogger('repairs.performance')
+
+PROFILE_HEADER = 'X-Profile'
+
+# Already compressed; recompressing costs CPU and saves nothing
+COMPRESSED_CONTENT_TYPES = ('application/pdf', 'application/zip', 'image/')
+
+# Metrics for the request currently being handled on this thread/task
+_current_metrics = contextvars.ContextVar('repairs_request_metrics', default=None)
+
+# execute_wrapper hooks for queries made on behalf of the current request
+_query_observers = contextvars.ContextVar('repairs_query_observers', default=())
+
+
+class RequestMetrics:
+    """Timings and query statistics collected for a single request"""
+
+    def __init__(self):
+        self.view_name = ''
+        self.total_time = 0.0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.queries = Counter()
+        # Async views may run queries on several threads at once
+        self._lock = threading.Lock()
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.queries.values() if count > 1)
+
+    def server_timing(self):
+        """Format the metrics as a Server-Timing header value"""
+        return ', '.join([
+            f'view;desc="{self.view_name}"',
+            f'total;dur={self.total_time * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries, {self.duplicate_count} duplicates"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+        ])
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'total_ms': round(self.total_time * 1000, 1),
+            'db_ms': round(self.db_time * 1000, 1),
+            'queries': self.query_count,
+            'duplicate_queries': self.duplicate_count,
+            'template_ms': round(self.template_time * 1000, 1),
+        }
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute_wrapper hook"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.db_time += elapsed
+                self.queries[(sql, repr(params))] += 1
+
+
+def _dispatch_query(execute, sql, params, many, context):
+    """Installed on every connection; runs the query through the current observers"""
+    for observer in reversed(_query_observers.get()):
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install_query_dispatch(sender, connection, **kwargs):
+    """connection_created receiver, connected in RepairsConfig.ready()"""
+    if _dispatch_query not in connection.execute_wrappers:
+        # First, not last: this can run inside a caller's connection.execute_wrapper()
+        # block (a lazy connect), which pops the last wrapper when it exits
+        connection.execute_wrappers.insert(0, _dispatch_query)
+
+
+@contextmanager
+def observe_queries(observer):
+    """
+    Pass every query made in this context to `observer`, an execute_wrapper
+    hook. Unlike connection.execute_wrapper() it also sees queries an async
+    view runs on other threads, as context variables follow them there.
+    """
+    token = _query_observers.set(_query_observers.get() + (observer,))
+    try:
+        yield observer
+    finally:
+        _query_observers.reset(token)
+
+
+class StackSampler:
+    """Samples the stack of one thread at a fixed interval into folded stacks"""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class PerformanceMiddleware:
+    """
+    Per-request instrumentation: view name, wall time, DB time, query and
+    duplicate-query counts and template render time (measured by
+    repairs.template_backends.TimedDjangoTemplates).
+
+    Staff responses carry a Server-Timing header, requests slower than
+    PERF_SLOW_REQUEST_MS are logged to the 'repairs.performance' logger, and
+    staff can profile a request by sending ``X-Profile: cprofile`` or
+    ``X-Profile: sample``. PERF_PROFILE_SAMPLE_RATE profiles a random
+    fraction of all requests with cProfile.
+
+    Must be the last entry in MIDDLEWARE so the profiled view still runs
+    behind CSRF and authentication checks. Works under WSGI and ASGI; async
+    views are measured but not profiled.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 500)
+        self.sample_rate = getattr(settings, 'PERF_PROFILE_SAMPLE_RATE', 0.0)
+        self.profile_dir = Path(getattr(settings, 'PERF_PROFILE_DIR', '/tmp/alamanajo-profiles'))
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with observe_queries(metrics):
+                response = self.get_response(request)
+        finally:
+            metrics.total_time = time.perf_counter() - start
+            _current_metrics.reset(token)
+
+        # Safe to resolve here, off the event loop; the user comes from the cache (repairs/auth.py)
+        user = getattr(request, 'user', None)
+        return self.finish(request, response, metrics, user)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with observe_queries(metrics):
+                response = await self.get_response(request)
+        finally:
+            metrics.total_time = time.perf_counter() - start
+            _current_metrics.reset(token)
+
+        # request.user would load the user synchronously on the event loop
+        user = await request.auser() if hasattr(request, 'auser') else None
+        return self.finish(request, response, metrics, user)
+
+    def finish(self, request, response, metrics, user):
+        if not metrics.view_name and request.resolver_match:
+            metrics.view_name = request.resolver_match.view_name
+
+        url_name = request.resolver_match.view_name if request.resolver_match else 'unmatched'
+        REQUEST_LATENCY.observe(metrics.total_time, view=url_name, method=request.method)
+        REQUESTS.inc(view=url_name, status=response.status_code)
+        DB_QUERIES.inc(metrics.query_count, view=url_name)
+        DB_QUERY_SECONDS.inc(metrics.db_time, view=url_name)
+
+        if user is not None and user.is_staff:
+            response['Server-Timing'] = metrics.server_timing()
+
+        if metrics.total_time * 1000 >= self.slow_request_ms:
+            logger.warning(json.dumps({
+                'event': 'slow_request',
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **metrics.as_dict(),
+            }))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current_metrics.get()
+        if metrics is not None:
+            metrics.view_name = f'{view_func.__module__}.{view_func.__name__}'
+
+        mode = request.headers.get(PROFILE_HEADER, '').lower()
+        if mode and not request.user.is_staff:
+            mode = ''
+        if not mode and self.sample_rate and random.random() < self.sample_rate:
+            mode = 'cprofile'
+        # An async view's time is spread over the event loop, shared with other requests
+        if mode not in ('cprofile', 'sample') or iscoroutinefunction(view_func):
+            return None
+
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{view_func.__name__}-{random.randrange(16 ** 6):06x}"
+
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            response = profiler.runcall(view_func, request, *view_args, **view_kwargs)
+            path = self.profile_dir / f'{name}.prof'
+            profiler.dump_stats(path)
+        else:
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+            try:
+                response = view_func(request, *view_args, **view_kwargs)
+            finally:
+                sampler.stop()
+            path = self.profile_dir / f'{name}.folded'
+            sampler.dump(path)
+
+        logger.info(json.dumps({'event': 'profile', 'mode': mode, 'path': request.path, 'file': str(path)}))
+        if request.user.is_staff:
+            response['X-Profile-File'] = path.name
+        return response
+
+
+def accepts_encoding(request, coding):
+    """True if Accept-Encoding lists `coding` with a non-zero q-value"""
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = item.strip().partition(';')
+        if name.strip().lower() != coding:
+            continue
+        q = params.strip().removeprefix('q=')
+        try:
+            return not params or float(q) > 0
+        except ValueError:
+            return False
+    return False
+
+
+def brotli_sequence(sequence, quality):
+    """Compress a streamed response chunk by chunk, flushing so every chunk is sent as it comes"""
+    compressor = brotli.Compressor(quality=quality)
+    for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that prefers Brotli when the client accepts `br` and the
+    brotli package is installed. Streamed responses are compressed chunk by
+    chunk, so the first rows of a streamed export still arrive straight away.
+
+    Must be the first entry in MIDDLEWARE: ConditionalGetMiddleware then
+    computes ETags on the uncompressed body, which this middleware marks weak
+    as both encodings carry the same content.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.brotli_quality = getattr(settings, 'BROTLI_QUALITY', 5)
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith(COMPRESSED_CONTENT_TYPES):
+            return response
+        if (brotli is None or response.has_header('Content-Encoding')
+                or getattr(response, 'is_async', False) or not accepts_encoding(request, 'br')):
+            return super().process_response(request, response)
+        if not response.streaming and len(response.content) < 200:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if response.streaming:
+            response.streaming_content = brotli_sequence(response.streaming_content, self.brotli_quality)
+            del response.headers['Content-Length']
+        else:
+            compressed = brotli.compress(response.content, quality=self.brotli_quality)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
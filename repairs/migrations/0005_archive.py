@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:04
+
+import django.db.models.deletion
+import django.utils.timezone
+import repairs.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repairs', '0004_alter_repairjob_estimated_repair_time'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRepairJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(blank=True, max_length=20, unique=True)),
+                ('customer_name', models.CharField(max_length=100)),
+                ('phone_number', models.CharField(max_length=20)),
+                ('bike_description', models.TextField(blank=True, help_text='Optional bike description')),
+                ('status', models.CharField(choices=[('RECEIVED', 'Received'), ('DIAGNOSED', 'Diagnosed'), ('IN_PROGRESS', 'In Progress'), ('WAITING_PARTS', 'Waiting for Parts'), ('READY', 'Ready for Pickup'), ('COMPLETED', 'Completed')], default='RECEIVED', max_length=20)),
+                ('estimated_repair_time', models.CharField(choices=[('TODAY', 'Today'), ('1-2_DAYS', '1-2 Days'), ('3-5_DAYS', '3-5 Days'), ('1_WEEK', '1 Week'), ('2_WEEKS', '2 Weeks'), ('3_WEEKS', '3 Weeks'), ('1_MONTH', '1 Month'), ('UNKNOWN', 'To Be Determined')], default='UNKNOWN', help_text='Estimated repair completion time', max_length=20)),
+                ('internal_notes', models.TextField(blank=True, help_text='Internal staff notes')),
+                ('repair_details', models.TextField(blank=True, help_text='What was repaired/fixed')),
+                ('estimated_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('ready_notified_at', models.DateTimeField(blank=True, help_text='When ready SMS was sent', null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Archived Repair Job',
+                'verbose_name_plural': 'Archived Repair Jobs',
+                'ordering': ['-created_at'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedRepairJobPhoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('photo', models.ImageField(upload_to=repairs.models.repair_photo_upload_path)),
+                ('description', models.CharField(blank=True, help_text='Optional photo description', max_length=200)),
+                ('uploaded_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['uploaded_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='repairjob',
+            index=models.Index(fields=['status', 'updated_at'], name='repairs_job_status_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedrepairjob',
+            name='created_by',
+            field=models.ForeignKey(blank=True, help_text='User who created this job', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedrepairjobphoto',
+            name='repair_job',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='repairs.archivedrepairjob'),
+        ),
+    ]
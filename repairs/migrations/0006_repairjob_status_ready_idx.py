@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repairs', '0005_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='repairjob',
+            index=models.Index(fields=['status', 'ready_notified_at'], name='repairs_job_status_ready_idx'),
+        ),
+    ]
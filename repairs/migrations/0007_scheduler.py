@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repairs', '0006_repairjob_status_ready_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('jobs_count', models.PositiveIntegerField(default=0)),
+                ('priced_jobs', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScheduledTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('lease_owner', models.CharField(blank=True, max_length=100)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_result', models.CharField(blank=True, max_length=200)),
+                ('watermark', models.DateTimeField(blank=True, help_text='Work before this point has been processed', null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedrepairjob',
+            name='abandoned_at',
+            field=models.DateTimeField(blank=True, help_text='When the bike was flagged as abandoned', null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedrepairjob',
+            name='last_reminder_at',
+            field=models.DateTimeField(blank=True, help_text='When the last pickup reminder was sent', null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedrepairjob',
+            name='reminder_count',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Pickup reminders sent'),
+        ),
+        migrations.AddField(
+            model_name='repairjob',
+            name='abandoned_at',
+            field=models.DateTimeField(blank=True, help_text='When the bike was flagged as abandoned', null=True),
+        ),
+        migrations.AddField(
+            model_name='repairjob',
+            name='last_reminder_at',
+            field=models.DateTimeField(blank=True, help_text='When the last pickup reminder was sent', null=True),
+        ),
+        migrations.AddField(
+            model_name='repairjob',
+            name='reminder_count',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Pickup reminders sent'),
+        ),
+        migrations.AddIndex(
+            model_name='repairjob',
+            index=models.Index(fields=['updated_at'], name='repairs_job_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,98 @@
+import re
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+# Frozen copies of repairs.phones and repairs.customers as of this migration:
+# historical migrations must not change with the app code
+DEFAULT_COUNTRY_CODE = '32'
+NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(raw):
+    """E.164 form of `raw`, or '' if it contains no digits"""
+    raw = (raw or '').strip()
+    digits = NON_DIGITS.sub('', raw)
+    if not digits:
+        return ''
+    if raw.startswith('+'):
+        return f'+{digits}'
+    if digits.startswith('00'):
+        return f'+{digits[2:]}'
+    if digits.startswith('0'):
+        return f'+{DEFAULT_COUNTRY_CODE}{digits[1:]}'
+    if len(digits) <= 9:
+        return f'+{DEFAULT_COUNTRY_CODE}{digits}'
+    return f'+{digits}'
+
+
+def link_customers(Customer, jobs, using):
+    """Set customer_id on each job, creating missing customers in one bulk insert"""
+    max_length = Customer._meta.get_field('phone').max_length
+    phones = {}
+    for job in jobs:
+        phone = normalize_phone(job.phone_number)
+        # Junk long enough to overflow Customer.phone is no real number; leave the job unlinked
+        phones[job.id] = phone if phone and len(phone) <= max_length else ''
+
+    names = {phones[job.id]: job.customer_name for job in jobs if phones[job.id]}
+    customers = Customer.objects.using(using)
+    ids = dict(customers.filter(phone__in=names).values_list('phone', 'id'))
+    missing = [
+        Customer(phone=phone, name=name, name_key=name.casefold())
+        for phone, name in names.items() if phone not in ids
+    ]
+    if missing:
+        customers.bulk_create(missing, ignore_conflicts=True)
+        ids.update(customers.filter(phone__in=[c.phone for c in missing]).values_list('phone', 'id'))
+
+    for job in jobs:
+        job.customer_id = ids.get(phones[job.id])
+
+
+def forwards(apps, schema_editor):
+    """Create one Customer per normalized phone number and link every job to it"""
+    Customer = apps.get_model('repairs', 'Customer')
+    using = schema_editor.connection.alias
+    # Archive first, so names from the newer active jobs win
+    for model_name in ('ArchivedRepairJob', 'RepairJob'):
+        Job = apps.get_model('repairs', model_name)
+        jobs = Job.objects.using(using).filter(customer__isnull=True).order_by('id')
+        last_id = 0
+        while True:
+            batch = list(jobs.filter(id__gt=last_id).only('id', 'customer_name', 'phone_number')[:BATCH_SIZE])
+            if not batch:
+                break
+            with transaction.atomic(using=using):
+                link_customers(Customer, batch, using)
+                # Repeat customers keep the name from their latest job
+                names = {job.customer_id: job.customer_name for job in batch if job.customer_id}
+                renamed = [
+                    customer for customer in Customer.objects.using(using).filter(id__in=names)
+                    if customer.name != names[customer.id]
+                ]
+                for customer in renamed:
+                    customer.name = names[customer.id]
+                    customer.name_key = customer.name.casefold()
+                Customer.objects.using(using).bulk_update(renamed, ['name', 'name_key'])
+                Job.objects.using(using).bulk_update(batch, ['customer'])
+            last_id = batch[-1].id
+
+
+def backwards(apps, schema_editor):
+    for model_name in ('ArchivedRepairJob', 'RepairJob'):
+        apps.get_model('repairs', model_name).objects.update(customer=None)
+    apps.get_model('repairs', 'Customer').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables aren't locked for the whole run
+    atomic = False
+
+    dependencies = [
+        ('repairs', '0008_customer'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
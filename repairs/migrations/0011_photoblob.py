@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repairs', '0010_photoupload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(help_text='Storage name, e.g. photos/ab/cd/<sha256>.jpg', max_length=100)),
+                ('size', models.PositiveBigIntegerField()),
+                ('refcount', models.PositiveIntegerField(default=0, help_text='Photo rows referencing this blob')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedrepairjobphoto',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='repairs.photoblob'),
+        ),
+        migrations.AddField(
+            model_name='repairjobphoto',
+            name='blob',
+            field=models.ForeignKey(blank=True, help_text='Content-addressed file; empty for photos not yet migrated', null=True, on_delete=django.db.models.deletion.PROTECT, to='repairs.photoblob'),
+        ),
+    ]
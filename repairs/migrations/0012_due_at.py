@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:56
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+# Frozen copy of repairs.due as of this migration:
+# historical migrations must not change with the app code
+ESTIMATE_DAYS = {
+    'TODAY': 0,
+    '1-2_DAYS': 2,
+    '3-5_DAYS': 5,
+    '1_WEEK': 7,
+    '2_WEEKS': 14,
+    '3_WEEKS': 21,
+    '1_MONTH': 30,
+}
+OPEN_STATUSES = ('RECEIVED', 'DIAGNOSED', 'IN_PROGRESS', 'WAITING_PARTS')
+DUE_TIME = time(23, 59, 59)
+
+
+def due_at(estimate, since):
+    """End of the last day of `estimate` counted from `since`, or None for UNKNOWN"""
+    days = ESTIMATE_DAYS.get(estimate)
+    if days is None:
+        return None
+    day = timezone.localtime(since).date() + timedelta(days=days)
+    return timezone.make_aware(datetime.combine(day, DUE_TIME))
+
+
+def forwards(apps, schema_editor):
+    """Due dates for open jobs, counted from drop-off"""
+    Job = apps.get_model('repairs', 'RepairJob')
+    using = schema_editor.connection.alias
+    jobs = Job.objects.using(using).filter(status__in=OPEN_STATUSES).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(jobs.filter(id__gt=last_id).only('id', 'estimated_repair_time', 'created_at')[:BATCH_SIZE])
+        if not batch:
+            break
+        for job in batch:
+            job.due_at = due_at(job.estimated_repair_time, job.created_at)
+        with transaction.atomic(using=using):
+            Job.objects.using(using).bulk_update(batch, ['due_at'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own so large tables aren't locked for the whole run
+    atomic = False
+
+    dependencies = [
+        ('repairs', '0011_photoblob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedrepairjob',
+            name='due_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='End of the estimated repair time; empty once ready or without an estimate', null=True),
+        ),
+        migrations.AddField(
+            model_name='repairjob',
+            name='due_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='End of the estimated repair time; empty once ready or without an estimate', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='repairjob',
+            index=models.Index(fields=['status', 'due_at'], name='repairs_job_status_due_idx'),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
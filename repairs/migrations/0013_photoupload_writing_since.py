@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('repairs', '0012_due_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='photoupload',
+            name='writing_since',
+            field=models.DateTimeField(blank=True, help_text='When the PUT now writing the next chunk claimed it', null=True),
+        ),
+    ]
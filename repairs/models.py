@@ -1,14 +1,67 @@
 from django.db import models
+from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth.models import User
 import uuid
 import os
+from . import due, fees
+from .phones import CUSTOMER_PHONE_MAX_LENGTH, fits_customer, normalize_phone
 
 def repair_photo_upload_path(instance, filename):
     """Generate upload path for repair photos"""
     return f'repair_photos/{instance.repair_job.job_id}/{filename}'
 
-class RepairJob(models.Model):
+class RepairJobQuerySet(models.QuerySet):
+    def with_storage(self, now=None):
+        """Annotate storage_days, storage_fee, is_overdue and is_abandoned in SQL"""
+        return self.annotate(**fees.storage_annotations(now or timezone.now()))
+    
+    def overdue(self, now=None):
+        """READY bikes accruing storage fees (uses the status/ready_notified_at index)"""
+        now = now or timezone.now()
+        return self.filter(status='READY', ready_notified_at__lt=fees.fee_starts_before(now))
+    
+    def abandoned(self, now=None):
+        """READY bikes left for ABANDONMENT_MONTHS or longer"""
+        now = now or timezone.now()
+        return self.filter(status='READY', ready_notified_at__lt=fees.abandoned_before(now))
+    
+    def past_due(self, now=None):
+        """Open jobs whose estimate has run out (uses the status/due_at index)"""
+        return self.filter(status__in=due.OPEN_STATUSES, due_at__lt=now or timezone.now())
+    
+    def due_by_today(self, now=None):
+        """The work queue: open jobs that are late or due by the end of today"""
+        return self.filter(status__in=due.OPEN_STATUSES, due_at__lte=due.due_today_end(now))
+
+class Customer(models.Model):
+    """A customer, identified by their E.164-normalized phone number"""
+    name = models.CharField(max_length=100)
+    phone = models.CharField(max_length=CUSTOMER_PHONE_MAX_LENGTH, unique=True, help_text="E.164 format, e.g. +32499123456")
+    name_key = models.CharField(max_length=100, db_index=True, editable=False, help_text="Lowercased name for prefix search")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.phone})"
+    
+    def save(self, *args, **kwargs):
+        self.name_key = self.name.casefold()
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def for_phone(cls, phone_number, name, using=None):
+        """Get or create the customer for a phone number, keeping the latest name"""
+        customer, created = cls.objects.db_manager(using).get_or_create(
+            phone=normalize_phone(phone_number), defaults={'name': name}
+        )
+        if not created and name and customer.name != name:
+            customer.name = name
+            customer.save(using=using, update_fields=['name', 'name_key', 'updated_at'])
+        return customer
+
+class BaseRepairJob(models.Model):
+    """Fields and helpers shared by active and archived repair jobs"""
     STATUS_CHOICES = [
         ('RECEIVED', 'Received'),
         ('DIAGNOSED', 'Diagnosed'),
@@ -30,6 +83,7 @@ class RepairJob(models.Model):
     ]
     
     job_id = models.CharField(max_length=20, unique=True, blank=True)
+    customer = models.ForeignKey(Customer, on_delete=models.PROTECT, null=True, blank=True)
     customer_name = models.CharField(max_length=100)
     phone_number = models.CharField(max_length=20)
     bike_description = models.TextField(blank=True, help_text="Optional bike description")
@@ -42,17 +96,14 @@ class RepairJob(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     ready_notified_at = models.DateTimeField(null=True, blank=True, help_text="When ready SMS was sent")
+    reminder_count = models.PositiveSmallIntegerField(default=0, help_text="Pickup reminders sent")
+    last_reminder_at = models.DateTimeField(null=True, blank=True, help_text="When the last pickup reminder was sent")
+    abandoned_at = models.DateTimeField(null=True, blank=True, help_text="When the bike was flagged as abandoned")
+    due_at = models.DateTimeField(null=True, blank=True, editable=False, help_text="End of the estimated repair time; empty once ready or without an estimate")
     
-    def save(self, *args, **kwargs):
-        if not self.job_id:
-            last_job = RepairJob.objects.order_by('-id').first()
-            if last_job:
-                last_number = int(last_job.job_id.split('-')[1])
-                new_number = last_number + 1
-            else:
-                new_number = 1001
-            self.job_id = f"AJ-{new_number}"
-        super().save(*args, **kwargs)
+    objects = RepairJobQuerySet.as_manager()
+    
+    is_archived = False
     
     def __str__(self):
         return f"{self.job_id} - {self.customer_name}"
@@ -69,19 +120,191 @@ class RepairJob(models.Model):
         return status_colors.get(self.status, 'bg-gray-100 text-gray-800')
     
     class Meta:
+        abstract = True
         ordering = ['-created_at']
+
+class RepairJob(BaseRepairJob):
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What due_at was computed from, to notice changes on save
+        instance._loaded_schedule = (instance.__dict__.get('status'), instance.__dict__.get('estimated_repair_time'))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        if not self.job_id:
+            # Archived jobs keep their numbers, so look at both tables
+            using = kwargs.get('using')
+            last_numbers = [
+                int(job.job_id.split('-')[1])
+                for job in (
+                    RepairJob.objects.db_manager(using).order_by('-id').first(),
+                    ArchivedRepairJob.objects.db_manager(using).order_by('-id').first(),
+                )
+                if job
+            ]
+            new_number = max(last_numbers) + 1 if last_numbers else 1001
+            self.job_id = f"AJ-{new_number}"
+        
+        # Link the customer record for this phone number, following phone edits
+        phone = normalize_phone(self.phone_number)
+        update_fields = kwargs.get('update_fields')
+        if fits_customer(phone) and (update_fields is None or 'phone_number' in update_fields):
+            if not self.customer_id or self.customer.phone != phone:
+                self.customer = Customer.for_phone(phone, self.customer_name, using=kwargs.get('using'))
+                if update_fields is not None:
+                    kwargs['update_fields'] = [*update_fields, 'customer']
+        
+        # Recompute the due date when the estimate or status may have changed
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'status', 'estimated_repair_time'}.intersection(update_fields):
+            loaded = getattr(self, '_loaded_schedule', None) if not self._state.adding else None
+            self.due_at = due.next_due_at(self, loaded)
+            if update_fields is not None and 'due_at' not in update_fields:
+                kwargs['update_fields'] = [*update_fields, 'due_at']
+        super().save(*args, **kwargs)
+        self._loaded_schedule = (self.status, self.estimated_repair_time)
+    
+    def mark_ready_notified(self, now=None):
+        """Start a new pickup wait: storage fees, reminders and abandonment count from now"""
+        self.ready_notified_at = now or timezone.now()
+        # pickup_reminders only sends reminders past reminder_count
+        self.reminder_count = 0
+        self.last_reminder_at = None
+        self.abandoned_at = None
+    
+    class Meta(BaseRepairJob.Meta):
         verbose_name = "Repair Job"
         verbose_name_plural = "Repair Jobs"
+        indexes = [
+            # Archival sweeps: completed jobs by age
+            models.Index(fields=['status', 'updated_at'], name='repairs_job_status_updated_idx'),
+            # Storage fees and pickup reminders: READY bikes by notification date
+            models.Index(fields=['status', 'ready_notified_at'], name='repairs_job_status_ready_idx'),
+            # Rollup refresh: jobs changed since the last run
+            models.Index(fields=['updated_at'], name='repairs_job_updated_idx'),
+            # Work queue: open jobs by due date
+            models.Index(fields=['status', 'due_at'], name='repairs_job_status_due_idx'),
+        ]
+
+class PhotoBlob(models.Model):
+    """Photo content stored once under its SHA-256 and shared by every photo row with the same bytes"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=100, help_text="Storage name, e.g. photos/ab/cd/<sha256>.jpg")
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0, help_text="Photo rows referencing this blob")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
 
 class RepairJobPhoto(models.Model):
     """Photos attached to repair jobs"""
     repair_job = models.ForeignKey(RepairJob, on_delete=models.CASCADE, related_name='photos')
     photo = models.ImageField(upload_to=repair_photo_upload_path)
+    blob = models.ForeignKey(PhotoBlob, on_delete=models.PROTECT, null=True, blank=True, help_text="Content-addressed file; empty for photos not yet migrated")
     description = models.CharField(max_length=200, blank=True, help_text="Optional photo description")
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Photo for {self.repair_job.job_id}"
     
+    def save(self, *args, **kwargs):
+        replaced = None
+        if self.photo and not self.photo._committed:
+            # New file content: store it once under its hash instead of under the job
+            from .blobs import store_photo
+            replaced = store_photo(self)
+        super().save(*args, **kwargs)
+        if replaced:
+            # Only now that the row no longer points at the old blob can it be deleted
+            from .blobs import release_references
+            release_references(*replaced)
+    
+    def delete(self, *args, **kwargs):
+        from .blobs import release_photos
+        result = super().delete(*args, **kwargs)
+        release_photos([self])
+        return result
+    
     class Meta:
         ordering = ['uploaded_at']
+
+class PhotoUpload(models.Model):
+    """A resumable chunked photo upload, attached as a RepairJobPhoto once complete"""
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    repair_job = models.ForeignKey(RepairJob, on_delete=models.CASCADE, related_name='uploads')
+    filename = models.CharField(max_length=255)
+    description = models.CharField(max_length=200, blank=True)
+    size = models.PositiveBigIntegerField(help_text="Total size in bytes")
+    received = models.PositiveBigIntegerField(default=0, help_text="Bytes written so far")
+    writing_since = models.DateTimeField(null=True, blank=True, help_text="When the PUT now writing the next chunk claimed it")
+    sha256 = models.CharField(max_length=64, help_text="Expected checksum of the whole file")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    photo = models.ForeignKey(RepairJobPhoto, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.filename} for {self.repair_job.job_id} ({self.received}/{self.size})"
+    
+    @property
+    def temp_path(self):
+        return os.path.join(settings.PHOTO_UPLOAD_TEMP_DIR, f"{self.upload_id}.part")
+
+class ArchivedRepairJob(BaseRepairJob):
+    """Completed or abandoned job moved out of the active RepairJob table"""
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    is_archived = True
+    
+    class Meta(BaseRepairJob.Meta):
+        verbose_name = "Archived Repair Job"
+        verbose_name_plural = "Archived Repair Jobs"
+
+class ArchivedRepairJobPhoto(models.Model):
+    """Photo rows of archived jobs; the image files stay where they were"""
+    repair_job = models.ForeignKey(ArchivedRepairJob, on_delete=models.CASCADE, related_name='photos')
+    photo = models.ImageField(upload_to=repair_photo_upload_path)
+    blob = models.ForeignKey(PhotoBlob, on_delete=models.PROTECT, null=True, blank=True)
+    description = models.CharField(max_length=200, blank=True, help_text="Optional photo description")
+    uploaded_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Photo for {self.repair_job.job_id}"
+    
+    def delete(self, *args, **kwargs):
+        from .blobs import release_photos
+        result = super().delete(*args, **kwargs)
+        release_photos([self])
+        return result
+    
+    class Meta:
+        ordering = ['uploaded_at']
+
+class ScheduledTask(models.Model):
+    """Lease and progress of a periodic task run by the scheduler"""
+    name = models.CharField(max_length=50, unique=True)
+    lease_owner = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_result = models.CharField(max_length=200, blank=True)
+    watermark = models.DateTimeField(null=True, blank=True, help_text="Work before this point has been processed")
+    
+    def __str__(self):
+        return self.name
+
+class DailyRollup(models.Model):
+    """Per-day job and revenue totals over active and archived jobs"""
+    day = models.DateField(unique=True)
+    jobs_count = models.PositiveIntegerField(default=0)
+    priced_jobs = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refreshed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.day}: {self.jobs_count} jobs, €{self.revenue}"
+    
+    class Meta:
+        ordering = ['day']
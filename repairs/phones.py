@@ -0,0 +1,54 @@
+"""
+Phone number normalization to E.164 (+<country code><number>).
+
+Numbers are typed by staff in whatever form the customer gives them
+("0499 12 34 56", "+32 (499) 12-34-56", "0032499123456"). National numbers
+are assumed to be in PHONE_DEFAULT_COUNTRY_CODE. Migration 0009 keeps its
+own frozen copy of normalize_phone(); change both knowingly.
+"""
+
+import re
+
+from django.conf import settings
+
+NON_DIGITS = re.compile(r'\D')
+# Customer.phone's max_length
+CUSTOMER_PHONE_MAX_LENGTH = 20
+
+
+def normalize_phone(raw):
+    """E.164 form of `raw`, or '' if it contains no digits"""
+    raw = (raw or '').strip()
+    digits = NON_DIGITS.sub('', raw)
+    if not digits:
+        return ''
+    if raw.startswith('+'):
+        return f'+{digits}'
+    if digits.startswith('00'):
+        return f'+{digits[2:]}'
+    country_code = settings.PHONE_DEFAULT_COUNTRY_CODE
+    if digits.startswith('0'):
+        # National trunk prefix
+        return f'+{country_code}{digits[1:]}'
+    if len(digits) <= 9:
+        # National number typed without the trunk prefix
+        return f'+{country_code}{digits}'
+    return f'+{digits}'
+
+
+def fits_customer(phone):
+    """Whether `phone` can be a Customer.phone; junk input can normalize to something longer"""
+    return bool(phone) and len(phone) <= CUSTOMER_PHONE_MAX_LENGTH
+
+
+def is_valid_e164(phone):
+    """E.164 allows at most 15 digits; shorter than 8 is not a real subscriber number"""
+    return bool(re.fullmatch(r'\+[1-9]\d{7,14}', phone))
+
+
+def prefix_range(prefix):
+    """
+    (low, high) bounds matching every string that starts with `prefix`, for
+    index range scans (LIKE 'x%' with an ESCAPE clause can't use an index on SQLite)
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
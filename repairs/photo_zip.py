@@ -0,0 +1,126 @@
+"""
+ZIP archives of job photos, built while they are sent.
+
+stream_zip() drives zipfile with a write-only sink that has no seek(), so
+zipfile writes every entry in one pass (sizes and CRC go in a data
+descriptor after the data) and each file is read from storage in
+STREAM_CHUNK_SIZE blocks and handed to the response as soon as it is written.
+Nothing is written to disk and memory stays at about one block, whatever the
+size of the archive. Offsets past 4 GiB get Zip64 records automatically.
+
+Photos are JPEGs or other already-compressed images, so they are stored
+as-is; deflating them costs CPU and saves nothing.
+"""
+
+import os
+import zipfile
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from . import reports
+from .models import RepairJobPhoto, ArchivedRepairJobPhoto
+
+STREAM_CHUNK_SIZE = 256 * 1024
+
+STORED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif'}
+
+PHOTO_FIELDS = ('repair_job__job_id', 'photo', 'uploaded_at')
+
+
+def job_photos(job):
+    """(job_id, storage name, uploaded_at) for each photo of an active or archived job"""
+    return list(job.photos.order_by('uploaded_at', 'pk').values_list(*PHOTO_FIELDS))
+
+
+def period_photos(start, end):
+    """(job_id, storage name, uploaded_at) for the photos of jobs created in the period, as on the summary page"""
+    photos = []
+    models = (RepairJobPhoto, ArchivedRepairJobPhoto)
+    for model, jobs in zip(models, reports.period_querysets(start, end)):
+        photos.extend(
+            model.objects.filter(repair_job__in=jobs.values('pk'))
+            .order_by('repair_job__job_id', 'uploaded_at', 'pk')
+            .values_list(*PHOTO_FIELDS)
+        )
+    return photos
+
+
+def zip_filename(job_id=None, start=None, end=None):
+    if job_id:
+        return f'photos-{job_id}.zip'
+    if start and end:
+        return f'photos-{start:%Y%m%d}-{end:%Y%m%d}.zip'
+    return 'photos-all.zip'
+
+
+class _ZipSink:
+    """Write-only file object collecting what zipfile writes until the generator takes it"""
+
+    def __init__(self):
+        self.buffer = []
+        self.position = 0
+        self.pending = 0
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        self.position += len(data)
+        self.pending += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self, minimum=1):
+        """
+        Bytes written since the last call as one chunk, or none while fewer than
+        `minimum` are waiting. Never an empty chunk: that can end a chunked response.
+        """
+        if self.pending < minimum:
+            return []
+        self.pending = 0
+        data = b''.join(self.buffer)
+        self.buffer.clear()
+        return [data]
+
+
+def _entry_info(arcname, uploaded_at):
+    date_time = timezone.localtime(uploaded_at).timetuple()[:6] if uploaded_at else (1980, 1, 1, 0, 0, 0)
+    info = zipfile.ZipInfo(arcname, date_time=max(date_time, (1980, 1, 1, 0, 0, 0)))
+    extension = os.path.splitext(arcname)[1].lower()
+    info.compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+    return info
+
+
+def stream_zip(photos, missing=None):
+    """
+    Yield a ZIP of `photos` (job_photos()/period_photos() rows) chunk by chunk.
+
+    Each job's photos go in a folder named after the job, numbered in upload
+    order. Files missing from storage are skipped and listed in MISSING.txt
+    at the end of the archive, and appended to `missing` if given.
+    """
+    sink = _ZipSink()
+    skipped = [] if missing is None else missing
+    numbers = {}
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        for job_id, name, uploaded_at in photos:
+            numbers[job_id] = numbers.get(job_id, 0) + 1
+            extension = os.path.splitext(name)[1].lower() or '.jpg'
+            arcname = f'{job_id}/{numbers[job_id]:03d}{extension}'
+            try:
+                source = default_storage.open(name, 'rb')
+            except OSError:
+                skipped.append(name)
+                continue
+            with source, archive.open(_entry_info(arcname, uploaded_at), 'w') as entry:
+                while block := source.read(STREAM_CHUNK_SIZE):
+                    entry.write(block)
+                    # Small photos are sent together, large ones block by block
+                    yield from sink.take(STREAM_CHUNK_SIZE)
+        if skipped:
+            archive.writestr('MISSING.txt', ''.join(f'{name}\n' for name in skipped))
+    yield from sink.take()
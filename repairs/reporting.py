@@ -0,0 +1,184 @@
+"""
+Routing of reporting reads to a secondary database.
+
+Summaries, stats and exports scan many rows. On SQLite a long read on the
+primary file holds back the writers behind drop_off and job_detail, so views
+decorated with @reporting_reads send their reads to the 'reporting' database
+configured in alamana_repair/database.py, either a SQLite snapshot refreshed
+by the scheduler (or from each verified backup, `backup_db --reporting`) or
+a PostgreSQL replica. Writes in those views go to the primary.
+
+A reporting view reads from the primary instead when:
+
+* no reporting database is configured,
+* the user wrote something in the last REPORTING_STICKY_SECONDS, so they see
+  their own change (ReportingStickinessMiddleware sets a short-lived cookie),
+* the replica lags the primary by more than REPORTING_MAX_LAG_SECONDS or
+  can't be reached.
+
+Lag is the gap between the newest RepairJob.updated_at on each side, checked
+over the updated_at index at most once per REPORTING_LAG_CHECK_SECONDS.
+"""
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.db.models import Max
+from django.utils.deprecation import MiddlewareMixin
+
+from alamana_repair.database import REPORTING_ALIAS
+
+logger = logging.getLogger('repairs.performance')
+
+STICKY_COOKIE = 'read_primary'
+
+# Alias reporting reads go to for the view currently running, if any
+_reporting_alias = contextvars.ContextVar('repairs_reporting_alias', default=None)
+
+_lag_lock = threading.Lock()
+_lag_state = {'checked_at': None, 'lag': None}
+
+
+def reporting_configured():
+    return REPORTING_ALIAS in settings.DATABASES
+
+
+def current_reporting_alias():
+    """The alias the running view's reporting reads go to, None for the primary"""
+    return _reporting_alias.get()
+
+
+class ReportingRouter:
+    """
+    Reads inside @reporting_reads views go to the reporting database and
+    writes to the primary. Elsewhere the router has no opinion, so
+    save(using=...) and objects created on another alias work as usual.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _reporting_alias.get()
+
+    def db_for_write(self, model, **hints):
+        if _reporting_alias.get() is not None:
+            # Also for instances that were read from the replica
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db == obj2._state.db:
+            return True
+        if _reporting_alias.get() is not None and {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPORTING_ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        if db == REPORTING_ALIAS:
+            return False
+        return None
+
+
+def replica_lag():
+    """Seconds the reporting database is behind the primary, None if it can't be reached"""
+    from .models import RepairJob
+
+    with _lag_lock:
+        checked_at = _lag_state['checked_at']
+        if checked_at is not None and time.monotonic() - checked_at < settings.REPORTING_LAG_CHECK_SECONDS:
+            return _lag_state['lag']
+
+        try:
+            primary = RepairJob.objects.using(DEFAULT_DB_ALIAS).aggregate(last=Max('updated_at'))['last']
+            replica = RepairJob.objects.using(REPORTING_ALIAS).aggregate(last=Max('updated_at'))['last']
+        except DatabaseError:
+            logger.warning('Reporting database unavailable, reading from the primary', exc_info=True)
+            lag = None
+        else:
+            if primary is None or (replica is not None and replica >= primary):
+                lag = 0.0
+            elif replica is None:
+                lag = None
+            else:
+                lag = (primary - replica).total_seconds()
+
+        _lag_state.update(checked_at=time.monotonic(), lag=lag)
+        return lag
+
+
+def reporting_database(request):
+    """The alias reporting reads for this request should use, or None for the primary"""
+    if not reporting_configured():
+        return None
+    if request.COOKIES.get(STICKY_COOKIE):
+        return None
+    lag = replica_lag()
+    if lag is None or lag > settings.REPORTING_MAX_LAG_SECONDS:
+        return None
+    return REPORTING_ALIAS
+
+
+def reporting_reads(view_func):
+    """Run the view's reads against the reporting database when it is fresh enough"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _reporting_alias.set(await sync_to_async(reporting_database)(request))
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _reporting_alias.reset(token)
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        token = _reporting_alias.set(reporting_database(request))
+        try:
+            return view_func(request, *args, **kwargs)
+        finally:
+            _reporting_alias.reset(token)
+    return wrapper
+
+
+class ReportingStickinessMiddleware(MiddlewareMixin):
+    """After a successful write, pin the user's reporting reads to the primary for a while"""
+
+    def process_response(self, request, response):
+        if (request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400
+                and reporting_configured()):
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=settings.REPORTING_STICKY_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+def refresh_snapshot(source=None):
+    """
+    Copy the primary SQLite file, or the backup at `source`, over the
+    reporting snapshot with the online backup API (repairs/backups.py).
+    Readers of the snapshot keep their read transaction until the copy is
+    complete; writers on the primary (WAL) are not blocked. Returns the
+    number of pages copied, or None without a SQLite snapshot.
+    """
+    from . import backups
+
+    primary = settings.DATABASES[DEFAULT_DB_ALIAS]
+    snapshot = settings.DATABASES.get(REPORTING_ALIAS)
+    if not snapshot or 'sqlite3' not in primary['ENGINE'] or 'sqlite3' not in snapshot['ENGINE']:
+        return None
+
+    os.makedirs(os.path.dirname(os.path.abspath(snapshot['NAME'])), exist_ok=True)
+    return backups.online_backup(source or primary['NAME'], snapshot['NAME'])
@@ -0,0 +1,339 @@
+"""
+Revenue figures for a period and the printable PDF report built from them.
+
+period_summary() feeds both the Total Summary page and the PDF: one
+aggregate per job table for the totals, a grouped query for the daily
+breakdown (DailyRollup for days the scheduler has rolled up), the ten
+highest jobs and the median read with an offset into the sorted costs
+instead of loading every cost into Python. aperiod_summary() runs the same
+queries concurrently for the async summary view.
+
+A report for a period that has ended is written once to REPORT_CACHE_DIR
+and served from there until a job in the period changes. Its daily
+breakdown is counted live rather than read from DailyRollup, which can lag
+the change that triggered the rebuild. ReportLab only
+serializes a document when it is finished, so reports are always rendered
+to a file and streamed from disk in blocks.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import archive, tasks
+from .concurrency import db_read
+from .models import DailyRollup
+
+# Bump when the PDF layout changes so cached reports are regenerated
+REPORT_VERSION = 1
+
+HIGH_VALUE_COST = 100
+
+
+def get_date_range(filter_type, start_date=None, end_date=None):
+    """Get start and end dates based on filter type"""
+    today = timezone.now().date()
+
+    if filter_type == 'today':
+        return today, today
+    elif filter_type == 'week':
+        # Start of week (Monday)
+        start = today - timedelta(days=today.weekday())
+        end = start + timedelta(days=6)
+        return start, end
+    elif filter_type == 'month':
+        start = today.replace(day=1)
+        # Last day of month
+        if start.month == 12:
+            end = start.replace(year=start.year + 1, month=1) - timedelta(days=1)
+        else:
+            end = start.replace(month=start.month + 1) - timedelta(days=1)
+        return start, end
+    elif filter_type == 'quarter':
+        # Current quarter
+        quarter = (today.month - 1) // 3 + 1
+        start = today.replace(month=(quarter - 1) * 3 + 1, day=1)
+        if quarter == 4:
+            end = today.replace(year=today.year + 1, month=1, day=1) - timedelta(days=1)
+        else:
+            end = today.replace(month=quarter * 3 + 1, day=1) - timedelta(days=1)
+        return start, end
+    elif filter_type == 'year':
+        start = today.replace(month=1, day=1)
+        end = today.replace(month=12, day=31)
+        return start, end
+    elif filter_type == 'custom' and start_date and end_date:
+        return start_date, end_date
+    else:
+        # All time - return None to indicate no filtering
+        return None, None
+
+
+def period_querysets(start, end):
+    """Active and archived jobs created between start and end (inclusive), or all jobs"""
+    querysets = archive.all_job_querysets()
+    if start and end:
+        querysets = [jobs.filter(created_at__date__gte=start, created_at__date__lte=end) for jobs in querysets]
+    return querysets
+
+
+def median_cost(querysets, count):
+    """Median estimated_cost over the querysets, reading only the middle one or two rows"""
+    if not count:
+        return 0
+    costs = [
+        jobs.filter(estimated_cost__isnull=False).order_by().values_list('estimated_cost', flat=True)
+        for jobs in querysets
+    ]
+    ordered = costs[0].union(*costs[1:], all=True).order_by('estimated_cost')
+    middle = list(ordered[(count - 1) // 2:count // 2 + 1])
+    return sum(middle) / len(middle)
+
+
+def daily_breakdown(querysets, start, end, rollups=True):
+    """Revenue and priced job count per day, oldest first"""
+    # Days before the rollup watermark come from DailyRollup, later days are counted live
+    rollup_until = tasks.rollup_watermark() if rollups else None
+    live_from = timezone.localtime(rollup_until).date() if rollup_until else None
+
+    daily_totals = {}
+    for jobs in querysets:
+        daily_jobs = jobs.filter(estimated_cost__isnull=False)
+        if live_from:
+            daily_jobs = daily_jobs.filter(created_at__date__gte=live_from)
+        daily_data = daily_jobs.annotate(
+            date=TruncDate('created_at')
+        ).values('date').annotate(
+            total=Sum('estimated_cost'),
+            count=Count('id')
+        ).order_by('date')
+
+        for item in daily_data:
+            day = daily_totals.setdefault(item['date'], {'total': 0, 'count': 0})
+            day['total'] += item['total']
+            day['count'] += item['count']
+
+    if live_from:
+        rollups = DailyRollup.objects.filter(
+            day__gte=start, day__lte=end, day__lt=live_from, priced_jobs__gt=0
+        )
+        for rollup in rollups:
+            daily_totals[rollup.day] = {'total': rollup.revenue, 'count': rollup.priced_jobs}
+
+    return [
+        {'date': day, 'total': item['total'], 'count': item['count']}
+        for day, item in sorted(daily_totals.items())
+    ]
+
+
+def period_totals(querysets):
+    """Revenue, job counts and cost extremes over the querysets, one aggregate each"""
+    totals = {'total_cost': 0, 'jobs_with_cost_count': 0, 'total_jobs_count': 0}
+    highest, lowest = [], []
+    for jobs in querysets:
+        result = jobs.aggregate(
+            total=Sum('estimated_cost'),
+            priced=Count('estimated_cost'),
+            count=Count('id'),
+            highest=Max('estimated_cost'),
+            lowest=Min('estimated_cost'),
+        )
+        totals['total_cost'] += result['total'] or 0
+        totals['jobs_with_cost_count'] += result['priced']
+        totals['total_jobs_count'] += result['count']
+        if result['priced']:
+            highest.append(result['highest'])
+            lowest.append(result['lowest'])
+
+    priced = totals['jobs_with_cost_count']
+    totals['average_cost'] = totals['total_cost'] / priced if priced else 0
+    totals['highest_job_cost'] = max(highest, default=0)
+    totals['lowest_job_cost'] = min(lowest, default=0)
+    return totals
+
+
+def high_value_jobs(querysets, limit=10):
+    """The most expensive jobs of at least HIGH_VALUE_COST, highest first"""
+    jobs = []
+    for queryset in querysets:
+        jobs += list(queryset.filter(
+            estimated_cost__gte=HIGH_VALUE_COST
+        ).order_by('-estimated_cost')[:limit])
+    return sorted(jobs, key=lambda job: job.estimated_cost, reverse=True)[:limit]
+
+
+def period_summary(start, end, daily=True, rollups=True):
+    """
+    Totals, daily breakdown, median and high-value jobs for the period,
+    active and archived. With rollups=False every day is counted live.
+    """
+    querysets = period_querysets(start, end)
+    totals = period_totals(querysets)
+    return {
+        **totals,
+        'daily_breakdown': daily_breakdown(querysets, start, end, rollups) if daily and start and end else None,
+        'high_value_jobs': high_value_jobs(querysets),
+        'median_cost': median_cost(querysets, totals['jobs_with_cost_count']),
+    }
+
+
+async def aperiod_summary(start, end, daily=True):
+    """period_summary() for async views, with the independent queries run concurrently"""
+    querysets = period_querysets(start, end)
+    reads = [db_read(period_totals, querysets), db_read(high_value_jobs, querysets)]
+    if daily and start and end:
+        reads.append(db_read(daily_breakdown, querysets, start, end))
+    totals, top_jobs, *breakdown = await asyncio.gather(*reads)
+    return {
+        **totals,
+        'daily_breakdown': breakdown[0] if breakdown else None,
+        'high_value_jobs': top_jobs,
+        # Reads only the middle rows, but needs the priced count first
+        'median_cost': await db_read(median_cost, querysets, totals['jobs_with_cost_count']),
+    }
+
+
+def period_is_closed(end):
+    return end is not None and end < timezone.localdate()
+
+
+def period_fingerprint(start, end):
+    """Changes whenever a job in the period is added, edited or removed"""
+    count, last_change = 0, None
+    for jobs in period_querysets(start, end):
+        state = jobs.aggregate(count=Count('id'), last_change=Max('updated_at'))
+        count += state['count']
+        if state['last_change'] and (last_change is None or state['last_change'] > last_change):
+            last_change = state['last_change']
+    raw = f'{REPORT_VERSION}|{count}|{last_change.isoformat() if last_change else ""}'
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()[:12]
+
+
+def report_filename(start, end):
+    if start and end:
+        return f'revenue-{start:%Y%m%d}-{end:%Y%m%d}.pdf'
+    return f'revenue-all-time-{timezone.localdate():%Y%m%d}.pdf'
+
+
+def write_report_pdf(output, summary, start, end):
+    """Lay out the report with ReportLab's platypus; tables split across pages with repeated headers"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    styles = getSampleStyleSheet()
+    table_style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f3f4f6')),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.grey),
+        ('ALIGN', (-1, 0), (-1, -1), 'RIGHT'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+    ])
+
+    def money(value):
+        return f'€{value:,.2f}'
+
+    period = f'{start:%d/%m/%Y} - {end:%d/%m/%Y}' if start and end else 'All time'
+    story = [
+        Paragraph(f'{settings.SHOP_NAME} - Revenue report', styles['Title']),
+        Paragraph(f'Period: {period}', styles['Heading3']),
+        Paragraph(f'Generated {timezone.localtime():%d/%m/%Y %H:%M}', styles['Normal']),
+        Spacer(1, 0.5 * cm),
+        Table([
+            ['Total', ''],
+            ['Revenue', money(summary['total_cost'])],
+            ['Priced jobs', summary['jobs_with_cost_count']],
+            ['All jobs', summary['total_jobs_count']],
+            ['Average per priced job', money(summary['average_cost'])],
+            ['Median', money(summary['median_cost'])],
+            ['Highest', money(summary['highest_job_cost'])],
+            ['Lowest', money(summary['lowest_job_cost'])],
+        ], colWidths=[8 * cm, 5 * cm], style=table_style, hAlign='LEFT'),
+    ]
+
+    if summary['daily_breakdown']:
+        story += [
+            Spacer(1, 0.7 * cm),
+            Paragraph('Daily breakdown', styles['Heading2']),
+            Table(
+                [['Date', 'Day', 'Priced jobs', 'Revenue']] + [
+                    [f"{day['date']:%d/%m/%Y}", f"{day['date']:%A}", day['count'], money(day['total'])]
+                    for day in summary['daily_breakdown']
+                ],
+                colWidths=[3.5 * cm, 3.5 * cm, 3 * cm, 4 * cm],
+                style=table_style, repeatRows=1, hAlign='LEFT',
+            ),
+        ]
+
+    if summary['high_value_jobs']:
+        story += [
+            Spacer(1, 0.7 * cm),
+            Paragraph(f'High-value jobs (€{HIGH_VALUE_COST}+)', styles['Heading2']),
+            Table(
+                [['Job', 'Customer', 'Created', 'Status', 'Cost']] + [
+                    [job.job_id, job.customer_name[:30], f'{timezone.localtime(job.created_at):%d/%m/%Y}',
+                     job.get_status_display(), money(job.estimated_cost)]
+                    for job in summary['high_value_jobs']
+                ],
+                colWidths=[2.5 * cm, 5.5 * cm, 2.5 * cm, 3.5 * cm, 2.5 * cm],
+                style=table_style, repeatRows=1, hAlign='LEFT',
+            ),
+        ]
+
+    def footer(canvas, document):
+        canvas.saveState()
+        canvas.setFont('Helvetica', 8)
+        canvas.drawString(2 * cm, 1.2 * cm, f'{settings.SHOP_NAME} - {settings.SHOP_ADDRESS}')
+        canvas.drawRightString(A4[0] - 2 * cm, 1.2 * cm, f'Page {document.page}')
+        canvas.restoreState()
+
+    document = SimpleDocTemplate(
+        output, pagesize=A4, title=f'Revenue report {period}', author=settings.SHOP_NAME,
+        leftMargin=2 * cm, rightMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm,
+    )
+    document.build(story, onFirstPage=footer, onLaterPages=footer)
+
+
+def period_report(start, end):
+    """
+    An open binary file with the PDF report for the period and its download
+    name. Reports for closed periods are cached in REPORT_CACHE_DIR.
+    """
+    filename = report_filename(start, end)
+    if not (start and end and period_is_closed(end)):
+        report = tempfile.TemporaryFile(suffix='.pdf')
+        write_report_pdf(report, period_summary(start, end), start, end)
+        report.seek(0)
+        return report, filename
+
+    os.makedirs(settings.REPORT_CACHE_DIR, exist_ok=True)
+    stem = filename.removesuffix('.pdf')
+    path = os.path.join(settings.REPORT_CACHE_DIR, f'{stem}-{period_fingerprint(start, end)}.pdf')
+    if not os.path.exists(path):
+        with tempfile.NamedTemporaryFile(dir=settings.REPORT_CACHE_DIR, suffix='.tmp', delete=False) as f:
+            try:
+                # DailyRollup can lag a change the fingerprint already sees; the
+                # cached copy must match the jobs, so it counts every day live
+                write_report_pdf(f, period_summary(start, end, rollups=False), start, end)
+            except Exception:
+                os.remove(f.name)
+                raise
+        os.replace(f.name, path)
+        # Reports from before the period's last change are stale
+        for name in os.listdir(settings.REPORT_CACHE_DIR):
+            if name.startswith(f'{stem}-') and name.endswith('.pdf') and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(settings.REPORT_CACHE_DIR, name))
+                except FileNotFoundError:
+                    pass
+    return open(path, 'rb'), filename
@@ -0,0 +1,391 @@
+"""
+S3-compatible photo storage on the standard library.
+
+S3Storage keeps photos in a bucket of any S3-compatible object store (AWS
+S3, MinIO, Ceph, R2), so app servers need no shared disk. Requests are
+signed with AWS Signature Version 4 and sent with http.client over a pool of
+keep-alive connections shared by the threads of a process, at most
+max_connections at a time. Files larger than multipart_threshold go up as a
+multipart upload, multipart_chunk_size per part, upload_threads parts at a
+time; only the parts being sent are held in memory.
+
+url() returns a presigned GET URL, so browsers fetch photos from the store
+and the bytes never pass through Django. The signing time is rounded down to
+half of url_expiry, so a photo keeps the same URL, and stays in the browser
+cache, for at least that long.
+
+Bodies are sent as UNSIGNED-PAYLOAD (use https endpoints) rather than hashed
+first, and opened files stream from the response instead of being read into
+memory. Objects are addressed path-style: <endpoint>/<bucket>/<key>.
+"""
+
+import hashlib
+import hmac
+import http.client
+import io
+import mimetypes
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+
+from django.core.files.base import File
+from django.core.files.storage import Storage
+from django.utils.deconstruct import deconstructible
+
+ALGORITHM = 'AWS4-HMAC-SHA256'
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+AMZ_DATE_FORMAT = '%Y%m%dT%H%M%SZ'
+
+# S3 refuses multipart parts under 5 MiB, except the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+READ_BUFFER_SIZE = 64 * 1024
+
+XML_NAMESPACE = re.compile(r'^\{[^}]*\}')
+
+
+class S3Error(OSError):
+    def __init__(self, status, code, message=''):
+        super().__init__(f'{status} {code}: {message}' if message else f'{status} {code}')
+        self.status = status
+        self.code = code
+
+
+def quote_path(path):
+    return quote(path, safe='/-_.~')
+
+
+def canonical_query(query):
+    pairs = sorted((quote(str(name), safe='-_.~'), quote(str(value), safe='-_.~')) for name, value in query.items())
+    return '&'.join(f'{name}={value}' for name, value in pairs)
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+def signing_key(secret_access_key, date, region):
+    key = _hmac(f'AWS4{secret_access_key}'.encode(), date)
+    for part in (region, 's3', 'aws4_request'):
+        key = _hmac(key, part)
+    return key
+
+
+def credential_scope(amz_date, region):
+    return f'{amz_date[:8]}/{region}/s3/aws4_request'
+
+
+def signature(key, amz_date, region, method, path, query, headers, payload_hash):
+    """
+    Signature Version 4 of a request with `key` (signing_key() of its date),
+    and the signed header names. `headers` are the headers to sign, Host included.
+    """
+    values = {name.lower(): ' '.join(str(value).split()) for name, value in headers.items()}
+    names = sorted(values)
+    canonical_request = '\n'.join([
+        method,
+        quote_path(path),
+        canonical_query(query),
+        ''.join(f'{name}:{values[name]}\n' for name in names),
+        ';'.join(names),
+        payload_hash,
+    ])
+    string_to_sign = '\n'.join([
+        ALGORITHM,
+        amz_date,
+        credential_scope(amz_date, region),
+        hashlib.sha256(canonical_request.encode()).hexdigest(),
+    ])
+    return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest(), ';'.join(names)
+
+
+def _xml_text(body, tag):
+    """Text of the first element named `tag` in an S3 XML document, ignoring namespaces"""
+    for element in ElementTree.fromstring(body).iter():
+        if XML_NAMESPACE.sub('', element.tag) == tag:
+            return element.text
+    return None
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to one endpoint, at most `max_connections` in use at a time"""
+
+    def __init__(self, endpoint_url, max_connections=10, timeout=30):
+        parts = urlsplit(endpoint_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.netloc = parts.netloc
+        self.timeout = timeout
+        self.opened = 0
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise S3Error(0, 'PoolTimeout', f'No free connection to {self.netloc} after {self.timeout}s')
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            self.opened += 1
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def release(self, connection, reusable=True):
+        if reusable:
+            with self._lock:
+                self._idle.append(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+
+class _ResponseBody(io.RawIOBase):
+    """A streamed response body; gives its connection back to the pool when closed"""
+
+    def __init__(self, response, connection, pool):
+        self._response = response
+        self._connection = connection
+        self._pool = pool
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._response.readinto(buffer)
+
+    def close(self):
+        if not self.closed:
+            # A connection with unread body left can't carry another request
+            finished = self._response.isclosed() and not self._response.will_close
+            self._pool.release(self._connection, reusable=finished)
+        super().close()
+
+
+class S3Client:
+    """The object store calls S3Storage needs, on one bucket"""
+
+    def __init__(self, endpoint_url, bucket, access_key_id, secret_access_key, region='us-east-1',
+                 max_connections=10, timeout=30):
+        parts = urlsplit(endpoint_url)
+        self.pool = ConnectionPool(endpoint_url, max_connections, timeout)
+        self.origin = f'{parts.scheme}://{parts.netloc}'
+        self.prefix = parts.path.rstrip('/')
+        self.bucket = bucket
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.region = region
+        self._keys = {}
+
+    def object_path(self, key=''):
+        return f'{self.prefix}/{self.bucket}/{key}'
+
+    def _signing_key(self, date):
+        # Derived once per day rather than per request or URL
+        key = self._keys.get(date)
+        if key is None:
+            self._keys = {date: signing_key(self.secret_access_key, date, self.region)}
+            key = self._keys[date]
+        return key
+
+    def _signed_headers(self, method, path, query, headers, now=None):
+        amz_date = (now or datetime.now(dt_timezone.utc)).strftime(AMZ_DATE_FORMAT)
+        headers = {**headers, 'Host': self.pool.netloc, 'x-amz-date': amz_date, 'x-amz-content-sha256': UNSIGNED_PAYLOAD}
+        signed = {name: value for name, value in headers.items() if name != 'Content-Length'}
+        sig, signed_names = signature(
+            self._signing_key(amz_date[:8]), amz_date, self.region, method, path, query, signed, UNSIGNED_PAYLOAD,
+        )
+        headers['Authorization'] = (
+            f'{ALGORITHM} Credential={self.access_key_id}/{credential_scope(amz_date, self.region)}, '
+            f'SignedHeaders={signed_names}, Signature={sig}'
+        )
+        return headers
+
+    def request(self, method, key='', query=None, headers=None, body=None, stream=False):
+        """
+        Send a signed request. Returns (response, body bytes), or (response, a
+        file-like body) with `stream`. Raises FileNotFoundError for a 404 and
+        S3Error for other errors. `body` must be bytes or None, so a request
+        on a keep-alive connection the server has dropped can be sent again.
+        """
+        query = query or {}
+        path = self.object_path(key)
+        target = quote_path(path) + (f'?{canonical_query(query)}' if query else '')
+        for attempt in (1, 2):
+            headers_out = self._signed_headers(method, path, query, headers or {})
+            connection = self.pool.acquire()
+            reused = connection.sock is not None
+            try:
+                connection.request(method, target, body=body, headers=headers_out)
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                self.pool.release(connection, reusable=False)
+                if reused and attempt == 1:
+                    continue
+                raise
+            break
+
+        if stream and response.status < 300:
+            return response, _ResponseBody(response, connection, self.pool)
+        try:
+            data = response.read()
+        finally:
+            self.pool.release(connection, reusable=not response.will_close)
+        if response.status == 404:
+            raise FileNotFoundError(f'{self.bucket}/{key} not found')
+        if response.status >= 300:
+            code = message = ''
+            if data:
+                try:
+                    code, message = _xml_text(data, 'Code') or '', _xml_text(data, 'Message') or ''
+                except ElementTree.ParseError:
+                    pass
+            raise S3Error(response.status, code or response.reason, message)
+        return response, data
+
+    def put_object(self, key, data, content_type):
+        self.request('PUT', key, headers={'Content-Type': content_type}, body=data)
+
+    def get_object(self, key):
+        return self.request('GET', key, stream=True)
+
+    def head_object(self, key):
+        """The object's response headers, or None if there is no such object"""
+        try:
+            response, _ = self.request('HEAD', key)
+        except FileNotFoundError:
+            return None
+        return response.headers
+
+    def delete_object(self, key):
+        self.request('DELETE', key)
+
+    def create_multipart_upload(self, key, content_type):
+        _, data = self.request('POST', key, query={'uploads': ''}, headers={'Content-Type': content_type})
+        return _xml_text(data, 'UploadId')
+
+    def upload_part(self, key, upload_id, number, data):
+        response, _ = self.request('PUT', key, query={'partNumber': number, 'uploadId': upload_id}, body=data)
+        return response.headers['ETag']
+
+    def complete_multipart_upload(self, key, upload_id, etags):
+        parts = ''.join(
+            f'<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>'
+            for number, etag in enumerate(etags, 1)
+        )
+        body = f'<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>'.encode()
+        _, data = self.request('POST', key, query={'uploadId': upload_id}, body=body)
+        # S3 can answer 200 and still report a failure in the body
+        if _xml_text(data, 'Code'):
+            raise S3Error(200, _xml_text(data, 'Code'), _xml_text(data, 'Message') or '')
+
+    def abort_multipart_upload(self, key, upload_id):
+        self.request('DELETE', key, query={'uploadId': upload_id})
+
+    def presigned_url(self, key, expires, now=None):
+        """GET URL of `key` that is valid for `expires` seconds from `now`, without credentials"""
+        amz_date = (now or datetime.now(dt_timezone.utc)).strftime(AMZ_DATE_FORMAT)
+        path = self.object_path(key)
+        query = {
+            'X-Amz-Algorithm': ALGORITHM,
+            'X-Amz-Credential': f'{self.access_key_id}/{credential_scope(amz_date, self.region)}',
+            'X-Amz-Date': amz_date,
+            'X-Amz-Expires': int(expires),
+            'X-Amz-SignedHeaders': 'host',
+        }
+        sig, _ = signature(
+            self._signing_key(amz_date[:8]), amz_date, self.region, 'GET', path, query,
+            {'host': self.pool.netloc}, UNSIGNED_PAYLOAD,
+        )
+        return f'{self.origin}{quote_path(path)}?{canonical_query(query)}&X-Amz-Signature={sig}'
+
+
+@deconstructible(path='repairs.s3.S3Storage')
+class S3Storage(Storage):
+    """Django storage on an S3-compatible bucket; configured by alamana_repair/storages.py"""
+
+    def __init__(self, endpoint_url, bucket, access_key_id, secret_access_key, region='us-east-1',
+                 max_connections=10, multipart_threshold=8 * 1024 * 1024, multipart_chunk_size=8 * 1024 * 1024,
+                 upload_threads=4, url_expiry=3600, timeout=30):
+        if multipart_chunk_size < MIN_PART_SIZE:
+            raise ValueError(f'multipart_chunk_size must be at least {MIN_PART_SIZE} bytes')
+        self.client = S3Client(endpoint_url, bucket, access_key_id, secret_access_key, region,
+                               max_connections, timeout)
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunk_size = multipart_chunk_size
+        self.upload_threads = upload_threads
+        self.url_expiry = url_expiry
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode or '+' in mode:
+            raise ValueError('S3Storage files are read-only; save() a new file instead')
+        response, body = self.client.get_object(name)
+        f = File(io.BufferedReader(body, READ_BUFFER_SIZE), name)
+        f.size = int(response.headers['Content-Length'])
+        f.mode = mode
+        return f
+
+    def _save(self, name, content):
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        if content.size is not None and content.size <= self.multipart_threshold:
+            self.client.put_object(name, content.read(), content_type)
+        else:
+            self._save_multipart(name, content, content_type)
+        return name
+
+    def _save_multipart(self, name, content, content_type):
+        upload_id = self.client.create_multipart_upload(name, content_type)
+        # One slot per part in flight, so memory stays at upload_threads parts
+        slots = threading.Semaphore(self.upload_threads)
+
+        def upload(number, data):
+            try:
+                return self.client.upload_part(name, upload_id, number, data)
+            finally:
+                slots.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.upload_threads, thread_name_prefix='s3-upload') as pool:
+                futures = []
+                while True:
+                    slots.acquire()
+                    data = content.read(self.multipart_chunk_size)
+                    if not data:
+                        slots.release()
+                        break
+                    futures.append(pool.submit(upload, len(futures) + 1, data))
+                etags = [future.result() for future in futures]
+            self.client.complete_multipart_upload(name, upload_id, etags)
+        except BaseException:
+            self.client.abort_multipart_upload(name, upload_id)
+            raise
+
+    def delete(self, name):
+        self.client.delete_object(name)
+
+    def exists(self, name):
+        return self.client.head_object(name) is not None
+
+    def size(self, name):
+        headers = self.client.head_object(name)
+        if headers is None:
+            raise FileNotFoundError(name)
+        return int(headers['Content-Length'])
+
+    def get_modified_time(self, name):
+        headers = self.client.head_object(name)
+        if headers is None:
+            raise FileNotFoundError(name)
+        return parsedate_to_datetime(headers['Last-Modified'])
+
+    def url(self, name):
+        now = datetime.now(dt_timezone.utc).timestamp()
+        # The same URL for half the expiry, so browsers can cache the photo
+        signed_at = now - now % (self.url_expiry // 2)
+        return self.client.presigned_url(name, self.url_expiry, datetime.fromtimestamp(signed_at, dt_timezone.utc))
@@ -0,0 +1,230 @@
+"""
+In-process stand-in for an S3-compatible object store.
+
+LocalS3Server serves one bucket from memory on 127.0.0.1, over HTTP/1.1 with
+keep-alive, for the tests of repairs/s3.py and for trying PHOTO_STORAGE=s3
+without a real store. It checks the Signature Version 4 of every request,
+in the Authorization header or in a presigned URL (including its expiry),
+and implements the calls S3Storage makes: PUT, GET, HEAD and DELETE of an
+object, and multipart uploads. Parts other than the last must be at least
+min_part_size, as on S3. It counts the connections it accepts, so tests can
+check that the client reuses them.
+"""
+
+import hashlib
+import hmac
+import re
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.etree import ElementTree
+
+from . import s3
+
+AUTHORIZATION_RE = re.compile(
+    r'^AWS4-HMAC-SHA256 Credential=(?P<access_key>[^/]+)/(?P<scope>[^,]+), '
+    r'SignedHeaders=(?P<signed>[^,]+), Signature=(?P<signature>[0-9a-f]+)$'
+)
+
+
+class StoredObject:
+    def __init__(self, data, content_type):
+        self.data = data
+        self.content_type = content_type
+        self.etag = f'"{hashlib.md5(data).hexdigest()}"'
+        self.last_modified = datetime.now(dt_timezone.utc)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_request(send_body=True)
+
+    def do_HEAD(self):
+        self.handle_request(send_body=False)
+
+    def do_PUT(self):
+        self.handle_request()
+
+    def do_POST(self):
+        self.handle_request()
+
+    def do_DELETE(self):
+        self.handle_request()
+
+    def handle_request(self, send_body=True):
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        query = dict(parse_qsl(url.query, keep_blank_values=True))
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        error = self.server.authenticate(self.command, path, query, self.headers)
+        if error:
+            return self.send_error_xml(403, error)
+        bucket, _, key = path.lstrip('/').partition('/')
+        if bucket != self.server.bucket:
+            return self.send_error_xml(404, 'NoSuchBucket')
+        getattr(self, f'{self.command.lower()}_object')(key, query, body, send_body)
+
+    def send(self, status, body=b'', headers=None, send_body=True):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body and body:
+            self.wfile.write(body)
+
+    def send_error_xml(self, status, code, send_body=True):
+        body = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code><Message>{code}</Message></Error>'
+        self.send(status, body.encode(), {'Content-Type': 'application/xml'}, send_body and self.command != 'HEAD')
+
+    def get_object(self, key, query, body, send_body):
+        stored = self.server.objects.get(key)
+        if stored is None:
+            return self.send_error_xml(404, 'NoSuchKey', send_body)
+        self.send(200, stored.data, {
+            'Content-Type': stored.content_type,
+            'ETag': stored.etag,
+            'Last-Modified': format_datetime(stored.last_modified, usegmt=True),
+        }, send_body)
+
+    head_object = get_object
+
+    def put_object(self, key, query, body, send_body):
+        if 'uploadId' in query:
+            upload = self.server.uploads.get(query['uploadId'])
+            if upload is None:
+                return self.send_error_xml(404, 'NoSuchUpload')
+            upload['parts'][int(query['partNumber'])] = body
+            return self.send(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+        content_type = self.headers.get('Content-Type', 'application/octet-stream')
+        self.server.objects[key] = StoredObject(body, content_type)
+        self.send(200, headers={'ETag': self.server.objects[key].etag})
+
+    def post_object(self, key, query, body, send_body):
+        if 'uploads' in query:
+            upload_id = uuid.uuid4().hex
+            content_type = self.headers.get('Content-Type', 'application/octet-stream')
+            self.server.uploads[upload_id] = {'key': key, 'content_type': content_type, 'parts': {}}
+            document = f'<InitiateMultipartUploadResult><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>'
+            return self.send(200, document.encode(), {'Content-Type': 'application/xml'})
+
+        upload = self.server.uploads.get(query.get('uploadId'))
+        if upload is None:
+            return self.send_error_xml(404, 'NoSuchUpload')
+        requested = [
+            (int(part.findtext('PartNumber')), part.findtext('ETag'))
+            for part in ElementTree.fromstring(body).iter('Part')
+        ]
+        numbers = [number for number, _ in requested]
+        if numbers != sorted(numbers) or any(number not in upload['parts'] for number in numbers):
+            return self.send_error_xml(400, 'InvalidPart')
+        for number, etag in requested:
+            if etag != f'"{hashlib.md5(upload["parts"][number]).hexdigest()}"':
+                return self.send_error_xml(400, 'InvalidPart')
+        if any(len(upload['parts'][number]) < self.server.min_part_size for number in numbers[:-1]):
+            return self.send_error_xml(400, 'EntityTooSmall')
+        data = b''.join(upload['parts'][number] for number in numbers)
+        self.server.objects[upload['key']] = StoredObject(data, upload['content_type'])
+        self.server.uploads.pop(query['uploadId'], None)
+        self.send(200, b'<CompleteMultipartUploadResult></CompleteMultipartUploadResult>',
+                  {'Content-Type': 'application/xml'})
+
+    def delete_object(self, key, query, body, send_body):
+        if 'uploadId' in query:
+            self.server.uploads.pop(query['uploadId'], None)
+        else:
+            self.server.objects.pop(key, None)
+        self.send(204)
+
+
+class LocalS3Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, bucket='photos', access_key_id='local', secret_access_key='local-secret',
+                 region='us-east-1', min_part_size=s3.MIN_PART_SIZE):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.bucket = bucket
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.region = region
+        self.min_part_size = min_part_size
+        self.objects = {}
+        self.uploads = {}
+        # Each connection is served on its own thread
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def endpoint_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def storage_options(self, **options):
+        """OPTIONS for an S3Storage on this server"""
+        return {
+            'endpoint_url': self.endpoint_url,
+            'bucket': self.bucket,
+            'access_key_id': self.access_key_id,
+            'secret_access_key': self.secret_access_key,
+            'region': self.region,
+            **options,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='local-s3', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def authenticate(self, method, path, query, headers):
+        """None if the request is signed with our credentials, else the S3 error code"""
+        if 'X-Amz-Signature' in query:
+            query = dict(query)
+            given = query.pop('X-Amz-Signature')
+            access_key, _, scope = query.get('X-Amz-Credential', '').partition('/')
+            amz_date = query.get('X-Amz-Date', '')
+            signed_names = query.get('X-Amz-SignedHeaders', '')
+            payload_hash = s3.UNSIGNED_PAYLOAD
+            try:
+                signed_at = datetime.strptime(amz_date, s3.AMZ_DATE_FORMAT).replace(tzinfo=dt_timezone.utc)
+                expires = int(query.get('X-Amz-Expires', ''))
+            except ValueError:
+                return 'AuthorizationQueryParametersError'
+            if datetime.now(dt_timezone.utc) > signed_at + timedelta(seconds=expires):
+                return 'AccessDenied'
+        else:
+            match = AUTHORIZATION_RE.match(headers.get('Authorization', ''))
+            if not match:
+                return 'AccessDenied'
+            access_key, scope = match['access_key'], match['scope']
+            given, signed_names = match['signature'], match['signed']
+            amz_date = headers.get('x-amz-date', '')
+            payload_hash = headers.get('x-amz-content-sha256', '')
+
+        if access_key != self.access_key_id or scope != s3.credential_scope(amz_date, self.region):
+            return 'InvalidAccessKeyId'
+        signed = {name: headers.get(name, '') for name in signed_names.split(';')}
+        key = s3.signing_key(self.secret_access_key, amz_date[:8], self.region)
+        expected, _ = s3.signature(key, amz_date, self.region, method, path, query, signed, payload_hash)
+        if not hmac.compare_digest(expected.encode(), given.encode()):
+            return 'SignatureDoesNotMatch'
+        return None
@@ -0,0 +1,125 @@
+"""
+Lightweight periodic task scheduler.
+
+Tasks are configured in settings.SCHEDULER_TASKS as name -> cron expression
+(minute hour day-of-month month day-of-week) and implemented in
+repairs/tasks.py. Every node may run ``manage.py run_scheduler``; a lease row
+in ScheduledTask makes sure only one node runs a given task at a time, and
+the task's last run time stops a second node from repeating a slot that has
+already been handled.
+"""
+
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ScheduledTask
+
+logger = logging.getLogger('repairs.scheduler')
+
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+
+def parse_cron_field(field, low, high):
+    """Expand one cron field ('*', '*/15', '9-18', '1,15') into a set of values"""
+    values = set()
+    for part in field.split(','):
+        part, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(v) for v in part.split('-'))
+        else:
+            start = end = int(part)
+        if not (low <= start <= end <= high):
+            raise ValueError(f"Cron field '{field}' is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def parse_cron(expression):
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"Cron expression '{expression}' needs 5 fields")
+    return [parse_cron_field(field, low, high) for field, (low, high) in zip(fields, CRON_RANGES)]
+
+
+def cron_matches(schedule, moment):
+    """True if the parsed cron schedule fires in the minute of `moment` (local time)"""
+    moment = timezone.localtime(moment)
+    minute, hour, day, month, weekday = schedule
+    # Cron counts Sunday as 0, Python's weekday() counts Monday as 0
+    return (
+        moment.minute in minute and moment.hour in hour and moment.day in day
+        and moment.month in month and (moment.weekday() + 1) % 7 in weekday
+    )
+
+
+def node_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_lease(name, owner, now):
+    """Atomically take the task's lease if it is free, expired or already ours"""
+    ScheduledTask.objects.get_or_create(name=name)
+    ttl = timedelta(seconds=settings.SCHEDULER_LEASE_SECONDS)
+    return ScheduledTask.objects.filter(name=name).filter(
+        Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now) | Q(lease_owner=owner)
+    ).update(lease_owner=owner, lease_expires_at=now + ttl) == 1
+
+
+def renew_lease(state, now=None):
+    """
+    Push back the lease of a running task, for tasks whose batches can
+    outlast SCHEDULER_LEASE_SECONDS. False if another node has taken it over.
+    """
+    ttl = timedelta(seconds=settings.SCHEDULER_LEASE_SECONDS)
+    return ScheduledTask.objects.filter(name=state.name, lease_owner=state.lease_owner).update(
+        lease_expires_at=(now or timezone.now()) + ttl
+    ) == 1
+
+
+def release_lease(name, owner):
+    ScheduledTask.objects.filter(name=name, lease_owner=owner).update(lease_owner='', lease_expires_at=None)
+
+
+def run_task(name, func, owner, now, force=False):
+    """
+    Run one task under its lease. Returns the task's result string, or None
+    if another node holds the lease or already ran this slot.
+    """
+    if not acquire_lease(name, owner, now):
+        return None
+    try:
+        state = ScheduledTask.objects.get(name=name)
+        slot = now.replace(second=0, microsecond=0)
+        if not force and state.last_run_at and state.last_run_at >= slot:
+            return None
+
+        try:
+            result, watermark = func(state, now, settings.SCHEDULER_BATCH_SIZE)
+        except Exception as e:
+            logger.exception("Scheduled task %s failed", name)
+            result, watermark = f"error: {e}"[:200], state.watermark
+
+        ScheduledTask.objects.filter(name=name).update(
+            last_run_at=now, last_result=result[:200], watermark=watermark,
+        )
+        logger.info("Scheduled task %s: %s", name, result)
+        return result
+    finally:
+        release_lease(name, owner)
+
+
+def due_tasks(now, tasks):
+    """Names of configured tasks whose schedule fires this minute"""
+    return [
+        name for name, expression in settings.SCHEDULER_TASKS.items()
+        if name in tasks and cron_matches(parse_cron(expression), now)
+    ]
@@ -0,0 +1,191 @@
+"""
+Synthetic Customer/RepairJob/RepairJobPhoto data for benchmarks and tests.
+
+Generation is deterministic for a given random seed, so two runs with the
+same options produce the same dataset.
+"""
+
+import io
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import due
+from .customers import link_customers
+from .models import ArchivedRepairJob, Customer, RepairJob, RepairJobPhoto, repair_photo_upload_path
+
+# Share of jobs in each status, roughly what a year-old shop looks like
+DEFAULT_STATUS_MIX = {
+    'RECEIVED': 4,
+    'DIAGNOSED': 3,
+    'IN_PROGRESS': 5,
+    'WAITING_PARTS': 3,
+    'READY': 5,
+    'COMPLETED': 80,
+}
+
+FIRST_NAMES = ['Jan', 'Sofie', 'Mohamed', 'Emma', 'Lucas', 'Fatima', 'Noah', 'Lina', 'Youssef', 'Marie']
+LAST_NAMES = ['Peeters', 'Janssens', 'El Amrani', 'Maes', 'Jacobs', 'Mertens', 'Willems', 'Claes', 'Goossens', 'Wouters']
+BIKES = ['Stromer ST3', 'Gazelle Ultimate', 'Riese & Muller Load', 'Cowboy 4', 'VanMoof S3', 'Cube Kathmandu']
+ISSUES = ['flat tyre', 'battery not charging', 'brake squeal', 'display error', 'motor noise', 'loose chain']
+
+# Share of jobs brought in by a customer who has been here before
+REPEAT_CUSTOMER_SHARE = 0.3
+
+BATCH_SIZE = 5000
+
+
+def parse_status_mix(value):
+    """Parse 'READY=5,COMPLETED=80' into a status -> weight dict"""
+    mix = {}
+    valid = dict(RepairJob.STATUS_CHOICES)
+    for part in value.split(','):
+        status, _, weight = part.partition('=')
+        status = status.strip().upper()
+        if status not in valid:
+            raise ValueError(f"Unknown status '{status}'")
+        mix[status] = float(weight)
+    return mix
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the generated created_at/updated_at/uploaded_at values"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def make_photo_bytes(rng, size=(320, 240)):
+    """Small JPEG with a random flat colour"""
+    from PIL import Image
+
+    image = Image.new('RGB', size, tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=70)
+    return buffer.getvalue()
+
+
+def next_job_number(using='default'):
+    # Archived jobs keep their numbers, so look at both tables, as RepairJob.save() does
+    last_numbers = [
+        int(job.job_id.split('-')[1])
+        for job in (
+            RepairJob.objects.using(using).order_by('-id').first(),
+            ArchivedRepairJob.objects.using(using).order_by('-id').first(),
+        )
+        if job
+    ]
+    return max(last_numbers) + 1 if last_numbers else 1001
+
+
+def generate_jobs(count, rng, start_number, status_mix=None, days=365):
+    """Yield unsaved RepairJob instances spread over the last `days` days"""
+    status_mix = status_mix or DEFAULT_STATUS_MIX
+    statuses = list(status_mix)
+    weights = [status_mix[s] for s in statuses]
+    estimates = [code for code, _ in RepairJob.ESTIMATED_TIME_CHOICES]
+    now = timezone.now()
+    customers = []
+
+    for i in range(count):
+        status = rng.choices(statuses, weights)[0]
+        # Active jobs are recent, completed ones anywhere in the window
+        max_age = days if status == 'COMPLETED' else min(days, 30)
+        created_at = now - timedelta(seconds=rng.randrange(max_age * 86400))
+        updated_at = created_at + (now - created_at) * rng.random()
+
+        # About a third of jobs are not priced yet; the rest are log-normal around 80 EUR
+        cost = None
+        if rng.random() > 0.3 or status == 'COMPLETED':
+            cost = Decimal(f'{min(rng.lognormvariate(4.3, 0.6), 999999):.2f}')
+
+        ready_notified_at = None
+        if status in ('READY', 'COMPLETED'):
+            ready_notified_at = updated_at
+
+        if customers and rng.random() < REPEAT_CUSTOMER_SHARE:
+            customer_name, phone_number = rng.choice(customers)
+        else:
+            customer_name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+            phone_number = f'+32 4{rng.randrange(70, 100)} {rng.randrange(10, 100)} {rng.randrange(10, 100)} {rng.randrange(10, 100)}'
+            customers.append((customer_name, phone_number))
+
+        # Drawn in this order so a given seed still produces the same jobs
+        bike_description = f'{rng.choice(BIKES)}, {rng.choice(ISSUES)}'
+        estimate = rng.choice(estimates)
+        yield RepairJob(
+            job_id=f'AJ-{start_number + i}',
+            customer_name=customer_name,
+            phone_number=phone_number,
+            bike_description=bike_description,
+            status=status,
+            estimated_repair_time=estimate,
+            estimated_cost=cost,
+            created_at=created_at,
+            updated_at=updated_at,
+            ready_notified_at=ready_notified_at,
+            due_at=due.due_at(estimate, created_at) if status in due.OPEN_STATUSES else None,
+        )
+
+
+def seed_jobs(count, seed=0, status_mix=None, photos_per_job=0.0, days=365,
+              media_root=None, using='default', progress=None):
+    """
+    Create `count` jobs in batches, plus on average `photos_per_job` photos
+    per job written under media_root. Returns (jobs_created, photos_created).
+    """
+    rng = random.Random(seed)
+    media_root = Path(media_root or settings.MEDIA_ROOT)
+    photo_variants = [make_photo_bytes(rng) for _ in range(8)] if photos_per_job else []
+    start_number = next_job_number(using)
+    jobs_created = photos_created = 0
+
+    jobs = generate_jobs(count, rng, start_number, status_mix, days)
+    with explicit_timestamps(RepairJob, RepairJobPhoto):
+        while jobs_created < count:
+            batch = [job for _, job in zip(range(BATCH_SIZE), jobs)]
+            link_customers(Customer, batch, using)
+            RepairJob.objects.using(using).bulk_create(batch)
+            # bulk_create does not return primary keys on every backend
+            saved = RepairJob.objects.using(using).in_bulk(
+                [job.job_id for job in batch], field_name='job_id'
+            )
+
+            photos = []
+            for job in batch:
+                n = int(photos_per_job) + (rng.random() < photos_per_job % 1)
+                for p in range(n):
+                    photo = RepairJobPhoto(
+                        repair_job=saved[job.job_id],
+                        description=f'Drop-off photo - seed_{p}.jpg',
+                        uploaded_at=job.created_at,
+                    )
+                    name = repair_photo_upload_path(photo, f'seed_{p}.jpg')
+                    path = media_root / name
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(rng.choice(photo_variants))
+                    photo.photo.name = name
+                    photos.append(photo)
+            RepairJobPhoto.objects.using(using).bulk_create(photos, batch_size=BATCH_SIZE)
+
+            jobs_created += len(batch)
+            photos_created += len(photos)
+            if progress:
+                progress(jobs_created, photos_created)
+
+    return jobs_created, photos_created
@@ -0,0 +1,33 @@
+"""
+Sessions for polling endpoints.
+
+The dashboard polls its stats every 30 seconds and the summary page refreshes
+every minute, for as long as a staff member keeps the tab open. Views marked
+@session_read_only never write the session: anything that changed it during
+the request is dropped instead of being saved back to the store.
+"""
+
+from django.contrib.sessions import middleware
+from django.utils.cache import patch_vary_headers
+
+
+def session_read_only(view_func):
+    """Never save the session from this view's responses, like csrf_exempt marks a view"""
+    view_func.session_read_only = True
+    return view_func
+
+
+class SessionMiddleware(middleware.SessionMiddleware):
+    """Django's SessionMiddleware, skipping the save for @session_read_only views"""
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'session_read_only', False):
+            request.session_read_only = True
+        return None
+
+    def process_response(self, request, response):
+        if not getattr(request, 'session_read_only', False):
+            return super().process_response(request, response)
+        if request.session.accessed:
+            patch_vary_headers(response, ('Cookie',))
+        return response
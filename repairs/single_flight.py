@@ -0,0 +1,133 @@
+"""
+Single-flight coalescing of identical concurrent computations.
+
+Several staff tabs poll dashboard_stats and total_summary_filtered with the
+same parameters, and a debounced search box can send the same
+dashboard_content request twice. run() computes a result once for every
+caller that asks for the same view and parameters while it is being
+computed: the first caller (the leader) runs the computation and the others
+wait for its result instead of repeating its queries. A result is never
+kept once its computation has finished, so a request only ever gets a
+result that was still being computed when it arrived, as if the two
+requests had been served together.
+
+Within a process the flights are shared through a dict of
+concurrent.futures.Future, so callers on different threads and event loops
+can wait for each other. If the leader's request is cancelled (the client
+went away) a waiting caller computes the result itself; if it fails, they
+all get its exception.
+
+With SINGLE_FLIGHT_CACHE_LOCK the leaders of the worker processes also
+coalesce through the default cache: the first takes a lock holding a token,
+stores its result under that token and releases the lock; the others poll
+for the result every SINGLE_FLIGHT_POLL_SECONDS, and compute it themselves
+if the lock goes away without one or SINGLE_FLIGHT_TIMEOUT passes. Results
+must then be picklable: views share rendered HTML. The file cache's add()
+is not atomic across processes, so two workers may now and then both lead;
+that only costs the computation coalescing would have saved.
+
+Results are shared, not copied: callers must not change them.
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+_flights = {}
+_lock = threading.Lock()
+_missing = object()
+
+
+def flight_key(view, **params):
+    """Key of `view` computed from `params`, the normalised values it reads from the request"""
+    return f"{view}?{urlencode(sorted((name, str(value)) for name, value in params.items()))}"
+
+
+def lock_key(key):
+    """Cache key of the cross-worker lock of a flight"""
+    return f'single-flight:{hashlib.sha1(key.encode()).hexdigest()}'
+
+
+async def run(view, compute, **params):
+    """
+    The result of `await compute()`, computed once for every concurrent
+    caller passing the same view and params.
+    """
+    key = flight_key(view, **params)
+    while True:
+        with _lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = concurrent.futures.Future()
+        if leader:
+            break
+        try:
+            # Shielded: a caller that goes away must not cancel the flight
+            result = await asyncio.shield(asyncio.wrap_future(flight))
+        except asyncio.CancelledError:
+            if flight.cancelled():
+                continue
+            raise
+        metrics.COALESCED_REQUESTS.inc(view=view, scope='process')
+        return result
+
+    try:
+        result = await _across_workers(view, key, compute)
+    except BaseException as e:
+        _land(key, flight)
+        if isinstance(e, Exception):
+            flight.set_exception(e)
+        else:
+            flight.cancel()
+        raise
+    _land(key, flight)
+    flight.set_result(result)
+    return result
+
+
+def _land(key, flight):
+    # Before the result is set, so no caller arriving later can wait for a finished flight
+    with _lock:
+        if _flights.get(key) is flight:
+            del _flights[key]
+
+
+async def _across_workers(view, key, compute):
+    if not settings.SINGLE_FLIGHT_CACHE_LOCK:
+        return await compute()
+
+    lock = lock_key(key)
+    token = uuid.uuid4().hex
+    if await cache.aadd(lock, token, settings.SINGLE_FLIGHT_TIMEOUT):
+        try:
+            result = await compute()
+            await cache.aset(f'{lock}:{token}', result, settings.SINGLE_FLIGHT_TIMEOUT)
+            return result
+        finally:
+            if await cache.aget(lock) == token:
+                await cache.adelete(lock)
+
+    leader = await cache.aget(lock)
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_TIMEOUT
+    while leader and time.monotonic() < deadline:
+        await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_SECONDS)
+        result = await cache.aget(f'{lock}:{leader}', _missing)
+        if result is _missing and await cache.aget(lock) != leader:
+            # The leader stores its result before it releases the lock
+            result = await cache.aget(f'{lock}:{leader}', _missing)
+            if result is _missing:
+                break
+        if result is not _missing:
+            metrics.COALESCED_REQUESTS.inc(view=view, scope='cache')
+            return result
+    return await compute()
@@ -0,0 +1,48 @@
+"""
+SMS notifications through sms-gate.app.
+
+`requests` is imported when a message is actually sent, so the admin and the
+scheduler can import this module without paying for it at startup.
+"""
+
+import time
+
+from django.conf import settings
+
+from .metrics import SMS_LATENCY, SMS_SENT
+
+
+def send_sms_notification(phone_number, message):
+    """Send SMS using sms-gate.app"""
+    if not settings.SMS_GATEWAY_USERNAME or not settings.SMS_GATEWAY_PASSWORD:
+        SMS_SENT.inc(outcome='not_configured')
+        return False, "SMS credentials not configured"
+    
+    import requests
+    
+    headers = {'Content-Type': 'application/json'}
+    data = {'message': message, 'phoneNumbers': [phone_number]}
+    
+    start = time.perf_counter()
+    try:
+        response = requests.post(
+            settings.SMS_GATEWAY_URL,
+            headers=headers,
+            auth=(settings.SMS_GATEWAY_USERNAME, settings.SMS_GATEWAY_PASSWORD),
+            json=data,
+            timeout=30
+        )
+        
+        if response.status_code == 200:
+            SMS_SENT.inc(outcome='sent')
+            return True, "SMS sent successfully"
+        else:
+            SMS_SENT.inc(outcome='failed')
+            return False, f"SMS failed: {response.status_code}"
+            
+    except Exception as e:
+        SMS_SENT.inc(outcome='error')
+        return False, f"SMS error: {str(e)}"
+    finally:
+        # Timeouts and connection errors included
+        SMS_LATENCY.observe(time.perf_counter() - start)
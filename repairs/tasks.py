@@ -0,0 +1,172 @@
+"""
+Periodic sweeps run by repairs/scheduler.py.
+
+Each task takes (state, now, batch_size) and returns (result, watermark).
+The watermark is stored on the task's ScheduledTask row and bounds the next
+sweep's range scan, so each run only looks at work that became due since
+the previous one. The guards on the job rows (reminder_count, abandoned_at)
+keep a rescan idempotent when a batch was full and the watermark held back.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from . import fees, reporting, scheduler, uploads
+from .sms import send_sms_notification
+from .models import RepairJob, ArchivedRepairJob, DailyRollup, ScheduledTask, PhotoUpload
+
+
+def reminder_message(job, days):
+    message = f"""🚴 Alamana Jo - Pickup reminder
+
+Job ID: {job.job_id}
+Your e-bike has been ready for pickup for {days} days."""
+    if days > settings.STORAGE_FREE_DAYS:
+        fee = (days - settings.STORAGE_FREE_DAYS) * settings.STORAGE_FEE_PER_DAY
+        message += f"\nA storage fee of €{settings.STORAGE_FEE_PER_DAY}/day applies (currently €{fee})."
+    else:
+        message += f"\nAfter {settings.STORAGE_FREE_DAYS} days, €{settings.STORAGE_FEE_PER_DAY}/day storage fee applies."
+    message += f"""
+
+📍 {settings.SHOP_ADDRESS}
+📞 {settings.SHOP_PHONE}"""
+    return message
+
+
+def pickup_reminders(state, now, batch_size):
+    """SMS READY customers when their bike passes each PICKUP_REMINDER_DAYS mark"""
+    sent = failed = 0
+    backlog = False
+    thresholds = sorted(enumerate(settings.PICKUP_REMINDER_DAYS), key=lambda t: -t[1])
+    # Largest threshold first so a long-forgotten bike gets one reminder, not several
+    for index, days in thresholds:
+        jobs = RepairJob.objects.filter(
+            status='READY',
+            ready_notified_at__lt=now - timedelta(days=days),
+            reminder_count__lte=index,
+        )
+        if state.watermark:
+            jobs = jobs.filter(ready_notified_at__gte=state.watermark - timedelta(days=days))
+        batch = list(jobs.order_by('ready_notified_at')[:batch_size])
+        backlog = backlog or len(batch) == batch_size
+
+        for job in batch:
+            # Each send can take the SMS gateway's whole timeout; keep our lease meanwhile
+            if not scheduler.renew_lease(state):
+                return f"{sent} reminders sent, {failed} failed, lease lost", state.watermark
+            waited = (now - job.ready_notified_at).days
+            success, _ = send_sms_notification(job.phone_number, reminder_message(job, waited))
+            # Count failed attempts too, so an unreachable number can't block the queue
+            update = {'reminder_count': index + 1}
+            if success:
+                update['last_reminder_at'] = now
+                sent += 1
+            else:
+                failed += 1
+            RepairJob.objects.filter(pk=job.pk).update(**update)
+
+    # Hold the watermark back while there is a backlog so the rest is picked up next run
+    watermark = state.watermark if backlog else now
+    return f"{sent} reminders sent, {failed} failed", watermark
+
+
+def abandonment_flags(state, now, batch_size):
+    """Flag READY bikes that have waited ABANDONMENT_MONTHS as abandoned"""
+    jobs = RepairJob.objects.abandoned(now).filter(abandoned_at__isnull=True)
+    if state.watermark:
+        jobs = jobs.filter(ready_notified_at__gte=fees.abandoned_before(state.watermark))
+
+    flagged = 0
+    while True:
+        ids = list(jobs.order_by('ready_notified_at').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        flagged += RepairJob.objects.filter(id__in=ids).update(abandoned_at=now)
+    return f"{flagged} bikes flagged as abandoned", now
+
+
+def refresh_rollup_days(days):
+    """Recompute the DailyRollup rows for the given local dates"""
+    days = set(days)
+    if not days:
+        return 0
+
+    totals = {day: {'jobs_count': 0, 'priced_jobs': 0, 'revenue': 0} for day in days}
+    for model in (RepairJob, ArchivedRepairJob):
+        rows = (
+            model.objects.filter(created_at__date__in=days)
+            .annotate(day=TruncDate('created_at')).values('day')
+            .annotate(jobs=Count('id'), priced=Count('estimated_cost'), revenue=Sum('estimated_cost'))
+        )
+        for row in rows:
+            total = totals[row['day']]
+            total['jobs_count'] += row['jobs']
+            total['priced_jobs'] += row['priced']
+            total['revenue'] += row['revenue'] or 0
+
+    DailyRollup.objects.bulk_create(
+        [DailyRollup(day=day, **total) for day, total in totals.items() if total['jobs_count']],
+        update_conflicts=True,
+        unique_fields=['day'],
+        update_fields=['jobs_count', 'priced_jobs', 'revenue', 'refreshed_at'],
+    )
+    DailyRollup.objects.filter(day__in=[day for day, total in totals.items() if not total['jobs_count']]).delete()
+    return len(days)
+
+
+def rollup_refresh(state, now, batch_size):
+    """Refresh the daily rollups for days with jobs changed since the last run"""
+    days = set()
+    for model in (RepairJob, ArchivedRepairJob):
+        touched = model.objects.all()
+        if state.watermark:
+            touched = touched.filter(updated_at__gte=state.watermark)
+        days.update(
+            touched.annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct()
+        )
+
+    days = sorted(days)
+    for start in range(0, len(days), batch_size):
+        refresh_rollup_days(days[start:start + batch_size])
+    return f"{len(days)} days refreshed", now
+
+
+def rollup_watermark():
+    """The moment up to which DailyRollup is complete, or None if it has never run"""
+    return (
+        ScheduledTask.objects.filter(name='rollup_refresh')
+        .values_list('watermark', flat=True).first()
+    )
+
+
+def expire_uploads(state, now, batch_size):
+    """Remove unfinished photo uploads untouched for PHOTO_UPLOAD_EXPIRY_HOURS"""
+    stale = PhotoUpload.objects.filter(
+        completed_at__isnull=True,
+        updated_at__lt=now - timedelta(hours=settings.PHOTO_UPLOAD_EXPIRY_HOURS),
+    )
+    expired = 0
+    for upload in stale[:batch_size]:
+        uploads.discard_upload(upload)
+        expired += 1
+    return f"{expired} stale uploads removed", now
+
+
+def reporting_snapshot(state, now, batch_size):
+    """Refresh the SQLite reporting snapshot, if that is the reporting database"""
+    pages = reporting.refresh_snapshot()
+    if pages is None:
+        return "no SQLite reporting snapshot configured", None
+    return f"reporting snapshot refreshed ({pages} pages)", now
+
+
+TASKS = {
+    'pickup_reminders': pickup_reminders,
+    'abandonment_flags': abandonment_flags,
+    'rollup_refresh': rollup_refresh,
+    'expire_uploads': expire_uploads,
+    'reporting_snapshot': reporting_snapshot,
+}
@@ -0,0 +1,40 @@
+"""
+Django template backend that times template rendering for /metrics and
+Server-Timing.
+
+TimedDjangoTemplates is Django's DjangoTemplates with templates that add
+their render time to the RequestMetrics of the request being handled by
+PerformanceMiddleware. Only the templates views render are timed: includes
+and parents render inside them. Outside a request (management commands,
+tests calling render_to_string) rendering is unchanged.
+"""
+
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from .middleware import _current_metrics
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current_metrics.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,47 @@
+"""
+Template loaders that collapse whitespace once, when a template is loaded.
+
+The project templates are indented for reading, and that indentation used to
+be sent with every HTMX partial. Stripping it from the template source before
+compilation means the cached loader keeps the compact version and no request
+pays for it.
+"""
+
+import re
+
+from django.template.loaders import filesystem
+
+# Content of these elements is left exactly as written
+PROTECTED = re.compile(r'(<(pre|textarea|script)\b.*?</\2\s*>)', re.IGNORECASE | re.DOTALL)
+HTML_COMMENT = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+LINE_PADDING = re.compile(r'[ \t]*\n\s*')
+# A line holding nothing but a control tag would render as an empty line
+TAG_LINE = re.compile(
+    r'^(\{%\s*(?:if|elif|else|endif|for|empty|endfor|with|endwith|block|endblock|load|extends)\b[^\n]*?%\})\n',
+    re.MULTILINE,
+)
+
+
+def strip_whitespace(source):
+    """
+    Drop indentation, blank lines and HTML comments from template source.
+    Newlines are kept, so text never runs together and inline scripts keep
+    their line structure; <pre> and <textarea> are not touched.
+    """
+    parts = PROTECTED.split(source)
+    result = []
+    # split() yields text, protected element, tag name, text, ...
+    for index in range(0, len(parts), 3):
+        text = HTML_COMMENT.sub('', parts[index])
+        result.append(LINE_PADDING.sub('\n', text))
+        if index + 1 < len(parts):
+            element, tag = parts[index + 1], parts[index + 2]
+            result.append(LINE_PADDING.sub('\n', element) if tag.lower() == 'script' else element)
+    return TAG_LINE.sub(r'\1', ''.join(result)).strip() + '\n'
+
+
+class Loader(filesystem.Loader):
+    """Filesystem loader for the project's templates/ directory with whitespace collapsed"""
+
+    def get_contents(self, origin):
+        return strip_whitespace(super().get_contents(origin))
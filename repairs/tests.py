@@ -1,3 +1,1842 @@
-from django.test import TestCase
+"""
+Query-count and response-time budgets for every view in repairs/urls.py.
 
-# Create your tests here.
+ViewBudgetTests seeds a fixed dataset and replays the bench_urls scenarios,
+each GET both as a full page and as an HTMX request. Every request is made
+once to warm the caches and then RUNS times, keeping the most queries and
+the median time. The whole round is run again after the dataset has grown
+(more jobs, fuller pages, many more photos on the scenario job): a view
+whose query count grows with it has an N+1.
+
+Budgets are checked in at repairs/view_budgets.json. The measurements of
+the last run are written to VIEW_BUDGET_REPORT (view_budgets_report.json in
+the temp directory by default). After an intended change, rewrite the
+budgets from a run with UPDATE_VIEW_BUDGETS=1 and review the diff.
+
+S3StorageTests run repairs/s3.py against the in-process LocalS3Server, and
+SingleFlightTests cover repairs/single_flight.py. The other test cases check
+the behaviour of the other features, and pin down fixes to bugs found in
+review.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import random
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+import zipfile
+from types import SimpleNamespace
+from unittest import mock
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from alamana_repair import caches, database, warmup
+from repairs import (
+    api, archive, backups, blobs, board, due, fees, gallery, metrics, middleware, photo_zip, reporting, reports, s3,
+    scheduler, seed, single_flight, tasks, template_loaders, views,
+)
+from repairs import urls as repair_urls
+from repairs.concurrency import db_read
+from repairs.management.commands import bench_imports
+from repairs.management.commands.bench_urls import HTMX, SKIPPED, build_scenarios
+from repairs.middleware import RequestMetrics, install_query_dispatch, observe_queries
+from repairs.models import (
+    ArchivedRepairJob, ArchivedRepairJobPhoto, Customer, DailyRollup, PhotoBlob, PhotoUpload, RepairJob, RepairJobPhoto, ScheduledTask,
+)
+from repairs.phones import normalize_phone
+from repairs.s3_local import LocalS3Server
+from repairs.sessions import SessionMiddleware, session_read_only
+from repairs.seed import seed_jobs
+
+BUDGET_FILE = Path(__file__).with_name('view_budgets.json')
+REPORT_FILE = Path(os.environ.get('VIEW_BUDGET_REPORT', Path(tempfile.gettempdir()) / 'view_budgets_report.json'))
+UPDATE_BUDGETS = os.environ.get('UPDATE_VIEW_BUDGETS') == '1'
+
+RUNS = 3
+# Fewer open jobs than a dashboard page holds, then more
+SEED_JOBS = 60
+GROWTH_JOBS = 300
+GROWTH_PHOTOS = 40
+
+# Time budgets leave room for slower machines: three times the measured
+# median, and never less than TIME_BUDGET_FLOOR_MS
+TIME_BUDGET_FACTOR = 3
+TIME_BUDGET_FLOOR_MS = 100
+
+
+def request_modes(scenario):
+    """(key, headers) to replay: GETs as a full page and as HTMX, other methods as declared"""
+    if scenario.method != 'get':
+        mode = 'htmx' if scenario.headers.get('HX-Request') else 'page'
+        return [(f'{scenario.key} [{mode}]', scenario.headers)]
+    page = {name: value for name, value in scenario.headers.items() if name != 'HX-Request'}
+    return [(f'{scenario.key} [page]', page), (f'{scenario.key} [htmx]', {**page, **HTMX})]
+
+
+@override_settings(
+    DB_READ_THREADS=0,
+    METRICS_DIR='',
+    CACHES={'default': {'BACKEND': 'repairs.metrics.MeteredLocMemCache', 'LOCATION': 'view-budgets'}},
+)
+class ViewBudgetTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        files = cls.enterClassContext(tempfile.TemporaryDirectory(prefix='repairs-tests-'))
+        cls.enterClassContext(override_settings(
+            MEDIA_ROOT=os.path.join(files, 'media'),
+            REPORT_CACHE_DIR=os.path.join(files, 'reports'),
+        ))
+        # Every request would otherwise land in the slow-request log
+        logger = logging.getLogger('repairs.performance')
+        disabled, logger.disabled = logger.disabled, True
+        cls.addClassCleanup(setattr, logger, 'disabled', disabled)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_jobs(SEED_JOBS, seed=0, photos_per_job=0.5, days=60)
+        cls.staff = User.objects.create_user('budget-staff', password='x', is_staff=True)
+        cls.job = RepairJob.objects.filter(photos__isnull=False).order_by('pk').first()
+
+    def setUp(self):
+        cache.clear()
+
+    def measure(self, scenarios):
+        """key -> {'queries': most queries of RUNS requests, 'ms': median time}"""
+        results = {}
+        for scenario in scenarios:
+            for key, headers in request_modes(scenario):
+                client = Client()
+                if scenario.staff:
+                    client.force_login(self.staff)
+                request = getattr(client, scenario.method)
+                queries, times = [], []
+                for run in range(RUNS + 1):
+                    with observe_queries(RequestMetrics()) as captured:
+                        start = time.perf_counter()
+                        response = request(scenario.url, scenario.data, headers=headers, secure=True)
+                        if response.streaming:
+                            b''.join(response)
+                        elapsed = time.perf_counter() - start
+                    self.assertLess(response.status_code, 500, f'{key} answered {response.status_code}')
+                    # The first request warms the caches and the template loader
+                    if run:
+                        queries.append(captured.query_count)
+                        times.append(elapsed * 1000)
+                results[key] = {'queries': max(queries), 'ms': round(statistics.median(times), 2)}
+        return results
+
+    def grow_dataset(self):
+        """More jobs than a dashboard page holds, and a job with several pages of photos"""
+        seed_jobs(GROWTH_JOBS, seed=1, photos_per_job=0.5, days=60)
+        name = self.job.photos.values_list('photo', flat=True).first()
+        RepairJobPhoto.objects.bulk_create(
+            RepairJobPhoto(repair_job=self.job, photo=name, description=f'Growth photo {n}')
+            for n in range(GROWTH_PHOTOS)
+        )
+
+    def test_every_url_has_a_scenario(self):
+        covered = {scenario.key.split(':')[0] for scenario in build_scenarios(self.job)} | set(SKIPPED)
+        missing = [pattern.name for pattern in repair_urls.urlpatterns if pattern.name not in covered]
+        self.assertEqual(missing, [], 'Add a Scenario to bench_urls.build_scenarios() for these URLs')
+
+    def test_view_budgets(self):
+        scenarios = build_scenarios(self.job)
+        before = self.measure(scenarios)
+        self.grow_dataset()
+        cache.clear()
+        after = self.measure(scenarios)
+
+        budgets = json.loads(BUDGET_FILE.read_text()) if BUDGET_FILE.exists() else {}
+        report, problems = {}, []
+        for key in before:
+            queries = max(before[key]['queries'], after[key]['queries'])
+            ms = max(before[key]['ms'], after[key]['ms'])
+            budget = budgets.get(key)
+            report[key] = {'before': before[key], 'after': after[key], 'budget': budget}
+            if after[key]['queries'] > before[key]['queries']:
+                problems.append(
+                    f"{key}: {before[key]['queries']} queries grew to {after[key]['queries']} with more data"
+                )
+            if UPDATE_BUDGETS:
+                continue
+            if budget is None:
+                problems.append(f'{key}: no budget in {BUDGET_FILE.name}')
+                continue
+            if queries > budget['queries']:
+                problems.append(f"{key}: {queries} queries, budget {budget['queries']}")
+            if ms > budget['ms']:
+                problems.append(f"{key}: {ms:.1f}ms, budget {budget['ms']}ms")
+
+        REPORT_FILE.write_text(json.dumps(report, indent=2, sort_keys=True))
+        if UPDATE_BUDGETS:
+            BUDGET_FILE.write_text(json.dumps({
+                key: {
+                    'queries': max(result['before']['queries'], result['after']['queries']),
+                    'ms': max(TIME_BUDGET_FLOOR_MS, math.ceil(
+                        TIME_BUDGET_FACTOR * max(result['before']['ms'], result['after']['ms']) / 10) * 10),
+                }
+                for key, result in sorted(report.items())
+            }, indent=2) + '\n')
+        if problems:
+            self.fail('\n'.join(problems) + f'\nMeasurements written to {REPORT_FILE}')
+
+
+class DatabaseProfileTests(SimpleTestCase):
+
+    def test_tuned_sqlite_connections_apply_the_pragmas(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-')), 'tuned.db')
+        tuned = database.register_database('tuned', database.sqlite_config(path))
+        self.addCleanup(database.unregister_database, 'tuned')
+        # connect() rather than a first query, which SimpleTestCase refuses
+        tuned.connect()
+        with tuned.cursor() as cursor:
+            pragmas = {}
+            for name in ('journal_mode', 'busy_timeout', 'synchronous', 'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                pragmas[name] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {
+            'journal_mode': 'wal',
+            'busy_timeout': database.SQLITE_BUSY_TIMEOUT_MS,
+            'synchronous': 1,  # NORMAL
+            'cache_size': -database.SQLITE_CACHE_SIZE_KB,
+        })
+
+    def test_an_alias_can_be_registered_again(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-'))
+        for name in ('first.db', 'second.db'):
+            path = os.path.join(directory, name)
+            tuned = database.register_database('tuned', database.sqlite_config(path))
+            self.assertEqual(tuned.settings_dict['NAME'], path)
+            database.unregister_database('tuned')
+
+    def test_profiles_are_picked_from_the_environment(self):
+        environ = {'DATABASE_PROFILE': 'postgresql', 'POSTGRES_HOST': 'db', 'POSTGRES_POOL_MAX': '4'}
+        with mock.patch.dict(os.environ, environ):
+            default = database.get_databases(Path('/srv'))['default']
+        self.assertEqual((default['ENGINE'], default['HOST']), ('django.db.backends.postgresql', 'db'))
+        # The pool keeps the connections, not Django
+        self.assertEqual((default['CONN_MAX_AGE'], default['OPTIONS']['pool']['max_size']), (0, 4))
+
+        with mock.patch.dict(os.environ, {'DATABASE_PROFILE': 'sqlite-baseline', 'SQLITE_PATH': '/srv/shop.db'}):
+            self.assertEqual(database.get_databases(Path('/srv')), {
+                'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': '/srv/shop.db'},
+            })
+        with mock.patch.dict(os.environ, {'DATABASE_PROFILE': 'mysql'}), self.assertRaises(ValueError):
+            database.get_databases(Path('/srv'))
+
+
+class LocalS3Mixin:
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Parts of any size, so multipart uploads can be tested with little data
+        cls.server = LocalS3Server(min_part_size=0).start()
+        cls.addClassCleanup(cls.server.stop)
+
+    def setUp(self):
+        super().setUp()
+        self.server.objects.clear()
+        self.server.uploads.clear()
+
+    def storage(self, **options):
+        return s3.S3Storage(**self.server.storage_options(**options))
+
+
+class S3StorageTests(LocalS3Mixin, SimpleTestCase):
+
+    def test_signature_matches_aws_example(self):
+        # The GET Object example of the AWS Signature Version 4 documentation
+        key = s3.signing_key('wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY', '20130524', 'us-east-1')
+        headers = {
+            'host': 'examplebucket.s3.amazonaws.com',
+            'range': 'bytes=0-9',
+            'x-amz-content-sha256': 'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855',
+            'x-amz-date': '20130524T000000Z',
+        }
+        sig, signed = s3.signature(key, '20130524T000000Z', 'us-east-1', 'GET', '/test.txt', {}, headers,
+                                   headers['x-amz-content-sha256'])
+        self.assertEqual(signed, 'host;range;x-amz-content-sha256;x-amz-date')
+        self.assertEqual(sig, 'f0e8bdb87c964420e857bd35b5d6ed310bd44f0170aba48dd91039c6036bdb41')
+
+    def test_round_trip(self):
+        storage = self.storage()
+        name = storage.save('photos/ab/cd/round trip.jpg', ContentFile(b'jpeg bytes'))
+        self.assertEqual(name, 'photos/ab/cd/round trip.jpg')
+        self.assertEqual(self.server.objects[name].content_type, 'image/jpeg')
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(storage.size(name), 10)
+        with storage.open(name) as f:
+            self.assertEqual(f.read(), b'jpeg bytes')
+        # A taken name gets another, as with FileSystemStorage
+        self.assertNotEqual(storage.save(name, ContentFile(b'other')), name)
+        storage.delete(name)
+        self.assertFalse(storage.exists(name))
+        with self.assertRaises(FileNotFoundError):
+            storage.size(name)
+        with self.assertRaises(FileNotFoundError):
+            storage.open(name)
+
+    def test_multipart_upload(self):
+        storage = self.storage(multipart_threshold=1024, upload_threads=3)
+        data = os.urandom(2 * s3.MIN_PART_SIZE + 12345)
+        name = storage.save('photos/large.jpg', ContentFile(data))
+        self.assertEqual(self.server.objects[name].data, data)
+        self.assertEqual(self.server.uploads, {})
+        with storage.open(name) as f:
+            self.assertEqual(f.read(), data)
+
+    def test_multipart_upload_is_aborted_on_error(self):
+        self.server.min_part_size = 10 * s3.MIN_PART_SIZE
+        self.addCleanup(setattr, self.server, 'min_part_size', 0)
+        storage = self.storage(multipart_threshold=1024, multipart_chunk_size=s3.MIN_PART_SIZE)
+        with self.assertRaises(s3.S3Error) as raised:
+            storage.save('photos/large.jpg', ContentFile(bytes(s3.MIN_PART_SIZE + 1)))
+        self.assertEqual(raised.exception.code, 'EntityTooSmall')
+        self.assertEqual(self.server.uploads, {})
+        self.assertNotIn('photos/large.jpg', self.server.objects)
+
+    def test_presigned_url(self):
+        storage = self.storage()
+        name = storage.save('photos/signed.jpg', ContentFile(b'signed bytes'))
+        url = storage.url(name)
+        self.assertEqual(url, storage.url(name))
+        with urllib.request.urlopen(url) as response:
+            self.assertEqual(response.read(), b'signed bytes')
+
+        tampered = url.replace('signed.jpg', 'other.jpg')
+        expired = storage.client.presigned_url(name, 60, datetime(2020, 1, 1, tzinfo=dt_timezone.utc))
+        for bad in (tampered, expired):
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                urllib.request.urlopen(bad)
+            self.assertEqual(raised.exception.code, 403)
+
+    def test_wrong_secret_is_refused(self):
+        storage = s3.S3Storage(**self.server.storage_options(secret_access_key='wrong'))
+        with self.assertRaises(s3.S3Error) as raised:
+            storage.client.put_object('photos/x.jpg', b'x', 'image/jpeg')
+        self.assertEqual(raised.exception.code, 'SignatureDoesNotMatch')
+
+    def test_connections_are_reused(self):
+        storage = self.storage(max_connections=2)
+        before = self.server.connections
+        for n in range(20):
+            name = storage.save(f'photos/{n}.jpg', ContentFile(b'x' * n))
+            storage.size(name)
+            with storage.open(name) as f:
+                f.read()
+        self.assertLessEqual(self.server.connections - before, 2)
+
+
+class PhotoStorageTests(LocalS3Mixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-'))
+        self.source = FileSystemStorage(location=media)
+        self.s3_storages = {
+            'default': {'BACKEND': 'repairs.s3.S3Storage', 'OPTIONS': self.server.storage_options()},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        }
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        seed_jobs(1, seed=0)
+        self.job = RepairJob.objects.get()
+
+    def test_photo_blob_in_s3(self):
+        with override_settings(STORAGES=self.s3_storages):
+            photo = RepairJobPhoto(repair_job=self.job, photo=ContentFile(b'jpeg', name='drop-off.jpg'))
+            blobs.store_photo(photo)
+            photo.save()
+            self.assertIn(photo.photo.name, self.server.objects)
+            self.assertEqual(photo.photo.size, 4)
+            self.assertIn('X-Amz-Signature=', photo.photo.url)
+            with self.captureOnCommitCallbacks(execute=True):
+                photo.delete()
+        self.assertNotIn(photo.photo.name, self.server.objects)
+
+    def test_copy_media_to_storage(self):
+        names = [self.source.save(f'photos/{n}.jpg', ContentFile(f'photo {n}'.encode())) for n in range(5)]
+        for name in names[:3]:
+            RepairJobPhoto.objects.create(repair_job=self.job, photo=name)
+        PhotoBlob.objects.create(sha256='a' * 64, name=names[3], size=7, refcount=1)
+        RepairJobPhoto.objects.create(repair_job=self.job, photo='photos/gone.jpg')
+
+        with override_settings(STORAGES=self.s3_storages):
+            out = StringIO()
+            call_command('copy_media_to_storage', '--workers', '3', stdout=out)
+            self.assertIn('4 copied', out.getvalue())
+            self.assertIn('1 files are missing', out.getvalue())
+            self.assertEqual(sorted(self.server.objects), names[:4])
+            self.assertEqual(self.server.objects[names[1]].data, b'photo 1')
+
+            out = StringIO()
+            call_command('copy_media_to_storage', stdout=out)
+            self.assertIn('0 copied', out.getvalue())
+            self.assertIn('4 already stored', out.getvalue())
+
+
+class PhotoBlobTests(TestCase):
+
+    def setUp(self):
+        self.media = self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-'))
+        self.enterContext(override_settings(MEDIA_ROOT=self.media))
+        seed_jobs(2, seed=0)
+        self.jobs = list(RepairJob.objects.order_by('id'))
+
+    def add_photo(self, job, data):
+        return RepairJobPhoto.objects.create(repair_job=job, photo=ContentFile(data, name='drop-off.JPG'))
+
+    def stored_files(self):
+        return sorted(str(path.relative_to(self.media)) for path in Path(self.media).rglob('*') if path.is_file())
+
+    def test_the_same_bytes_are_stored_once(self):
+        first = self.add_photo(self.jobs[0], b'same bytes')
+        second = self.add_photo(self.jobs[1], b'same bytes')
+        blob = PhotoBlob.objects.get()
+        self.assertEqual((first.blob, second.blob, blob.refcount), (blob, blob, 2))
+        self.assertEqual(blob.name, blobs.blob_name(blob.sha256, 'x.jpg'))
+        self.assertEqual(self.stored_files(), [blob.name])
+
+        # Archived photo rows keep their reference
+        archive.archive_batch([self.jobs[0].pk])
+        self.assertEqual(PhotoBlob.objects.get().refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(PhotoBlob.objects.get().refcount, 1)
+        self.assertEqual(self.stored_files(), [blob.name])
+        with self.captureOnCommitCallbacks(execute=True):
+            archive.find_job(job_id=self.jobs[0].job_id).photos.get().delete()
+        self.assertFalse(PhotoBlob.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_replacing_a_file_releases_the_old_blob(self):
+        photo = self.add_photo(self.jobs[0], b'before')
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.photo = ContentFile(b'after', name='retake.jpg')
+            photo.save()
+        self.assertEqual(list(PhotoBlob.objects.values_list('refcount', flat=True)), [1])
+        self.assertEqual(self.stored_files(), [photo.blob.name])
+
+    def test_existing_photos_are_migrated_to_blobs(self):
+        storage = FileSystemStorage(location=self.media)
+        names = [storage.save(f'repair_photos/{n}.jpg', ContentFile(data)) for n, data in enumerate([b'a', b'a', b'b'])]
+        for job, name in zip([*self.jobs, self.jobs[0]], names):
+            RepairJobPhoto.objects.create(repair_job=job, photo=name)
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('migrate_photo_blobs', '--workers', '2', stdout=out)
+        self.assertIn('3 photos checked', out.getvalue())
+        self.assertIn('2 distinct files, 1 duplicates were removed', out.getvalue())
+        self.assertEqual(sorted(PhotoBlob.objects.values_list('refcount', flat=True)), [1, 2])
+        self.assertEqual(self.stored_files(), sorted(PhotoBlob.objects.values_list('name', flat=True)))
+
+
+@override_settings(
+    SINGLE_FLIGHT_CACHE_LOCK=False,
+    SINGLE_FLIGHT_POLL_SECONDS=0.005,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'single-flight'}},
+)
+class SingleFlightTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def compute(self):
+        self.calls += 1
+        call = self.calls
+        await self.release.wait()
+        return f'result {call}'
+
+    async def wait_for_flight(self, waiters):
+        """Let `waiters` callers join the flight, then let it finish"""
+        for _ in range(waiters + 1):
+            await asyncio.sleep(0)
+        self.release.set()
+
+    async def test_concurrent_callers_share_one_computation(self):
+        results = await asyncio.gather(
+            *(single_flight.run('view', self.compute, page=1) for _ in range(5)),
+            single_flight.run('view', self.compute, page=2),
+            self.wait_for_flight(6),
+        )
+        self.assertEqual(results[:6], ['result 1'] * 5 + ['result 2'])
+        self.assertEqual(self.calls, 2)
+        # A finished computation is never reused
+        self.assertEqual(await single_flight.run('view', self.compute, page=1), 'result 3')
+
+    async def test_callers_in_other_threads_wait_for_the_flight(self):
+        loop = asyncio.get_running_loop()
+        leader = asyncio.ensure_future(single_flight.run('view', self.compute))
+        await asyncio.sleep(0)
+        follower = loop.run_in_executor(None, asyncio.run, single_flight.run('view', self.compute))
+        # The follower's own event loop is polling the flight's future
+        while not single_flight._flights[single_flight.flight_key('view')]._done_callbacks:
+            await asyncio.sleep(0.001)
+        self.release.set()
+        self.assertEqual(await asyncio.gather(leader, follower), ['result 1', 'result 1'])
+        self.assertEqual(self.calls, 1)
+
+    async def test_errors_reach_every_caller(self):
+        async def fail():
+            self.calls += 1
+            await self.release.wait()
+            raise ValueError('no database')
+
+        results = await asyncio.gather(
+            *(single_flight.run('view', fail) for _ in range(3)), self.wait_for_flight(3), return_exceptions=True,
+        )
+        self.assertEqual([type(result) for result in results[:3]], [ValueError] * 3)
+        self.assertEqual(self.calls, 1)
+
+    async def test_cancelled_leader_hands_over(self):
+        leader = asyncio.ensure_future(single_flight.run('view', self.compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(single_flight.run('view', self.compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await self.wait_for_flight(2)
+        self.assertEqual(await follower, 'result 2')
+        self.assertTrue(leader.cancelled())
+
+    @override_settings(SINGLE_FLIGHT_CACHE_LOCK=True)
+    async def test_waits_for_a_leader_in_another_worker(self):
+        lock_key = single_flight.lock_key(single_flight.flight_key('view', page=1))
+        await cache.aset(lock_key, 'other-worker')
+
+        async def other_worker():
+            await asyncio.sleep(0.02)
+            await cache.aset(f'{lock_key}:other-worker', 'their result')
+            await cache.adelete(lock_key)
+
+        result, _ = await asyncio.gather(single_flight.run('view', self.compute, page=1), other_worker())
+        self.assertEqual(result, 'their result')
+        self.assertEqual(self.calls, 0)
+
+        # A leader that goes away without a result leaves the computation to us
+        await cache.aset(lock_key, 'crashed-worker')
+        self.release.set()
+        result, _ = await asyncio.gather(single_flight.run('view', self.compute, page=1), cache.adelete(lock_key))
+        self.assertEqual(result, 'result 1')
+        self.assertIsNone(await cache.aget(lock_key))
+
+
+class ReportingRouterTests(SimpleTestCase):
+
+    def job(self, db):
+        job = RepairJob()
+        job._state.db = db
+        return job
+
+    def test_writes_follow_the_instance_outside_reporting_views(self):
+        router = reporting.ReportingRouter()
+        self.assertEqual(router.db_for_write(RepairJob, instance=self.job('bench')), 'bench')
+        self.assertIsNone(router.db_for_write(RepairJob))
+        self.assertTrue(router.allow_relation(self.job('bench'), self.job('bench')))
+        self.assertIsNone(router.allow_relation(self.job('bench'), self.job('default')))
+
+    def test_reporting_views_write_to_the_primary(self):
+        router = reporting.ReportingRouter()
+        token = reporting._reporting_alias.set(reporting.REPORTING_ALIAS)
+        self.addCleanup(reporting._reporting_alias.reset, token)
+        self.assertEqual(router.db_for_write(RepairJob, instance=self.job(reporting.REPORTING_ALIAS)), 'default')
+        self.assertTrue(router.allow_relation(self.job(reporting.REPORTING_ALIAS), self.job('default')))
+
+
+@override_settings(REPORTING_MAX_LAG_SECONDS=60, REPORTING_LAG_CHECK_SECONDS=30)
+class ReportingReadsTests(TestCase):
+
+    def setUp(self):
+        # A reporting database holding one job, a minute behind the primary's three
+        seed_jobs(3, seed=0)
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-')), 'reporting.db')
+        replica = database.register_database(reporting.REPORTING_ALIAS, database.sqlite_config(path))
+        self.addCleanup(database.unregister_database, reporting.REPORTING_ALIAS)
+        replica.connect()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT sql FROM sqlite_master WHERE name = %s', [RepairJob._meta.db_table])
+            table = cursor.fetchone()[0]
+        with replica.cursor() as cursor:
+            # Only the jobs table is copied, not the tables it refers to
+            cursor.execute('PRAGMA foreign_keys = OFF')
+            cursor.execute(table)
+        job = RepairJob.objects.first()
+        RepairJob.objects.using(reporting.REPORTING_ALIAS).bulk_create([job])
+        self.newest = timezone.now()
+        RepairJob.objects.using(reporting.REPORTING_ALIAS).update(updated_at=self.newest - timedelta(seconds=50))
+        RepairJob.objects.update(updated_at=self.newest)
+
+        self.enterContext(mock.patch.object(reporting, 'reporting_configured', return_value=True))
+        self.enterContext(mock.patch.dict(reporting._lag_state, checked_at=None, lag=None))
+        self.factory = RequestFactory()
+
+    @staticmethod
+    @reporting.reporting_reads
+    def count_jobs(request):
+        return RepairJob.objects.count()
+
+    def test_fresh_replicas_serve_reporting_reads(self):
+        self.assertEqual(reporting.replica_lag(), 50)
+        self.assertEqual(self.count_jobs(self.factory.get('/')), 1)
+        # Reads outside reporting views stay on the primary
+        self.assertEqual(RepairJob.objects.count(), 3)
+
+    def test_lagging_replicas_and_recent_writers_read_the_primary(self):
+        self.assertEqual(self.count_jobs(self.factory.get('/')), 1)
+        request = self.factory.get('/')
+        request.COOKIES[reporting.STICKY_COOKIE] = '1'
+        self.assertEqual(self.count_jobs(request), 3)
+
+        RepairJob.objects.filter(pk=RepairJob.objects.last().pk).update(updated_at=self.newest + timedelta(minutes=5))
+        # The lag is only checked every REPORTING_LAG_CHECK_SECONDS
+        self.assertEqual(self.count_jobs(self.factory.get('/')), 1)
+        reporting._lag_state['checked_at'] = None
+        self.assertEqual(self.count_jobs(self.factory.get('/')), 3)
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        self.client.force_login(User.objects.create_superuser('sticky-admin', password='x'))
+        self.assertNotIn(reporting.STICKY_COOKIE, self.client.get('/dashboard/').cookies)
+        job = RepairJob.objects.first()
+        response = self.client.post(f'/job/{job.job_id}/', {'status': 'READY', 'estimated_repair_time': 'UNKNOWN'})
+        self.assertEqual(response.cookies[reporting.STICKY_COOKIE]['max-age'], settings.REPORTING_STICKY_SECONDS)
+
+
+@override_settings(DB_READ_THREADS=0)
+class ReportingFlightTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('flight-admin', password='x')
+
+    def test_flights_are_not_shared_across_reporting_databases(self):
+        self.client.force_login(self.admin)
+        keys = []
+        run = single_flight.run
+
+        async def record(view, compute, **params):
+            keys.append(single_flight.flight_key(view, **params))
+            return await run(view, compute, **params)
+
+        # 'default' stands in for a replica: both read the same rows here
+        with mock.patch.object(single_flight, 'run', record):
+            for alias in (None, 'default'):
+                with mock.patch.object(reporting, 'reporting_database', return_value=alias):
+                    for url in ('/dashboard/stats/', '/total-summary/filtered/'):
+                        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(len(set(keys)), 4)
+
+
+@override_settings(API_TOKENS=['test-token'], DB_READ_THREADS=0)
+class ApiCursorTests(TestCase):
+
+    def get(self, **params):
+        return self.client.get('/api/jobs/', params, headers={'Authorization': 'Bearer test-token'}, secure=True)
+
+    def pages(self, **params):
+        """Every row of a listing, following next_cursor"""
+        rows, cursor = [], None
+        while True:
+            body = self.get(**params, **({'cursor': cursor} if cursor else {})).json()
+            rows += body['results']
+            cursor = body['next_cursor']
+            if not cursor:
+                return rows, body['sync_token']
+
+    def test_cursor_pages_cover_every_job_once(self):
+        seed_jobs(7, seed=0)
+        rows, _ = self.pages(limit=3, fields='job_id,status')
+        self.assertEqual([row['job_id'] for row in rows], list(RepairJob.objects.order_by('-id').values_list('job_id', flat=True)))
+        self.assertEqual(set(rows[0]), {'job_id', 'status'})
+        self.assertEqual(self.client.get('/api/jobs/', secure=True).status_code, 401)
+
+    def test_delta_sync_round_trip(self):
+        seed_jobs(6, seed=0)
+        start = timezone.now() - timedelta(hours=1)
+        jobs = list(RepairJob.objects.order_by('id'))
+        # Pairs of jobs share an updated_at; ties are broken by id across page boundaries
+        for number, job in enumerate(jobs):
+            RepairJob.objects.filter(pk=job.pk).update(updated_at=start + timedelta(seconds=number // 2))
+        rows, token = self.pages(since=start.isoformat(), limit=3)
+        self.assertEqual([row['job_id'] for row in rows], [job.job_id for job in jobs])
+
+        jobs[0].status = 'READY'
+        jobs[0].save()
+        rows, _ = self.pages(since=token, limit=3)
+        # The token's own moment is sent again, in case more changes landed in it
+        self.assertEqual([row['job_id'] for row in rows], [jobs[4].job_id, jobs[5].job_id, jobs[0].job_id])
+
+    def test_unchanged_lists_answer_304(self):
+        seed_jobs(3, seed=0)
+        params = {'status': 'received,ready', 'fields': 'job_id,updated_at'}
+        etag = self.get(**params)['ETag']
+        headers = {'Authorization': 'Bearer test-token', 'If-None-Match': etag}
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/jobs/', params, headers=headers, secure=True)
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+
+        RepairJob.objects.filter(pk=RepairJob.objects.first().pk).update(status='READY', updated_at=timezone.now())
+        response = self.client.get('/api/jobs/', params, headers=headers, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_malformed_cursor_keys_are_rejected(self):
+        for params in (
+            {'cursor': api.encode_cursor(['abc'])},
+            {'cursor': api.encode_cursor([None])},
+            {'cursor': api.encode_cursor([{'id': 1}])},
+            {'cursor': api.encode_cursor([5, 1]), 'since': '2024-01-01T00:00:00'},
+            {'cursor': api.encode_cursor(['2024-13-45T00:00:00', 1]), 'since': '2024-01-01T00:00:00'},
+            {'cursor': api.encode_cursor(['2024-01-01T00:00:00', 'x']), 'since': '2024-01-01T00:00:00'},
+        ):
+            with self.subTest(**params):
+                self.assertEqual(self.get(**params).status_code, 400)
+        self.assertEqual(self.get(cursor=api.encode_cursor([10])).status_code, 200)
+
+
+@override_settings(DB_READ_THREADS=0)
+class BulkUpdateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_jobs(3, seed=0, status_mix={'READY': 1})
+        cls.admin = User.objects.create_superuser('bulk-admin', password='x')
+
+    def test_mark_completed_touches_updated_at(self):
+        job = RepairJob.objects.first()
+        before = job.updated_at
+        self.client.force_login(self.admin)
+        response = self.client.post('/alamana-admin/repairs/repairjob/', {
+            'action': 'mark_completed', '_selected_action': [job.pk],
+        }, secure=True)
+        self.assertEqual(response.status_code, 302)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'COMPLETED')
+        self.assertGreater(job.updated_at, before)
+
+
+@override_settings(SCHEDULER_LEASE_SECONDS=600, ABANDONMENT_MONTHS=3)
+class SchedulerTests(TestCase):
+
+    def test_cron_expressions(self):
+        minute, hour, day, month, weekday = scheduler.parse_cron('*/15 9-18 1,15 * 0')
+        self.assertEqual(minute, {0, 15, 30, 45})
+        self.assertEqual(hour, set(range(9, 19)))
+        self.assertEqual(day, {1, 15})
+        self.assertEqual(month, set(range(1, 13)))
+        for expression in ('* * * *', '60 * * * *', '* 5-2 * * *'):
+            with self.subTest(expression), self.assertRaises(ValueError):
+                scheduler.parse_cron(expression)
+
+        # 2025-06-15 is a Sunday, which cron counts as 0
+        sunday = timezone.make_aware(datetime(2025, 6, 15, 9, 30))
+        schedule = scheduler.parse_cron('*/15 9-18 1,15 * 0')
+        self.assertTrue(scheduler.cron_matches(schedule, sunday))
+        self.assertFalse(scheduler.cron_matches(schedule, sunday + timedelta(minutes=1)))
+        self.assertFalse(scheduler.cron_matches(schedule, sunday + timedelta(days=7)))
+
+    def test_a_slot_runs_once_under_the_lease(self):
+        now = timezone.now()
+        calls = []
+
+        def task(state, now, batch_size):
+            calls.append(state.lease_owner)
+            return 'done', now
+
+        self.assertEqual(scheduler.run_task('sweep', task, 'node-a', now), 'done')
+        # Another node, later in the same minute
+        self.assertIsNone(scheduler.run_task('sweep', task, 'node-b', now + timedelta(seconds=1)))
+        self.assertEqual(calls, ['node-a'])
+        state = ScheduledTask.objects.get(name='sweep')
+        self.assertEqual((state.last_result, state.watermark, state.lease_owner), ('done', now, ''))
+
+        # A live lease keeps other nodes out; an expired one does not
+        later = now + timedelta(minutes=5)
+        self.assertTrue(scheduler.acquire_lease('sweep', 'node-c', later))
+        self.assertIsNone(scheduler.run_task('sweep', task, 'node-b', later))
+        self.assertEqual(scheduler.run_task('sweep', task, 'node-b', later + timedelta(seconds=601)), 'done')
+        self.assertEqual(calls, ['node-a', 'node-b'])
+
+    def test_a_failing_task_keeps_its_watermark(self):
+        now = timezone.now()
+        ScheduledTask.objects.create(name='sweep', watermark=now - timedelta(hours=1))
+
+        def task(state, now, batch_size):
+            raise RuntimeError('gateway down')
+
+        with self.assertLogs('repairs.scheduler', 'ERROR'):
+            self.assertEqual(scheduler.run_task('sweep', task, 'node-a', now), 'error: gateway down')
+        self.assertEqual(ScheduledTask.objects.get(name='sweep').watermark, now - timedelta(hours=1))
+
+    def test_abandoned_bikes_are_flagged_once(self):
+        seed_jobs(3, seed=0, status_mix={'READY': 1})
+        now = timezone.now()
+        RepairJob.objects.update(ready_notified_at=now - timedelta(days=10))
+        waiting = RepairJob.objects.first()
+        RepairJob.objects.filter(pk=waiting.pk).update(ready_notified_at=now - timedelta(days=100))
+
+        self.assertEqual(
+            scheduler.run_task('abandonment_flags', tasks.abandonment_flags, 'node-a', now), '1 bikes flagged as abandoned',
+        )
+        self.assertEqual(list(RepairJob.objects.filter(abandoned_at=now)), [waiting])
+        later = now + timedelta(hours=1)
+        self.assertEqual(
+            scheduler.run_task('abandonment_flags', tasks.abandonment_flags, 'node-a', later), '0 bikes flagged as abandoned',
+        )
+
+
+@override_settings(PICKUP_REMINDER_DAYS=[7, 14], SCHEDULER_LEASE_SECONDS=600)
+class PickupReminderTests(TestCase):
+
+    def lease(self, now):
+        """The task's state as run_task() hands it over, holding the lease"""
+        self.assertTrue(scheduler.acquire_lease('pickup_reminders', 'node-a', now))
+        return ScheduledTask.objects.get(name='pickup_reminders')
+
+    def test_lease_is_renewed_between_sends(self):
+        seed_jobs(3, seed=0, status_mix={'READY': 1}, days=1)
+        now = timezone.now() + timedelta(days=8)
+        RepairJob.objects.update(ready_notified_at=timezone.now(), reminder_count=0)
+        state = self.lease(now - timedelta(hours=1))
+
+        def send(phone, message):
+            # Another node finds the lease held for a full term from the last send
+            expires = ScheduledTask.objects.get(name='pickup_reminders').lease_expires_at
+            self.assertGreater(expires, timezone.now() + timedelta(seconds=590))
+            return True, None
+
+        with mock.patch.object(tasks, 'send_sms_notification', side_effect=send):
+            summary, _ = tasks.pickup_reminders(state, now, batch_size=10)
+        self.assertEqual(summary, '3 reminders sent, 0 failed')
+
+    def test_stops_when_the_lease_is_lost(self):
+        seed_jobs(3, seed=0, status_mix={'READY': 1}, days=1)
+        now = timezone.now() + timedelta(days=8)
+        RepairJob.objects.update(ready_notified_at=timezone.now(), reminder_count=0)
+        state = self.lease(now)
+
+        def send(phone, message):
+            ScheduledTask.objects.update(lease_owner='node-b')
+            return True, None
+
+        with mock.patch.object(tasks, 'send_sms_notification', side_effect=send) as sent:
+            summary, watermark = tasks.pickup_reminders(state, now, batch_size=10)
+        self.assertEqual(sent.call_count, 1)
+        self.assertIn('lease lost', summary)
+        self.assertIsNone(watermark)
+
+    def test_readied_again_gets_reminders_again(self):
+        seed_jobs(1, seed=0, status_mix={'READY': 1})
+        job = RepairJob.objects.get()
+        now = job.ready_notified_at + timedelta(days=30)
+        job.reminder_count = 2
+        job.save()
+
+        job.mark_ready_notified(now - timedelta(days=8))
+        job.save()
+        with mock.patch.object(tasks, 'send_sms_notification', return_value=(True, None)) as send:
+            summary, _ = tasks.pickup_reminders(self.lease(now), now, batch_size=10)
+        self.assertEqual(summary, '1 reminders sent, 0 failed')
+        self.assertEqual(send.call_count, 1)
+        job.refresh_from_db()
+        self.assertEqual((job.reminder_count, job.last_reminder_at), (1, now))
+
+
+@override_settings(DB_READ_THREADS=2)
+class AsyncViewTests(TransactionTestCase):
+
+    async def test_reads_run_together_on_read_threads(self):
+        # Each read waits for the other: they only finish if they run at the same time
+        barrier = threading.Barrier(2, timeout=5)
+
+        def read():
+            barrier.wait()
+            return threading.current_thread().name
+
+        names = await asyncio.gather(db_read(read), db_read(read))
+        self.assertTrue(all(name.startswith('db-read') for name in names))
+        self.assertNotEqual(*names)
+
+    def test_queries_on_read_threads_count_for_the_request(self):
+        seed_jobs(5, seed=0)
+        admin = User.objects.create_superuser('async-admin', password='x')
+        self.assertTrue(iscoroutinefunction(views.total_summary_filtered))
+
+        async def get():
+            await self.async_client.aforce_login(admin)
+            return await self.async_client.get('/total-summary/filtered/', {'filter': 'month'})
+
+        response = async_to_sync(get)()
+        self.assertEqual(response.status_code, 200)
+        queries = int(re.search(r'desc="(\d+) queries', response['Server-Timing'])[1])
+        # Totals, high-value jobs, the daily breakdown and the median all ran on read threads
+        self.assertGreaterEqual(queries, 5)
+
+    def test_tracking_page_is_served_async(self):
+        seed_jobs(1, seed=0)
+        job = RepairJob.objects.get()
+        response = async_to_sync(self.async_client.get)('/track/', {'job_id': job.job_id, 'phone': job.phone_number})
+        self.assertContains(response, job.bike_description)
+
+
+@override_settings(
+    DB_READ_THREADS=0,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'}},
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+)
+class CachedSessionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('poll-admin', password='x')
+        self.client.force_login(self.admin)
+
+    def test_polls_read_only_their_own_data(self):
+        self.client.get('/dashboard/stats/')
+        # Session and user both come from the cache; the one query is the stat counts
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/dashboard/stats/').status_code, 200)
+
+    def test_user_changes_apply_on_the_next_request(self):
+        self.client.get('/dashboard/stats/')
+        self.admin.is_staff = False
+        self.admin.save()
+        self.assertEqual(self.client.get('/dashboard/stats/').status_code, 302)
+
+    def test_read_only_views_never_save_the_session(self):
+        @session_read_only
+        def poll(request):
+            request.session['last_poll'] = 'now'
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = self.client.session.session_key
+        middleware = SessionMiddleware(poll)
+        middleware.process_request(request)
+        middleware.process_view(request, poll, (), {})
+        response = middleware.process_response(request, poll(request))
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertNotIn('last_poll', self.client.session)
+        self.assertEqual(response['Vary'], 'Cookie')
+
+    def test_session_store_follows_the_environment(self):
+        with mock.patch.dict(os.environ, {'SESSION_STORE': 'cache'}):
+            self.assertEqual(caches.get_session_engine(), 'django.contrib.sessions.backends.cache')
+        with mock.patch.dict(os.environ, {'SESSION_STORE': 'redis'}):
+            with self.assertRaisesMessage(ValueError, "Unknown SESSION_STORE 'redis'"):
+                caches.get_session_engine()
+
+
+class QueryDispatchTests(SimpleTestCase):
+
+    def test_lazy_connect_inside_execute_wrapper_keeps_both(self):
+        connection = SimpleNamespace(execute_wrappers=[])
+
+        def wrapper(execute, sql, params, many, context):
+            return execute(sql, params, many, context)
+
+        with BaseDatabaseWrapper.execute_wrapper(connection, wrapper):
+            # connection_created fires while the caller's wrapper is installed
+            install_query_dispatch(sender=None, connection=connection)
+            self.assertEqual(len(connection.execute_wrappers), 2)
+        self.assertEqual([w.__name__ for w in connection.execute_wrappers], ['_dispatch_query'])
+
+
+@override_settings(DB_READ_THREADS=0)
+class ArchiveTests(TestCase):
+
+    def test_old_completed_and_abandoned_jobs_move_with_their_photos(self):
+        media_root = self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-'))
+        seed_jobs(4, seed=0, status_mix={'COMPLETED': 1}, photos_per_job=2, media_root=media_root)
+        seed_jobs(2, seed=1, status_mix={'READY': 1})
+        now = timezone.now()
+        RepairJob.objects.filter(status='COMPLETED').update(updated_at=now - timedelta(days=91))
+        recent = RepairJob.objects.filter(status='COMPLETED').latest('id')
+        RepairJob.objects.filter(pk=recent.pk).update(updated_at=now)
+        abandoned = RepairJob.objects.filter(status='READY').earliest('id')
+        RepairJob.objects.filter(pk=abandoned.pk).update(ready_notified_at=now - timedelta(days=100))
+        old = RepairJob.objects.filter(status='COMPLETED').earliest('id')
+        photos = sorted(old.photos.values_list('photo', flat=True))
+
+        self.assertEqual(archive.archive_jobs(batch_size=2), (4, 6))
+        self.assertEqual(set(RepairJob.objects.values_list('status', flat=True)), {'COMPLETED', 'READY'})
+        self.assertEqual(RepairJob.objects.count(), 2)
+        self.assertEqual(archive.archive_jobs(), (0, 0))
+
+        # Lookups still find archived jobs, with the same photo files
+        job = archive.find_job(job_id=old.job_id)
+        self.assertTrue(job.is_archived)
+        self.assertEqual(sorted(job.photos.values_list('photo', flat=True)), photos)
+        self.assertEqual(async_to_sync(archive.afind_job)(job_id=abandoned.job_id).pk, abandoned.pk)
+        self.assertEqual(ArchivedRepairJobPhoto.objects.count(), 6)
+
+
+@override_settings(STORAGE_FREE_DAYS=14, STORAGE_FEE_PER_DAY=2, ABANDONMENT_MONTHS=3)
+class StorageFeeTests(TestCase):
+
+    def test_fees_and_flags_are_computed_in_sql(self):
+        now = datetime(2025, 6, 30, 12, tzinfo=dt_timezone.utc)
+        seed_jobs(5, seed=0, status_mix={'READY': 1})
+        jobs = list(RepairJob.objects.order_by('id'))
+        waited = {jobs[0]: 5, jobs[1]: 15, jobs[2]: 20, jobs[3]: 92}
+        for job, days in waited.items():
+            RepairJob.objects.filter(pk=job.pk).update(ready_notified_at=now - timedelta(days=days, hours=1))
+        RepairJob.objects.filter(pk=jobs[4].pk).update(status='COMPLETED', ready_notified_at=now - timedelta(days=60))
+
+        storage = {
+            job.pk: (job.storage_days, job.storage_fee, job.is_overdue, job.is_abandoned)
+            for job in RepairJob.objects.with_storage(now)
+        }
+        self.assertEqual([storage[job.pk] for job in jobs], [
+            (5, 0, False, False),
+            (15, 2, True, False),
+            (20, 12, True, False),
+            (92, 156, True, True),
+            (0, 0, False, False),
+        ])
+        self.assertEqual(set(RepairJob.objects.overdue(now)), {jobs[1], jobs[2], jobs[3]})
+        self.assertEqual(list(RepairJob.objects.abandoned(now)), [jobs[3]])
+
+    def test_months_are_calendar_months(self):
+        self.assertEqual(fees.months_before(datetime(2024, 5, 31), 3), datetime(2024, 2, 29))
+        self.assertEqual(fees.months_before(datetime(2025, 1, 15), 3), datetime(2024, 10, 15))
+
+
+class SeedTests(TestCase):
+
+    def test_a_seed_always_generates_the_same_jobs(self):
+        def generate(random_seed):
+            jobs = seed.generate_jobs(50, random.Random(random_seed), 1001)
+            return [(job.job_id, job.phone_number, job.status, job.estimated_cost) for job in jobs]
+
+        self.assertEqual(generate(7), generate(7))
+        self.assertNotEqual(generate(7), generate(8))
+
+    def test_status_mix_and_photos(self):
+        media_root = self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-'))
+        mix = seed.parse_status_mix('ready=1, completed=3')
+        self.assertEqual(mix, {'READY': 1.0, 'COMPLETED': 3.0})
+        with self.assertRaises(ValueError):
+            seed.parse_status_mix('LOST=1')
+
+        self.assertEqual(seed_jobs(40, seed=0, status_mix=mix, photos_per_job=1.5, media_root=media_root)[0], 40)
+        self.assertEqual(set(RepairJob.objects.values_list('status', flat=True)), {'READY', 'COMPLETED'})
+        photos = RepairJobPhoto.objects.all()
+        self.assertEqual(len(photos), sum(1 for _ in Path(media_root).rglob('*.jpg')))
+        self.assertTrue(40 <= len(photos) <= 80)
+        # Repeat customers share one Customer row
+        self.assertLess(Customer.objects.count(), 40)
+        self.assertFalse(RepairJob.objects.filter(customer__isnull=True).exists())
+
+    def test_job_numbers_continue_after_archived_jobs(self):
+        seed_jobs(3, seed=0)
+        newest = RepairJob.objects.order_by('-id').first()
+        archive.archive_batch([newest.pk])
+        seed_jobs(2, seed=1)
+        self.assertNotIn(newest.job_id, RepairJob.objects.values_list('job_id', flat=True))
+        self.assertEqual(RepairJob.objects.count(), 4)
+
+
+class ChunkedUploadTests(TestCase):
+
+    def setUp(self):
+        temp = self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-'))
+        self.enterContext(override_settings(
+            PHOTO_UPLOAD_TEMP_DIR=os.path.join(temp, 'uploads'), PHOTO_UPLOAD_CHUNK_SIZE=4, MEDIA_ROOT=temp,
+        ))
+        storage = FileSystemStorage(location=temp)
+        self.enterContext(mock.patch.object(blobs, 'default_storage', storage))
+        seed_jobs(1, seed=0)
+        self.job = RepairJob.objects.get()
+        self.client.force_login(User.objects.create_superuser('upload-admin', password='x'))
+
+    def start(self, data):
+        response = self.client.post(
+            f'/job/{self.job.job_id}/uploads/',
+            json.dumps({'filename': 'bike.jpg', 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()['upload_url']
+
+    def put(self, url, offset, chunk):
+        return self.client.put(url, chunk, content_type='application/octet-stream', headers={'Upload-Offset': str(offset)})
+
+    def test_chunks_resume_and_attach_the_photo(self):
+        data = b'0123456789'
+        url = self.start(data)
+        self.assertEqual(self.put(url, 0, data[:4]).json()['offset'], 4)
+        # A retried chunk is refused with the offset to resume from
+        response = self.put(url, 0, data[:4])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 4))
+        self.assertEqual(self.put(url, 4, data[4:8]).json()['offset'], 8)
+        # The verified file goes to its blob as is, without hashing and spooling it again
+        with mock.patch.object(blobs, 'store_blob', side_effect=AssertionError('spooled again')):
+            response = self.put(url, 8, data[8:])
+        self.assertTrue(response.json()['complete'])
+        photo = RepairJobPhoto.objects.get(repair_job=self.job)
+        self.assertEqual(photo.blob.sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(photo.blob.refcount, 1)
+        self.assertEqual(photo.photo.read(), data)
+        self.assertFalse(os.listdir(settings.PHOTO_UPLOAD_TEMP_DIR))
+
+    def test_a_corrupted_upload_is_discarded(self):
+        url = self.start(b'01234567')
+        self.put(url, 0, b'0123')
+        response = self.put(url, 4, b'XXXX')
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(PhotoUpload.objects.exists())
+        self.assertFalse(RepairJobPhoto.objects.exists())
+        self.assertFalse(os.listdir(settings.PHOTO_UPLOAD_TEMP_DIR))
+
+    def test_starting_again_resumes_and_others_are_kept_out(self):
+        url = self.start(b'01234567')
+        self.put(url, 0, b'0123')
+        self.assertEqual(self.start(b'01234567'), url)
+        self.assertEqual(self.client.get(url).json()['offset'], 4)
+
+        self.client.force_login(User.objects.create_user('other-mechanic', password='x'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.put(url, 4, b'4567').status_code, 403)
+
+    def test_stale_uploads_expire(self):
+        url = self.start(b'01234567')
+        self.put(url, 0, b'0123')
+        upload = PhotoUpload.objects.get()
+        now = timezone.now() + timedelta(hours=settings.PHOTO_UPLOAD_EXPIRY_HOURS + 1)
+        self.assertEqual(tasks.expire_uploads(None, now, batch_size=10)[0], '1 stale uploads removed')
+        self.assertFalse(PhotoUpload.objects.exists())
+        self.assertFalse(os.path.exists(upload.temp_path))
+
+    def test_a_chunk_being_written_is_not_written_again(self):
+        data = b'01234567'
+        url = self.start(data)
+        upload = PhotoUpload.objects.get()
+        PhotoUpload.objects.update(writing_since=timezone.now())
+        response = self.put(url, 0, b'XXXX')
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 0))
+        with open(upload.temp_path, 'rb') as f:
+            self.assertEqual(f.read(), b'')
+
+        # Until the PUT holding the claim is taken to have died
+        PhotoUpload.objects.update(writing_since=timezone.now() - timedelta(seconds=settings.PHOTO_UPLOAD_WRITE_TIMEOUT + 1))
+        self.assertEqual(self.put(url, 0, data[:4]).json()['offset'], 4)
+        self.assertIsNone(PhotoUpload.objects.get().writing_since)
+
+
+@override_settings(PHONE_DEFAULT_COUNTRY_CODE='32')
+class CustomerTests(TestCase):
+
+    def job(self, name, phone):
+        return RepairJob.objects.create(customer_name=name, phone_number=phone, bike_description='Cowboy 4')
+
+    def test_phones_are_normalised(self):
+        for raw, phone in [
+            ('0499 12 34 56', '+32499123456'),
+            ('499/12.34.56', '+32499123456'),
+            ('0032 499 12 34 56', '+32499123456'),
+            ('+31 6 12345678', '+31612345678'),
+            ('n/a', ''),
+        ]:
+            with self.subTest(raw):
+                self.assertEqual(normalize_phone(raw), phone)
+
+    def test_jobs_share_a_customer_by_phone(self):
+        first = self.job('Emma Maes', '0499 12 34 56')
+        second = self.job('Emma Maes-Peeters', '+32 499 123 456')
+        self.assertEqual(first.customer_id, second.customer_id)
+        # The latest name wins
+        self.assertEqual(Customer.objects.get().name, 'Emma Maes-Peeters')
+
+        second.phone_number = '0470 00 00 00'
+        second.save(update_fields=['phone_number'])
+        second.refresh_from_db()
+        self.assertEqual(second.customer.phone, '+32470000000')
+        self.assertEqual([item['job_id'] for item in archive.customer_history(first)], [])
+        self.assertEqual(archive.customer_history(self.job('Emma', '0499123456'))[0]['job_id'], first.job_id)
+
+    def test_lookup_by_phone_or_name_prefix(self):
+        self.job('Emma Maes', '0499 12 34 56')
+        self.job('Lucas Claes', '0470 11 22 33')
+        self.client.force_login(User.objects.create_user('desk', password='x'))
+        for params, names in [
+            ({'phone_number': '0499 12'}, ['Emma Maes']),
+            ({'phone_number': '+3247'}, ['Lucas Claes']),
+            ({'customer_name': 'luc'}, ['Lucas Claes']),
+            ({'customer_name': 'e'}, []),
+        ]:
+            with self.subTest(**params):
+                response = self.client.get('/customers/lookup/', params)
+                self.assertEqual([customer.name for customer in response.context['customers']], names)
+
+
+@override_settings(DB_READ_THREADS=0)
+class TrackRepairTests(TestCase):
+
+    def test_jobs_without_a_customer_match_the_phone_as_typed(self):
+        seed_jobs(2, seed=0)
+        unlinked, linked = RepairJob.objects.order_by('pk')
+        # Too long for Customer.phone once normalised, so never linked
+        phone = '0' + '9' * 19
+        RepairJob.objects.filter(pk=unlinked.pk).update(customer=None, phone_number=phone)
+
+        response = self.client.get('/track/', {'job_id': unlinked.job_id.lower(), 'phone': phone})
+        self.assertEqual(response.context['repair_job'].pk, unlinked.pk)
+        response = self.client.post('/track/', {'job_id': unlinked.job_id, 'phone_number': phone})
+        self.assertEqual(response.context['repair_job'].pk, unlinked.pk)
+        # A linked job still needs its customer's phone
+        response = self.client.post('/track/', {'job_id': linked.job_id, 'phone_number': phone})
+        self.assertIsNone(response.context['repair_job'])
+        response = self.client.post('/track/', {'job_id': linked.job_id, 'phone_number': linked.phone_number})
+        self.assertEqual(response.context['repair_job'].pk, linked.pk)
+
+
+class DataMigrationTests(TransactionTestCase):
+
+    def setUp(self):
+        # Leave the schema as the other tests expect it
+        executor = MigrationExecutor(connection)
+        self.addCleanup(self.migrate, executor.loader.graph.leaf_nodes('repairs')[0][1])
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([('repairs', target)])
+        return executor.loader.project_state([('repairs', target)]).apps
+
+    def test_links_jobs_and_skips_phones_too_long_for_customers(self):
+        apps = self.migrate('0008_customer')
+        Job = apps.get_model('repairs', 'RepairJob')
+        for number, phone in enumerate(['0499 12 34 56', '+32 499 12-34-56', '0' + '9' * 19, 'none']):
+            Job.objects.create(job_id=f'JOB-{number}', customer_name=f'Name {number}', phone_number=phone)
+
+        apps = self.migrate('0009_link_customers')
+        linked = dict(apps.get_model('repairs', 'RepairJob').objects.values_list('job_id', 'customer__phone'))
+        self.assertEqual(linked, {'JOB-0': '+32499123456', 'JOB-1': '+32499123456', 'JOB-2': None, 'JOB-3': None})
+        self.assertEqual(apps.get_model('repairs', 'Customer').objects.get().name, 'Name 1')
+
+    def test_due_dates_do_not_follow_later_app_code(self):
+        apps = self.migrate('0011_photoblob')
+        Job = apps.get_model('repairs', 'RepairJob')
+        for status, estimate in [('RECEIVED', '1_WEEK'), ('READY', '1_WEEK'), ('IN_PROGRESS', 'UNKNOWN')]:
+            Job.objects.create(
+                job_id=f'JOB-{status}', customer_name='Name', phone_number='0499123456',
+                status=status, estimated_repair_time=estimate,
+            )
+
+        with mock.patch.dict('repairs.due.ESTIMATE_DAYS', clear=True), mock.patch('repairs.due.OPEN_STATUSES', ()):
+            apps = self.migrate('0012_due_at')
+        jobs = {job.job_id: job for job in apps.get_model('repairs', 'RepairJob').objects.all()}
+        received = jobs['JOB-RECEIVED']
+        self.assertEqual(
+            timezone.localtime(received.due_at).date(), timezone.localtime(received.created_at).date() + timedelta(days=7),
+        )
+        self.assertIsNone(jobs['JOB-READY'].due_at)
+        self.assertIsNone(jobs['JOB-IN_PROGRESS'].due_at)
+
+
+@override_settings(DB_READ_THREADS=0)
+class PerformanceMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_jobs(3, seed=0)
+        cls.admin = User.objects.create_superuser('perf-admin', password='x')
+
+    def test_server_timing_is_for_staff_only(self):
+        self.assertNotIn('Server-Timing', self.client.get('/track/'))
+        self.client.force_login(self.admin)
+        timing = self.client.get('/dashboard/')['Server-Timing']
+        self.assertIn('view;desc="repairs.views.dashboard"', timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="[1-9]\d* queries, \d+ duplicates"')
+
+    @override_settings(PERF_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('repairs.performance', 'WARNING') as logs:
+            self.client.get('/track/')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['event'], entry['path'], entry['status']), ('slow_request', '/track/', 200))
+        self.assertEqual(entry['view'], 'repairs.views.track_repair')
+
+    def test_staff_can_profile_a_request(self):
+        profile_dir = self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-'))
+        self.client.force_login(self.admin)
+        with override_settings(PERF_PROFILE_DIR=profile_dir), self.assertLogs('repairs.performance', 'INFO'):
+            response = self.client.get('/dashboard/', headers={'X-Profile': 'cprofile'})
+        self.assertEqual(os.listdir(profile_dir), [response['X-Profile-File']])
+        self.assertRegex(response['X-Profile-File'], r'-dashboard-[0-9a-f]{6}\.prof$')
+
+
+@override_settings(DB_READ_THREADS=0)
+class CompactResponseTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_jobs(12, seed=0, status_mix={'RECEIVED': 1, 'READY': 1})
+        cls.admin = User.objects.create_superuser('compact-admin', password='x')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_whitespace_is_stripped_at_load_time(self):
+        source = (
+            '<div>\n    <!-- note -->\n    {% if x %}\n        <p>{{ x }}</p>\n    {% endif %}\n\n'
+            '    <pre>  kept\n    as is</pre>\n    <script>\n        go();\n    </script>\n</div>\n'
+        )
+        self.assertEqual(
+            template_loaders.strip_whitespace(source),
+            '<div>\n{% if x %}<p>{{ x }}</p>\n{% endif %}<pre>  kept\n    as is</pre>\n<script>\ngo();\n</script>\n</div>\n',
+        )
+
+    def test_each_job_is_rendered_once(self):
+        html = self.client.get('/dashboard/content/', headers={'HX-Request': 'true'}).content.decode()
+        for job in RepairJob.objects.all():
+            self.assertEqual(html.count(f'data-href="/job/{job.job_id}/"'), 1)
+        self.assertNotIn('\n ', html)
+
+    def test_responses_are_gzipped_with_weak_etags(self):
+        plain = self.client.get('/dashboard/content/', headers={'HX-Request': 'true'})
+        response = self.client.get('/dashboard/content/', headers={'HX-Request': 'true', 'Accept-Encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+
+        # Either encoding revalidates against the same ETag
+        response = self.client.get('/dashboard/content/', headers={
+            'HX-Request': 'true', 'Accept-Encoding': 'gzip', 'If-None-Match': plain['ETag'],
+        })
+        self.assertEqual(response.status_code, 304)
+
+    @unittest.skipIf(middleware.brotli is None, 'brotli is not installed')
+    def test_brotli_is_preferred(self):
+        plain = self.client.get('/dashboard/content/', headers={'HX-Request': 'true'})
+        response = self.client.get('/dashboard/content/', headers={'HX-Request': 'true', 'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(response.content), plain.content)
+
+
+class StartupTests(SimpleTestCase):
+    databases = {'default'}
+
+    def test_heavy_modules_are_not_imported_at_startup(self):
+        script = f"import sys; {bench_imports.STARTUP}; print(','.join(sorted(set(sys.modules) & {set(bench_imports.LAZY_MODULES)!r})))"
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), '')
+
+    def test_importtime_output_is_parsed(self):
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |     _io\n'
+            'import time:      1500 |       2000 |   django.urls\n'
+            'import time:       300 |       5300 | repairs.views\n'
+        )
+        self.assertEqual(bench_imports.parse_importtime(output), {
+            '_io': (120, 120, 2), 'django.urls': (1500, 2000, 1), 'repairs.views': (300, 5300, 0),
+        })
+
+    def test_warm_up_runs_every_step(self):
+        with self.assertLogs('repairs.performance', 'INFO') as logs:
+            timings = warmup.warm_up()
+        self.assertEqual(list(timings), ['urls', 'templates', 'modules', 'databases'])
+        self.assertTrue(all(step['count'] for step in timings.values()))
+        self.assertIn('qrcode', sys.modules)
+        self.assertEqual(json.loads(logs.records[-1].getMessage())['event'], 'warmup')
+
+    def test_a_failing_step_does_not_stop_the_others(self):
+        with override_settings(WARMUP_MODULES=['repairs.no_such_module']), self.assertLogs('repairs.performance') as logs:
+            timings = warmup.warm_up()
+        self.assertIsNone(timings['modules']['count'])
+        self.assertTrue(timings['databases']['count'])
+        self.assertIn('Warm-up step modules failed', logs.output[0])
+
+
+class TemplateTimingTests(SimpleTestCase):
+
+    def test_render_time_is_added_to_the_current_request(self):
+        from django.template import engines
+        from django.template.backends.django import Template as DjangoTemplate
+        from repairs.middleware import _current_metrics
+
+        self.assertFalse(hasattr(DjangoTemplate.render, '__wrapped__'))
+        template = engines['django'].from_string('{% for i in items %}{{ i }}{% endfor %}')
+        self.assertEqual(template.render({'items': range(3)}), '012')
+        metrics = RequestMetrics()
+        token = _current_metrics.set(metrics)
+        try:
+            template.render({'items': range(3)})
+        finally:
+            _current_metrics.reset(token)
+        self.assertGreater(metrics.template_time, 0)
+
+
+class PeriodReportTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(override_settings(
+            REPORT_CACHE_DIR=self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-')),
+        ))
+
+    def report_breakdown(self, day):
+        """The daily breakdown the cached PDF for `day` was written from"""
+        written = []
+
+        def write(output, summary, start, end):
+            written.append(summary['daily_breakdown'])
+            output.write(b'%PDF')
+
+        with mock.patch.object(reports, 'write_report_pdf', side_effect=write):
+            report, _ = reports.period_report(day, day)
+            report.close()
+        return written[0] if written else None
+
+    def test_summary_covers_active_and_archived_jobs(self):
+        seed_jobs(30, seed=0, days=20)
+        archive.archive_batch(list(RepairJob.objects.filter(status='COMPLETED').values_list('pk', flat=True)[:10]))
+        start, end = timezone.localdate() - timedelta(days=30), timezone.localdate()
+        costs = sorted(
+            [*RepairJob.objects.exclude(estimated_cost=None).values_list('estimated_cost', flat=True),
+             *ArchivedRepairJob.objects.exclude(estimated_cost=None).values_list('estimated_cost', flat=True)]
+        )
+
+        summary = reports.period_summary(start, end)
+        self.assertEqual(summary['total_jobs_count'], 30)
+        self.assertEqual((summary['total_cost'], summary['jobs_with_cost_count']), (sum(costs), len(costs)))
+        self.assertEqual(summary['median_cost'], statistics.median(costs))
+        self.assertEqual((summary['lowest_job_cost'], summary['highest_job_cost']), (costs[0], costs[-1]))
+        self.assertEqual(sum(day['total'] for day in summary['daily_breakdown']), sum(costs))
+
+        # Days before the rollup watermark come from DailyRollup and add up the same
+        tasks.rollup_refresh(SimpleNamespace(watermark=None), timezone.now(), batch_size=100)
+        ScheduledTask.objects.create(name='rollup_refresh', watermark=timezone.now())
+        self.assertEqual(reports.period_summary(start, end)['daily_breakdown'], summary['daily_breakdown'])
+
+    def test_closed_periods_are_cached_until_a_job_changes(self):
+        seed_jobs(10, seed=0, status_mix={'COMPLETED': 1}, days=10)
+        start, end = timezone.localdate() - timedelta(days=10), timezone.localdate() - timedelta(days=1)
+        with mock.patch.object(reports, 'write_report_pdf', wraps=reports.write_report_pdf) as write:
+            for _ in range(2):
+                report, filename = reports.period_report(start, end)
+                with report:
+                    self.assertEqual(report.read(5), b'%PDF-')
+            self.assertEqual(write.call_count, 1)
+            self.assertEqual(filename, f'revenue-{start:%Y%m%d}-{end:%Y%m%d}.pdf')
+
+            job = RepairJob.objects.filter(created_at__date__lte=end).first()
+            job.estimated_cost = 123
+            job.save()
+            reports.period_report(start, end)[0].close()
+            self.assertEqual(write.call_count, 2)
+        # Only the report for the current state of the period is kept
+        self.assertEqual(len(os.listdir(settings.REPORT_CACHE_DIR)), 1)
+
+    def test_staff_download_the_pdf(self):
+        seed_jobs(5, seed=0)
+        self.client.force_login(User.objects.create_superuser('report-admin', password='x'))
+        response = self.client.get('/total-summary/report.pdf', {'filter': 'month'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('attachment; filename="revenue-', response['Content-Disposition'])
+        self.assertEqual(b''.join(response.streaming_content)[:5], b'%PDF-')
+
+    def test_cached_report_does_not_use_a_stale_rollup(self):
+        seed_jobs(20, seed=0, status_mix={'COMPLETED': 1}, days=20)
+        job = RepairJob.objects.filter(estimated_cost__isnull=False).order_by('created_at').first()
+        day = timezone.localtime(job.created_at).date()
+        tasks.refresh_rollup_days([day])
+        ScheduledTask.objects.create(name='rollup_refresh', watermark=timezone.now())
+
+        # Edited after the last rollup: the fingerprint changes, DailyRollup does not
+        job.estimated_cost += 1000
+        job.save()
+        live = reports.period_summary(day, day, rollups=False)['daily_breakdown']
+        self.assertNotEqual(DailyRollup.objects.get(day=day).revenue, live[0]['total'])
+        self.assertEqual(self.report_breakdown(day), live)
+
+
+class RollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_jobs(30, seed=0, days=5)
+        cls.admin = User.objects.create_superuser('rollup-admin', password='x')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        tasks.rollup_refresh(SimpleNamespace(watermark=None), timezone.now(), batch_size=100)
+
+    def assertRollupsMatchJobs(self):
+        live = {
+            row['day']: row['jobs']
+            for row in RepairJob.objects.annotate(day=TruncDate('created_at')).values('day').annotate(jobs=Count('id'))
+        }
+        self.assertEqual(dict(DailyRollup.objects.values_list('day', 'jobs_count')), live)
+
+    def test_refresh_counts_every_day(self):
+        self.assertRollupsMatchJobs()
+
+    def test_admin_delete_recounts_the_day(self):
+        job = RepairJob.objects.first()
+        response = self.client.post(f'/alamana-admin/repairs/repairjob/{job.pk}/delete/', {'post': 'yes'}, secure=True)
+        self.assertEqual(response.status_code, 302)
+        self.assertRollupsMatchJobs()
+
+    def test_admin_bulk_delete_recounts_the_days(self):
+        ids = list(RepairJob.objects.values_list('pk', flat=True)[:12])
+        response = self.client.post('/alamana-admin/repairs/repairjob/', {
+            'action': 'delete_selected', '_selected_action': ids, 'post': 'yes',
+        }, secure=True)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(RepairJob.objects.count(), 18)
+        self.assertRollupsMatchJobs()
+
+
+class PhotoZipTests(TestCase):
+
+    def setUp(self):
+        media = self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-'))
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        seed_jobs(1, seed=0)
+        self.job = RepairJob.objects.get()
+        self.photos = [
+            RepairJobPhoto.objects.create(repair_job=self.job, photo=ContentFile(data, name=name))
+            for data, name in [(b'front' * 1000, 'front.JPG'), (b'back', 'back.png'), (b'gone', 'gone.jpg')]
+        ]
+        os.remove(os.path.join(media, self.photos[2].photo.name))
+        self.client.force_login(User.objects.create_superuser('zip-admin', password='x'))
+
+    def test_job_photos_are_numbered_in_upload_order(self):
+        response = self.client.get('/photos.zip', {'job_id': self.job.job_id})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn(f'filename="photos-{self.job.job_id}.zip"', response['Content-Disposition'])
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as zipped:
+            self.assertEqual(zipped.namelist(), [f'{self.job.job_id}/001.jpg', f'{self.job.job_id}/002.png', 'MISSING.txt'])
+            self.assertEqual(zipped.read(f'{self.job.job_id}/001.jpg'), b'front' * 1000)
+            self.assertEqual(zipped.getinfo(f'{self.job.job_id}/002.png').compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zipped.read('MISSING.txt').decode(), f'{self.photos[2].photo.name}\n')
+
+    def test_large_photos_are_sent_block_by_block(self):
+        rows = photo_zip.job_photos(self.job)
+        with mock.patch.object(photo_zip, 'STREAM_CHUNK_SIZE', 512):
+            chunks = list(photo_zip.stream_zip(rows))
+        self.assertGreater(len(chunks), 5)
+        self.assertTrue(all(chunks))
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zipped:
+            self.assertIsNone(zipped.testzip())
+
+    def test_export_command_writes_the_same_archive(self):
+        output = os.path.join(settings.MEDIA_ROOT, 'export.zip')
+        stdout = StringIO()
+        call_command('export_photos', job=self.job.job_id, output=output, stdout=stdout)
+        self.assertIn('1 photo files missing', stdout.getvalue())
+        self.assertIn('Wrote 2 photos', stdout.getvalue())
+        with zipfile.ZipFile(output) as zipped:
+            self.assertEqual(len(zipped.namelist()), 3)
+
+
+@override_settings(METRICS_DIR='', METRICS_TOKEN='scrape-token')
+class MetricsTests(TestCase):
+
+    def scrape(self, **headers):
+        response = self.client.get('/metrics', headers=headers)
+        return response, response.content.decode() if response.status_code == 200 else ''
+
+    def test_scrapers_need_the_token_or_a_staff_session(self):
+        self.assertEqual(self.scrape()[0].status_code, 302)
+        self.assertEqual(self.scrape(authorization='Bearer wrong')[0].status_code, 302)
+        response, text = self.scrape(authorization='Bearer scrape-token')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        self.assertIn('# TYPE repairs_http_requests_total counter', text)
+
+        self.client.force_login(User.objects.create_superuser('metrics-admin', password='x'))
+        self.assertEqual(self.scrape()[0].status_code, 200)
+
+    def test_requests_and_jobs_are_counted(self):
+        seed_jobs(4, seed=0, status_mix={'READY': 1})
+        before = metrics.collect().get(('repairs_http_requests_total', ('track_repair', '200'), 'value'), 0)
+        self.client.get('/track/')
+        _, text = self.scrape(authorization='Bearer scrape-token')
+        self.assertIn(f'repairs_http_requests_total{{view="track_repair",status="200"}} {before + 1}\n', text)
+        self.assertIn('repairs_jobs{status="READY"} 4\n', text)
+        self.assertIn('repairs_jobs{status="COMPLETED"} 0\n', text)
+
+    def test_totals_of_every_worker_are_added_up(self):
+        with tempfile.TemporaryDirectory(prefix='repairs-tests-') as directory, \
+                override_settings(METRICS_DIR=directory):
+            Path(directory, '1-1.json').write_text(json.dumps([['repairs_sms_total', ['metrics-test'], 'value', 3]]))
+            metrics.SMS_SENT.inc(2, outcome='metrics-test')
+            self.assertEqual(metrics.collect()[('repairs_sms_total', ('metrics-test',), 'value')], 5)
+            self.assertEqual(len(list(Path(directory).glob('*.json'))), 2)
+
+    def test_histogram_buckets_are_cumulative(self):
+        metric = metrics.Histogram.__new__(metrics.Histogram)
+        metric.name, metric.help_text, metric.labelnames, metric.buckets = 'latency', 'Latency', (), (0.1, 1.0)
+        totals = {('latency', (), 0): 2, ('latency', (), 2): 1, ('latency', (), 'sum'): 5.25, ('latency', (), 'count'): 3}
+        self.assertEqual(metrics.render_metric(metric, totals)[2:], [
+            'latency_bucket{le="0.1"} 2',
+            'latency_bucket{le="1"} 2',
+            'latency_bucket{le="+Inf"} 3',
+            'latency_sum 5.25',
+            'latency_count 3',
+        ])
+
+
+@override_settings(DB_READ_THREADS=0)
+class DueDateTests(TestCase):
+
+    def add_job(self, estimate, days_ago=0, status='RECEIVED'):
+        job = RepairJob.objects.create(
+            customer_name='Due', phone_number='+32499000111', bike_description='VanMoof S3',
+            estimated_repair_time=estimate, status=status,
+        )
+        if days_ago:
+            created_at = timezone.now() - timedelta(days=days_ago)
+            RepairJob.objects.filter(pk=job.pk).update(created_at=created_at, due_at=due.due_at(estimate, created_at))
+        return RepairJob.objects.get(pk=job.pk)
+
+    def in_days(self, days):
+        return due.end_of_day(timezone.localdate() + timedelta(days=days))
+
+    def test_estimate_counts_from_drop_off(self):
+        self.assertEqual(self.add_job('3-5_DAYS').due_at, self.in_days(5))
+        self.assertEqual(self.add_job('TODAY').due_at, self.in_days(0))
+        self.assertIsNone(self.add_job('UNKNOWN').due_at)
+        self.assertIsNone(self.add_job('1_WEEK', status='READY').due_at)
+
+    def test_changes_restart_the_estimate(self):
+        job = self.add_job('1_WEEK', days_ago=3)
+        self.assertEqual(job.due_at, self.in_days(4))
+
+        job.notes = 'Waiting on a chain'
+        job.save()
+        self.assertEqual(job.due_at, self.in_days(4))
+
+        job.estimated_repair_time = '1-2_DAYS'
+        job.save(update_fields=['estimated_repair_time'])
+        self.assertEqual(RepairJob.objects.get(pk=job.pk).due_at, self.in_days(2))
+
+        job.status = 'READY'
+        job.save()
+        self.assertIsNone(job.due_at)
+        job.status = 'IN_PROGRESS'
+        job.save()
+        self.assertEqual(job.due_at, self.in_days(2))
+
+    def test_work_queue_lists_late_and_due_today(self):
+        late = self.add_job('1-2_DAYS', days_ago=4)
+        today = self.add_job('TODAY')
+        later = self.add_job('1_WEEK')
+        self.add_job('1-2_DAYS', days_ago=4, status='READY')
+
+        self.assertEqual(list(RepairJob.objects.past_due()), [late])
+        self.assertEqual(set(RepairJob.objects.due_by_today()), {late, today})
+
+        self.client.force_login(User.objects.create_superuser('due-admin', password='x'))
+        response = self.client.get('/dashboard/content/', {'due': 'today'})
+        content = response.content.decode()
+        self.assertLess(content.index(late.job_id), content.index(today.job_id))
+        self.assertNotIn(later.job_id, content)
+
+
+class StatusBoardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_jobs(30, seed=0, status_mix={'IN_PROGRESS': 2, 'READY': 1, 'COMPLETED': 1})
+        cls.recent, cls.old = RepairJob.objects.filter(status='COMPLETED')[:2]
+        RepairJob.objects.filter(pk=cls.recent.pk).update(updated_at=timezone.now())
+        RepairJob.objects.filter(pk=cls.old.pk).update(updated_at=timezone.now() - timedelta(days=30))
+        cls.admin = User.objects.create_superuser('board-admin', password='x')
+
+    def expected_column(self, status):
+        return list(board.board_jobs().filter(status=status).order_by(*board.card_ordering()))
+
+    def test_columns_are_read_in_one_query(self):
+        with self.assertNumQueries(1):
+            columns = {column['status']: column for column in board.board_columns(per_column=3)}
+        self.assertEqual(list(columns), [status for status, _ in RepairJob.STATUS_CHOICES])
+        for status, column in columns.items():
+            expected = self.expected_column(status)
+            self.assertEqual(column['total'], len(expected))
+            self.assertEqual(column['jobs'], expected[:3])
+            self.assertEqual(column['next_offset'], 3 if len(expected) > 3 else None)
+        # Only recently completed jobs stay on the board
+        self.assertEqual(columns['COMPLETED']['jobs'][0], self.recent)
+        self.assertNotIn(self.old, self.expected_column('COMPLETED'))
+
+    def test_scrolling_reads_the_rest_of_a_column(self):
+        cards, offset = [], 0
+        while offset is not None:
+            jobs, offset = board.column_page('IN_PROGRESS', offset, per_column=4)
+            cards.extend(jobs)
+        self.assertEqual(cards, self.expected_column('IN_PROGRESS'))
+
+    def test_moving_a_card_changes_the_status(self):
+        self.client.force_login(self.admin)
+        job = RepairJob.objects.filter(status='IN_PROGRESS').exclude(estimated_repair_time='UNKNOWN').first()
+        self.assertIsNotNone(job.due_at)
+        response = self.client.post(f'/job/{job.job_id}/status/', {'status': 'READY'})
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['HX-Trigger'], 'board-changed')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.due_at), ('READY', None))
+
+        self.assertEqual(self.client.post(f'/job/{job.job_id}/status/', {'status': 'LOST'}).status_code, 400)
+        self.assertEqual(self.client.get('/board/cards/', {'status': 'LOST'}).status_code, 400)
+        response = self.client.get('/board/cards/', {'status': 'READY', 'offset': 'x'})
+        self.assertContains(response, job.job_id)
+
+
+class BackupTests(SimpleTestCase):
+
+    def setUp(self):
+        temp = self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-'))
+        self.backup_dir = os.path.join(temp, 'backups')
+        self.media = os.path.join(temp, 'media')
+        os.makedirs(os.path.join(self.media, 'photos'))
+        Path(self.media, 'photos', 'kept.jpg').write_bytes(b'kept')
+        self.enterContext(override_settings(MEDIA_ROOT=self.media, BACKUP_STEP_SLEEP=0))
+
+        # The tests run on an in-memory database, so back up a small file of our own
+        self.source = os.path.join(temp, 'live.db')
+        db = sqlite3.connect(self.source)
+        for table in ('repairs_repairjobphoto', 'repairs_archivedrepairjobphoto'):
+            db.execute(f'CREATE TABLE {table} (photo TEXT)')
+        db.executemany('INSERT INTO repairs_repairjobphoto VALUES (?)', [('photos/kept.jpg',), ('photos/lost.jpg',)])
+        db.commit()
+        db.close()
+        self.enterContext(mock.patch.object(backups, 'primary_path', return_value=self.source))
+
+    def backup(self, at, *args):
+        stdout = StringIO()
+        with mock.patch.object(backups.timezone, 'now', return_value=at):
+            call_command('backup_db', '--dir', self.backup_dir, *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_snapshot_and_manifest(self):
+        at = datetime(2026, 3, 1, 12, tzinfo=dt_timezone.utc)
+        output = self.backup(at, '--compress')
+        self.assertIn('1 photos in the snapshot are missing', output)
+
+        snapshot = Path(self.backup_dir, 'live-20260301T120000Z.db.gz')
+        restored = Path(self.backup_dir, 'restored.db')
+        restored.write_bytes(gzip.decompress(snapshot.read_bytes()))
+        self.assertEqual(backups.referenced_photos(restored), {'photos/kept.jpg', 'photos/lost.jpg'})
+
+        manifest = json.loads(backups.manifest_path(snapshot).read_text())
+        self.assertEqual(manifest['snapshot'], snapshot.name)
+        self.assertEqual(manifest['database']['sha256'], hashlib.sha256(restored.read_bytes()).hexdigest())
+        self.assertEqual(manifest['files']['photos/kept.jpg'][2], hashlib.sha256(b'kept').hexdigest())
+        self.assertEqual(manifest['missing'], ['photos/lost.jpg'])
+
+        # The next manifest only reports what changed
+        Path(self.media, 'photos', 'new.jpg').write_bytes(b'new')
+        output = self.backup(at + timedelta(hours=1))
+        self.assertIn('2 media files (0.0 MiB), 1 new or changed and 0 removed', output)
+        self.assertEqual(backups.latest_snapshot(self.backup_dir).name, 'live-20260301T130000Z.db')
+
+    def test_failed_checks_keep_the_copy_aside(self):
+        at = datetime(2026, 3, 1, 12, tzinfo=dt_timezone.utc)
+        with mock.patch.object(backups, 'verify', return_value=['page 3 is never used']):
+            with self.assertRaisesMessage(CommandError, 'failed its integrity check: page 3 is never used'):
+                self.backup(at)
+        self.assertEqual(os.listdir(self.backup_dir), ['.lock', 'live-20260301T120000Z.db.failed'])
+        self.assertIsNone(backups.latest_snapshot(self.backup_dir))
+
+    def test_rotation_keeps_the_latest_and_one_a_day(self):
+        os.makedirs(self.backup_dir)
+        stamps = ['20260301T010000Z', '20260301T020000Z', '20260302T010000Z', '20260302T020000Z', '20260303T010000Z',
+                  '20260304T010000Z', '20260304T020000Z']
+        for stamp in stamps:
+            Path(self.backup_dir, f'live-{stamp}.db').touch()
+            Path(self.backup_dir, f'live-{stamp}.media.json').touch()
+        now = datetime(2026, 3, 4, 3, tzinfo=dt_timezone.utc)
+        removed = backups.rotate(self.backup_dir, keep_latest=2, keep_daily=2, now=now)
+        self.assertEqual(removed, ['20260302T020000Z', '20260302T010000Z', '20260301T020000Z', '20260301T010000Z'])
+        self.assertEqual(sorted(os.listdir(self.backup_dir)), [
+            'live-20260303T010000Z.db', 'live-20260303T010000Z.media.json',
+            'live-20260304T010000Z.db', 'live-20260304T010000Z.media.json',
+            'live-20260304T020000Z.db', 'live-20260304T020000Z.media.json',
+        ])
+
+
+class GalleryTests(TestCase):
+
+    def setUp(self):
+        media = self.enterContext(tempfile.TemporaryDirectory(prefix='repairs-tests-'))
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        seed_jobs(1, seed=0)
+        self.job = RepairJob.objects.get()
+        self.photos = [
+            RepairJobPhoto.objects.create(
+                repair_job=self.job, photo=ContentFile(f'photo {n}'.encode(), name='bike.jpg'), description=f'Photo {n}',
+            )
+            for n in range(14)
+        ]
+        self.client.force_login(User.objects.create_superuser('gallery-admin', password='x'))
+
+    def test_pages_follow_upload_order(self):
+        with self.assertNumQueries(1):
+            photos, offset, count = gallery.first_page(self.job, per_page=5)
+        self.assertEqual((offset, count), (5, 14))
+        while offset is not None:
+            page, offset = gallery.photo_page(self.job, offset, per_page=5)
+            photos.extend(page)
+        self.assertEqual([photo['index'] for photo in photos], list(range(14)))
+        self.assertEqual([photo['url'] for photo in photos], [photo.photo.url for photo in self.photos])
+        self.job.photos.all().delete()
+        self.assertEqual(gallery.first_page(self.job, per_page=5), ([], None, 0))
+
+    def test_grid_pages_and_single_photos(self):
+        response = self.client.get(f'/job/{self.job.job_id}/')
+        self.assertEqual((response.context['photo_count'], response.context['next_photo_offset']), (14, 12))
+        self.assertEqual(len(response.context['photos']), 12)
+
+        response = self.client.get(f'/job/{self.job.job_id}/photos/', {'offset': 12})
+        self.assertEqual([photo['description'] for photo in response.context['photos']], ['Photo 12', 'Photo 13'])
+        self.assertIsNone(response.context['next_photo_offset'])
+
+        response = self.client.get(f'/job/{self.job.job_id}/photos/13/')
+        self.assertEqual(response.json(), {'index': 13, 'url': self.photos[13].photo.url, 'description': 'Photo 13'})
+        self.assertEqual(self.client.get(f'/job/{self.job.job_id}/photos/14/').status_code, 404)
+
+        # Archived jobs page their photos the same way
+        archive.archive_batch([self.job.pk])
+        response = self.client.get(f'/job/{self.job.job_id}/photos/13/')
+        self.assertEqual(response.json()['description'], 'Photo 13')
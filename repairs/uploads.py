@@ -0,0 +1,203 @@
+"""
+Chunked, resumable photo uploads.
+
+    POST   /job/<job_id>/uploads/   {filename, size, sha256, description}
+                                    -> {upload_url, offset, chunk_size}
+    GET    /uploads/<upload_id>/    -> {offset, size, complete}
+    PUT    /uploads/<upload_id>/    raw chunk, `Upload-Offset: <n>` header
+    DELETE /uploads/<upload_id>/    abandon the upload
+
+Each PUT is streamed from the socket to a temporary file in
+PHOTO_UPLOAD_TEMP_DIR, so a worker never holds more than one read buffer of
+a photo in memory. A PUT whose offset doesn't match what the server has gets
+a 409 with the current offset, which is also how a client resumes after a
+dropped connection; so does a PUT for a chunk another PUT is still writing. Once all bytes are in, the file's SHA-256 is checked and
+the file is attached to the job as a RepairJobPhoto.
+"""
+
+import hashlib
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.db.models import F, Q
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from . import blobs
+from .models import RepairJob, RepairJobPhoto, PhotoUpload
+
+READ_BUFFER = 64 * 1024
+
+
+def can_upload(user, repair_job):
+    """Staff can add photos to any job, other users only to jobs they created"""
+    return user.is_staff or repair_job.created_by_id == user.id
+
+
+def upload_state(upload):
+    return {
+        'upload_url': reverse('upload_chunk', kwargs={'upload_id': upload.upload_id}),
+        'offset': upload.received,
+        'size': upload.size,
+        'chunk_size': settings.PHOTO_UPLOAD_CHUNK_SIZE,
+        'complete': upload.completed_at is not None,
+    }
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(READ_BUFFER * 16):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def discard_upload(upload):
+    try:
+        os.remove(upload.temp_path)
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+@login_required
+@require_http_methods(["POST"])
+def upload_create(request, job_id):
+    """Start an upload, or return the unfinished one for the same file so the client can resume"""
+    repair_job = get_object_or_404(RepairJob, job_id=job_id)
+    if not can_upload(request.user, repair_job):
+        return JsonResponse({'error': 'Not allowed to add photos to this job'}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        filename = os.path.basename(str(data['filename']))[:255]
+        size = int(data['size'])
+        checksum = str(data['sha256']).lower()
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected JSON with filename, size and sha256'}, status=400)
+
+    if not 0 < size <= settings.PHOTO_UPLOAD_MAX_SIZE:
+        return JsonResponse({'error': f'Photos must be at most {settings.PHOTO_UPLOAD_MAX_SIZE} bytes'}, status=413)
+    if len(checksum) != 64 or any(c not in '0123456789abcdef' for c in checksum):
+        return JsonResponse({'error': 'sha256 must be 64 hex characters'}, status=400)
+
+    upload = PhotoUpload.objects.filter(
+        repair_job=repair_job, sha256=checksum, size=size, completed_at__isnull=True,
+    ).first()
+    if upload is None:
+        upload = PhotoUpload.objects.create(
+            repair_job=repair_job,
+            filename=filename,
+            description=str(data.get('description') or f"Photo upload - {filename}")[:200],
+            size=size,
+            sha256=checksum,
+            created_by=request.user,
+        )
+        os.makedirs(settings.PHOTO_UPLOAD_TEMP_DIR, exist_ok=True)
+        open(upload.temp_path, 'wb').close()
+
+    return JsonResponse(upload_state(upload), status=201)
+
+
+@login_required
+@require_http_methods(["GET", "PUT", "DELETE"])
+def upload_chunk(request, upload_id):
+    """Report the resume offset (GET), append a chunk (PUT) or abandon the upload (DELETE)"""
+    upload = get_object_or_404(PhotoUpload.objects.select_related('repair_job'), upload_id=upload_id)
+    if not can_upload(request.user, upload.repair_job):
+        return JsonResponse({'error': 'Not allowed to add photos to this job'}, status=403)
+
+    if request.method == 'GET':
+        return JsonResponse(upload_state(upload))
+
+    if request.method == 'DELETE':
+        if upload.completed_at is None:
+            discard_upload(upload)
+        return JsonResponse({'deleted': True})
+
+    if upload.completed_at is not None:
+        return JsonResponse(upload_state(upload))
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Upload-Offset and Content-Length headers are required'}, status=400)
+    if offset != upload.received:
+        return JsonResponse({**upload_state(upload), 'error': 'Offset mismatch'}, status=409)
+    if length > settings.PHOTO_UPLOAD_CHUNK_SIZE or offset + length > upload.size:
+        return JsonResponse({**upload_state(upload), 'error': 'Chunk too large'}, status=413)
+
+    # Claim the offset before writing, so two PUTs of the same chunk can't both write it
+    claimed_at = timezone.now()
+    stale = claimed_at - timedelta(seconds=settings.PHOTO_UPLOAD_WRITE_TIMEOUT)
+    claimed = PhotoUpload.objects.filter(
+        Q(writing_since__isnull=True) | Q(writing_since__lt=stale), pk=upload.pk, received=offset,
+    ).update(writing_since=claimed_at)
+    if not claimed:
+        upload.refresh_from_db()
+        return JsonResponse({**upload_state(upload), 'error': 'Offset mismatch'}, status=409)
+
+    # Stream straight from the request to disk; request.body is never touched
+    written = 0
+    try:
+        with open(upload.temp_path, 'r+b') as f:
+            f.seek(offset)
+            while written < length:
+                block = request.read(min(READ_BUFFER, length - written))
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+    except OSError:
+        # Client went away mid-chunk; keep what arrived so it can resume from there
+        pass
+
+    # A writer whose claim went stale and was taken over must not advance the offset
+    advanced = PhotoUpload.objects.filter(pk=upload.pk, received=offset, writing_since=claimed_at).update(
+        received=F('received') + written, writing_since=None, updated_at=timezone.now(),
+    )
+    upload.refresh_from_db()
+    if not advanced:
+        return JsonResponse({**upload_state(upload), 'error': 'Offset mismatch'}, status=409)
+
+    if upload.received == upload.size:
+        return complete_upload(upload)
+    return JsonResponse(upload_state(upload))
+
+
+def complete_upload(upload):
+    """Verify the checksum and attach the file to the job"""
+    if file_sha256(upload.temp_path) != upload.sha256:
+        discard_upload(upload)
+        return JsonResponse({'error': 'Checksum mismatch, please upload the photo again'}, status=422)
+
+    # Claim completion so a concurrent final chunk can't attach the photo twice
+    if not PhotoUpload.objects.filter(pk=upload.pk, completed_at__isnull=True).update(completed_at=timezone.now()):
+        upload.refresh_from_db()
+        return JsonResponse(upload_state(upload))
+
+    try:
+        # The checksum is verified, so the blob needs no second hashing pass
+        with transaction.atomic():
+            blob = blobs.store_file(upload.temp_path, upload.sha256, upload.filename)
+            photo = RepairJobPhoto.objects.create(
+                repair_job=upload.repair_job, description=upload.description, blob=blob, photo=blob.name,
+            )
+    except Exception:
+        # Let the client retry the final chunk's completion
+        PhotoUpload.objects.filter(pk=upload.pk).update(completed_at=None)
+        raise
+    os.remove(upload.temp_path)
+
+    PhotoUpload.objects.filter(pk=upload.pk).update(photo=photo)
+    upload.refresh_from_db()
+    return JsonResponse({**upload_state(upload), 'photo_url': photo.photo.url})
+
@@ -1,20 +1,34 @@
 from django.urls import path
-from . import views
+from . import views, api, uploads, metrics
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('login/', views.custom_login, name='login'),
     path('logout/', views.custom_logout, name='logout'),
     path('drop-off/', views.drop_off, name='drop_off'),
+    path('customers/lookup/', views.customer_lookup, name='customer_lookup'),
     path('receipt/<str:job_id>/', views.receipt, name='receipt'),
     path('track/', views.track_repair, name='track_repair'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('dashboard/content/', views.dashboard_content, name='dashboard_content'),
     path('dashboard/stats/', views.dashboard_stats, name='dashboard_stats'),
+    path('board/', views.status_board, name='status_board'),
+    path('board/content/', views.status_board_content, name='status_board_content'),
+    path('board/cards/', views.status_board_cards, name='status_board_cards'),
     path('job/<str:job_id>/', views.job_detail, name='job_detail'),
+    path('job/<str:job_id>/photos/', views.job_photos, name='job_photos'),
+    path('job/<str:job_id>/photos/<int:index>/', views.job_photo, name='job_photo'),
     path('job/<str:job_id>/quick-action/', views.job_quick_action, name='job_quick_action'),
+    path('job/<str:job_id>/status/', views.job_status_update, name='job_status_update'),
     path('job/<str:job_id>/delete/confirm/', views.job_delete_confirm, name='job_delete_confirm'),
     path('job/<str:job_id>/delete/', views.job_delete, name='job_delete'),
+    path('job/<str:job_id>/uploads/', uploads.upload_create, name='upload_create'),
+    path('uploads/<uuid:upload_id>/', uploads.upload_chunk, name='upload_chunk'),
     path('total-summary/', views.total_summary, name='total_summary'),
     path('total-summary/filtered/', views.total_summary_filtered, name='total_summary_filtered'),
+    path('total-summary/report.pdf', views.summary_report, name='summary_report'),
+    path('photos.zip', views.photo_archive, name='photo_archive'),
+    path('metrics', metrics.metrics_view, name='metrics'),
+    path('api/jobs/', api.job_list, name='api_job_list'),
+    path('api/jobs/<str:job_id>/', api.job_detail, name='api_job_detail'),
 ]
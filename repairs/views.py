@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
@@ -5,71 +6,44 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.views.decorators.vary import vary_on_headers
 from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count, Avg, Max, Min
+from django.db import transaction
+from django.db.models import F, Q, Sum, Count, Avg, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.http import content_disposition_header
 from datetime import datetime, timedelta, date
 from urllib.parse import urlencode
-import qrcode
+import asyncio
 import io
 import base64
-import requests
 import json
-import os
-import statistics
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import cm
-from reportlab.lib import colors
-from .models import RepairJob, RepairJobPhoto
+from .models import RepairJob, RepairJobPhoto, Customer
+from .phones import normalize_phone, prefix_range
+from .reporting import current_reporting_alias, reporting_reads
+from .concurrency import db_read
+from .sessions import session_read_only
+from . import archive, tasks, blobs, reports, photo_zip, due, board, gallery, single_flight
+from .reports import get_date_range
 from .forms import DropOffForm, TrackingForm, AdminStatusUpdateForm
 
 def is_htmx_request(request):
-    """Helper function to check if request is from HTMX"""
+    """Helper function to check if request is from HTMX; views that branch on it vary on HX-Request"""
     return request.headers.get('HX-Request') == 'true'
 
-def get_date_range(filter_type, start_date=None, end_date=None):
-    """Helper function to get date ranges for filtering"""
-    today = timezone.now().date()
-    
-    if filter_type == 'today':
-        return today, today
-    elif filter_type == 'week':
-        # Start of week (Monday)
-        start = today - timedelta(days=today.weekday())
-        end = start + timedelta(days=6)
-        return start, end
-    elif filter_type == 'month':
-        start = today.replace(day=1)
-        # Last day of month
-        if start.month == 12:
-            end = start.replace(year=start.year + 1, month=1) - timedelta(days=1)
-        else:
-            end = start.replace(month=start.month + 1) - timedelta(days=1)
-        return start, end
-    elif filter_type == 'quarter':
-        # Current quarter
-        quarter = (today.month - 1) // 3 + 1
-        start = today.replace(month=(quarter - 1) * 3 + 1, day=1)
-        if quarter == 4:
-            end = today.replace(year=today.year + 1, month=1, day=1) - timedelta(days=1)
-        else:
-            end = today.replace(month=quarter * 3 + 1, day=1) - timedelta(days=1)
-        return start, end
-    elif filter_type == 'year':
-        start = today.replace(month=1, day=1)
-        end = today.replace(month=12, day=31)
-        return start, end
-    elif filter_type == 'custom' and start_date and end_date:
-        return start_date, end_date
-    else:
-        # All time - return None to indicate no filtering
-        return None, None
+async def arender(request, template_name, context=None):
+    """render() for async views; context processors and messages may read the session or user lazily"""
+    return await sync_to_async(render)(request, template_name, context)
+
+async def arender_to_string(request, template_name, context=None):
+    """render_to_string() for async views, for HTML shared between requests by single_flight.run()"""
+    return await sync_to_async(render_to_string)(template_name, context, request)
 
 def custom_login(request):
     """Custom login view with same styling"""
@@ -116,6 +90,9 @@ def custom_logout(request):
 
 def generate_qr_code(data):
     """Generate QR code and return as base64 string"""
+    # qrcode pulls in PIL; only the receipt page needs it
+    import qrcode
+    
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -141,6 +118,7 @@ def home(request):
     })
 
 @login_required
+@vary_on_headers('HX-Request')
 def drop_off(request):
     """Customer drop-off form - requires login"""
     if request.method == 'POST':
@@ -150,7 +128,7 @@ def drop_off(request):
             repair_job.created_by = request.user  # Track who created the job
             repair_job.save()
             
-            # Handle multiple photo uploads directly from request.FILES
+            # Photos sent with the form when JavaScript is unavailable
             photos = request.FILES.getlist('photos')
             for photo in photos:
                 RepairJobPhoto.objects.create(
@@ -162,9 +140,14 @@ def drop_off(request):
             success_message = f'Drop-off recorded successfully! Job ID: {repair_job.job_id}'
             
             if is_htmx_request(request):
-                # Return success message for HTMX
+                # Return success message for HTMX; the page then uploads photos in chunks
                 messages.success(request, success_message)
-                return render(request, 'repairs/partials/messages.html')
+                response = render(request, 'repairs/partials/messages.html')
+                response['HX-Trigger'] = json.dumps({'jobCreated': {
+                    'jobId': repair_job.job_id,
+                    'uploadUrl': reverse('upload_create', kwargs={'job_id': repair_job.job_id}),
+                }})
+                return response
             else:
                 messages.success(request, success_message)
                 return redirect('receipt', job_id=repair_job.job_id)
@@ -177,10 +160,28 @@ def drop_off(request):
     
     return render(request, 'repairs/drop_off.html', {'form': form})
 
+@login_required
+def customer_lookup(request):
+    """HTMX autocomplete for the drop-off form: existing customers by phone or name prefix"""
+    query = (request.GET.get('phone_number') or request.GET.get('customer_name') or '').strip()
+    
+    # Both lookups are range scans on an indexed column
+    customers = Customer.objects.none()
+    if any(char.isdigit() for char in query):
+        phone = normalize_phone(query)
+        if len(phone) >= 5:
+            low, high = prefix_range(phone)
+            customers = Customer.objects.filter(phone__gte=low, phone__lt=high).order_by('phone')
+    elif len(query) >= 2:
+        low, high = prefix_range(query.casefold())
+        customers = Customer.objects.filter(name_key__gte=low, name_key__lt=high).order_by('name_key')
+    
+    return render(request, 'repairs/partials/customer_suggestions.html', {'customers': customers[:8]})
+
 @login_required
 def receipt(request, job_id):
     """Display receipt with QR code that directly links to tracking with pre-filled data - Login Required"""
-    repair_job = get_object_or_404(RepairJob, job_id=job_id)
+    repair_job = archive.get_job_or_404(job_id=job_id)
     
     # Create direct tracking URL with pre-filled parameters
     tracking_params = {
@@ -206,7 +207,18 @@ def receipt(request, job_id):
     
     return render(request, 'repairs/receipt.html', context)
 
-def track_repair(request):
+async def afind_tracked_job(job_id, phone_number):
+    """
+    The job `job_id` for a customer giving `phone_number`: jobs whose phone
+    was too long for a Customer are matched on the phone as typed at drop-off.
+    """
+    try:
+        return await archive.afind_job(job_id=job_id, customer__phone=normalize_phone(phone_number))
+    except RepairJob.DoesNotExist:
+        return await archive.afind_job(job_id=job_id, customer__isnull=True, phone_number=phone_number)
+
+@vary_on_headers('HX-Request')
+async def track_repair(request):
     """Public tracking page with customer verification and QR code auto-lookup"""
     repair_job = None
     form = TrackingForm()
@@ -219,7 +231,7 @@ def track_repair(request):
     if qr_job_id and qr_phone:
         # Auto-lookup from QR code parameters
         try:
-            repair_job = RepairJob.objects.get(job_id=qr_job_id.upper(), phone_number=qr_phone)
+            repair_job = await afind_tracked_job(qr_job_id.upper(), qr_phone)
             auto_lookup = True
             # Pre-fill the form with QR code data
             form = TrackingForm(initial={'job_id': qr_job_id, 'phone_number': qr_phone})
@@ -233,7 +245,7 @@ def track_repair(request):
             phone_number = form.cleaned_data['phone_number']
             
             try:
-                repair_job = RepairJob.objects.get(job_id=job_id, phone_number=phone_number)
+                repair_job = await afind_tracked_job(job_id, phone_number)
                 
                 if is_htmx_request(request):
                     # Return the tracking result for HTMX
@@ -243,12 +255,12 @@ def track_repair(request):
                         'shop_name': settings.SHOP_NAME,
                         'shop_phone': settings.SHOP_PHONE,
                     }
-                    return render(request, 'repairs/partials/tracking_result.html', context)
+                    return await arender(request, 'repairs/partials/tracking_result.html', context)
                     
             except RepairJob.DoesNotExist:
                 messages.error(request, 'Job ID and phone number combination not found. Please check your details.')
                 if is_htmx_request(request):
-                    return render(request, 'repairs/partials/messages.html')
+                    return await arender(request, 'repairs/partials/messages.html')
     
     context = {
         'form': form,
@@ -258,22 +270,78 @@ def track_repair(request):
         'shop_phone': settings.SHOP_PHONE,
     }
     
-    return render(request, 'repairs/track.html', context)
+    return await arender(request, 'repairs/track.html', context)
 
-@staff_member_required
-def dashboard(request):
-    """Admin dashboard for managing repair jobs with sorting - Hide completed jobs by default"""
-    search_query = request.GET.get('search', '')
-    status_filter = request.GET.get('status', '')
-    sort_by = request.GET.get('sort', '-created_at')  # Default sort by newest first
-    show_completed = request.GET.get('show_completed', 'false')  # New parameter to show completed jobs
+DASHBOARD_SORTS = [
+    'created_at', '-created_at', 
+    'job_id', '-job_id', 
+    'customer_name', '-customer_name', 
+    'status', '-status', 
+    'due_at', '-due_at',
+    'estimated_cost', '-estimated_cost',
+    'created_by__username', '-created_by__username',
+    'storage_days', '-storage_days',
+    'storage_fee', '-storage_fee',
+]
+
+# Sortable dashboard columns as (label, field); storage sorts highest fee first
+DASHBOARD_COLUMNS = [
+    ('Job', 'job_id'),
+    ('Customer', 'customer_name'),
+    ('Status', 'status'),
+    ('Due', 'due_at'),
+    ('Cost', 'estimated_cost'),
+    ('Storage', '-storage_fee'),
+    ('Date', 'created_at'),
+    ('Created By', 'created_by__username'),
+]
+
+def dashboard_columns(sort_by):
+    """Header label, next sort value on click and sort icon for each dashboard column"""
+    columns = []
+    for label, first_sort in DASHBOARD_COLUMNS:
+        field = first_sort.lstrip('-')
+        reverse_sort = first_sort[1:] if first_sort.startswith('-') else f'-{first_sort}'
+        if sort_by == field:
+            icon = 'fa-sort-up'
+        elif sort_by == f'-{field}':
+            icon = 'fa-sort-down'
+        else:
+            icon = 'fa-sort'
+        columns.append({
+            'label': label,
+            'sort': reverse_sort if sort_by == first_sort else first_sort,
+            'icon': icon,
+        })
+    return columns
+
+def get_dashboard_jobs(request):
+    """Helper function to filter and sort dashboard jobs from the query string"""
+    params = {
+        'search_query': request.GET.get('search', ''),
+        'status_filter': request.GET.get('status', ''),
+        'storage_filter': request.GET.get('storage', ''),
+        'due_filter': request.GET.get('due', ''),
+        # Newest first, or most overdue first in the work queue
+        'sort_by': request.GET.get('sort') or ('due_at' if request.GET.get('due') else '-created_at'),
+        'show_completed': request.GET.get('show_completed', 'false'),  # Show completed jobs
+    }
+    
+    params['sort_columns'] = dashboard_columns(params['sort_by'])
+    params['now'] = timezone.now()
+    params['today_end'] = due.due_today_end(params['now'])
     
-    jobs = RepairJob.objects.select_related('created_by').all()
+    # Photo counts in the same query instead of one per row
+    photo_count = RepairJobPhoto.objects.filter(repair_job=OuterRef('pk')).order_by().values('repair_job')
+    jobs = RepairJob.objects.select_related('created_by').with_storage().annotate(
+        photo_count=Coalesce(Subquery(photo_count.annotate(n=Count('id')).values('n')), 0),
+    )
     
     # Hide completed jobs by default unless specifically requested
-    if show_completed.lower() != 'true':
+    if params['show_completed'].lower() != 'true':
         jobs = jobs.exclude(status='COMPLETED')
     
+    search_query = params['search_query']
     if search_query:
         jobs = jobs.filter(
             Q(job_id__icontains=search_query) |
@@ -282,132 +350,149 @@ def dashboard(request):
             Q(created_by__username__icontains=search_query)
         )
     
-    if status_filter:
-        jobs = jobs.filter(status=status_filter)
-    
-    # Handle sorting with more options
-    valid_sorts = [
-        'created_at', '-created_at', 
-        'job_id', '-job_id', 
-        'customer_name', '-customer_name', 
-        'status', '-status', 
-        'estimated_repair_time', '-estimated_repair_time',
-        'estimated_cost', '-estimated_cost',
-        'created_by__username', '-created_by__username'
-    ]
-    if sort_by in valid_sorts:
-        jobs = jobs.order_by(sort_by)
+    if params['status_filter']:
+        jobs = jobs.filter(status=params['status_filter'])
+    
+    # Storage filters compare ready_notified_at directly so they use the index
+    if params['storage_filter'] == 'overdue':
+        jobs = jobs.overdue()
+    elif params['storage_filter'] == 'abandoned':
+        jobs = jobs.abandoned()
+    
+    # Work queue filters range over the status/due_at index
+    if params['due_filter'] == 'late':
+        jobs = jobs.past_due(params['now'])
+    elif params['due_filter'] == 'today':
+        jobs = jobs.due_by_today(params['now'])
+    
+    if params['sort_by'] in ('due_at', '-due_at'):
+        # Jobs without a due date (ready, completed, no estimate) go last either way
+        due_at = F('due_at')
+        jobs = jobs.order_by(due_at.desc(nulls_last=True) if params['sort_by'] == '-due_at' else due_at.asc(nulls_last=True), 'pk')
+    elif params['sort_by'] in DASHBOARD_SORTS:
+        jobs = jobs.order_by(params['sort_by'])
     else:
         jobs = jobs.order_by('-created_at')  # Default fallback
     
+    return jobs, params
+
+async def aget_page(paginator, page_number):
+    """paginator.get_page() for async views, reading the count and the page's rows concurrently"""
+    try:
+        number = max(int(page_number), 1)
+    except (TypeError, ValueError):
+        number = 1
+    offset = (number - 1) * paginator.per_page
+    count, rows = await asyncio.gather(
+        db_read(lambda: paginator.count),
+        db_read(list, paginator.object_list[offset:offset + paginator.per_page]),
+    )
+    
+    # The count is cached now; past the end get_page() falls back to the last page
+    page_obj = paginator.get_page(number)
+    if page_obj.number != number:
+        rows = await db_read(list, page_obj.object_list)
+    page_obj.object_list = rows
+    return page_obj
+
+def job_count_aggregates(show_completed):
+    """Stat card counts as conditional aggregates, read in a single query"""
+    open_jobs = Count('id', filter=~Q(status='COMPLETED'))
+    return {
+        'total_jobs': Count('id') if show_completed.lower() == 'true' else open_jobs,
+        'pending_jobs': open_jobs,
+        'ready_jobs': Count('id', filter=Q(status='READY')),
+        'completed_jobs': Count('id', filter=Q(status='COMPLETED')),
+    }
+
+@staff_member_required
+def dashboard(request):
+    """Admin dashboard for managing repair jobs with sorting - Hide completed jobs by default"""
+    jobs, params = get_dashboard_jobs(request)
+    show_completed = params['show_completed']
+    
     paginator = Paginator(jobs, 20)  # Show 20 jobs per page
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Calculate stats based on whether completed jobs are shown
-    if show_completed.lower() == 'true':
-        total_jobs = RepairJob.objects.count()
-        pending_jobs = RepairJob.objects.exclude(status='COMPLETED').count()
-    else:
-        total_jobs = RepairJob.objects.exclude(status='COMPLETED').count()
-        pending_jobs = total_jobs
-    
     context = {
         'page_obj': page_obj,
-        'search_query': search_query,
-        'status_filter': status_filter,
-        'sort_by': sort_by,
-        'show_completed': show_completed,
+        **params,
         'status_choices': RepairJob.STATUS_CHOICES,
-        'total_jobs': total_jobs,
-        'pending_jobs': pending_jobs,
-        'ready_jobs': RepairJob.objects.filter(status='READY').count(),
-        'completed_jobs': RepairJob.objects.filter(status='COMPLETED').count(),
+        **RepairJob.objects.aggregate(**job_count_aggregates(show_completed)),
+        'archived_jobs': archive.search_archive(params['search_query']) if show_completed.lower() == 'true' else None,
     }
     
     return render(request, 'repairs/dashboard.html', context)
 
 @staff_member_required
-def dashboard_content(request):
+async def dashboard_content(request):
     """HTMX endpoint for dashboard content updates"""
-    search_query = request.GET.get('search', '')
-    status_filter = request.GET.get('status', '')
-    sort_by = request.GET.get('sort', '-created_at')
-    show_completed = request.GET.get('show_completed', 'false')
-    
-    jobs = RepairJob.objects.select_related('created_by').all()
-    
-    # Hide completed jobs by default unless specifically requested
-    if show_completed.lower() != 'true':
-        jobs = jobs.exclude(status='COMPLETED')
-    
-    if search_query:
-        jobs = jobs.filter(
-            Q(job_id__icontains=search_query) |
-            Q(customer_name__icontains=search_query) |
-            Q(phone_number__icontains=search_query) |
-            Q(created_by__username__icontains=search_query)
-        )
-    
-    if status_filter:
-        jobs = jobs.filter(status=status_filter)
-    
-    # Handle sorting
-    valid_sorts = [
-        'created_at', '-created_at', 
-        'job_id', '-job_id', 
-        'customer_name', '-customer_name', 
-        'status', '-status', 
-        'estimated_repair_time', '-estimated_repair_time',
-        'estimated_cost', '-estimated_cost',
-        'created_by__username', '-created_by__username'
-    ]
-    if sort_by in valid_sorts:
-        jobs = jobs.order_by(sort_by)
-    else:
-        jobs = jobs.order_by('-created_at')
-    
-    paginator = Paginator(jobs, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
-        'page_obj': page_obj,
-        'search_query': search_query,
-        'status_filter': status_filter,
-        'sort_by': sort_by,
-        'show_completed': show_completed,
-        'status_choices': RepairJob.STATUS_CHOICES,
-    }
+    jobs, params = get_dashboard_jobs(request)
+    show_completed = params['show_completed'].lower() == 'true'
+    page_number = request.GET.get('page') or '1'
+    
+    async def jobs_table():
+        # The page, the total count and the archive search are independent reads
+        reads = [aget_page(Paginator(jobs, 20), page_number)]
+        if show_completed:
+            reads.append(db_read(list, archive.search_archive(params['search_query'])))
+        page_obj, *archived_jobs = await asyncio.gather(*reads)
+        
+        context = {
+            'page_obj': page_obj,
+            **params,
+            'status_choices': RepairJob.STATUS_CHOICES,
+            'archived_jobs': archived_jobs[0] if archived_jobs else None,
+        }
+        return await arender_to_string(request, 'repairs/partials/jobs_table.html', context)
     
-    return render(request, 'repairs/partials/jobs_table.html', context)
+    # Debounced keyups can send the same search twice; both get one table
+    html = await single_flight.run(
+        'dashboard_content', jobs_table, page=page_number, show_completed=show_completed, reads=current_reporting_alias(),
+        **{name: params[name] for name in ('search_query', 'status_filter', 'storage_filter', 'due_filter', 'sort_by')},
+    )
+    return HttpResponse(html)
 
+@session_read_only
 @staff_member_required
-def dashboard_stats(request):
+@reporting_reads
+async def dashboard_stats(request):
     """HTMX endpoint for dashboard stats updates"""
     show_completed = request.GET.get('show_completed', 'false')
     
-    # Calculate stats based on whether completed jobs are shown
-    if show_completed.lower() == 'true':
-        total_jobs = RepairJob.objects.count()
-        pending_jobs = RepairJob.objects.exclude(status='COMPLETED').count()
-    else:
-        total_jobs = RepairJob.objects.exclude(status='COMPLETED').count()
-        pending_jobs = total_jobs
+    async def stats_cards():
+        # Stats depend on whether completed jobs are shown
+        context = await RepairJob.objects.aaggregate(**job_count_aggregates(show_completed))
+        return await arender_to_string(request, 'repairs/partials/stats_cards.html', context)
     
-    context = {
-        'total_jobs': total_jobs,
-        'pending_jobs': pending_jobs,
-        'ready_jobs': RepairJob.objects.filter(status='READY').count(),
-        'completed_jobs': RepairJob.objects.filter(status='COMPLETED').count(),
+    # Every open dashboard tab polls this with the same parameters
+    html = await single_flight.run(
+        'dashboard_stats', stats_cards, show_completed=show_completed.lower() == 'true', reads=current_reporting_alias(),
+    )
+    return HttpResponse(html)
+
+def job_detail_context(repair_job, **context):
+    """Context of job_detail.html: the job, the first page of its photos and the customer's other jobs"""
+    photos, next_offset, photo_count = gallery.first_page(repair_job)
+    return {
+        'repair_job': repair_job,
+        'photos': photos,
+        'photo_count': photo_count,
+        'next_photo_offset': next_offset,
+        'customer_history': archive.customer_history(repair_job),
+        **context,
     }
-    
-    return render(request, 'repairs/partials/stats_cards.html', context)
 
 @staff_member_required
+@vary_on_headers('HX-Request')
 def job_detail(request, job_id):
     """Detailed view of a repair job with update form"""
-    repair_job = get_object_or_404(RepairJob, job_id=job_id)
+    repair_job = archive.get_job_or_404(job_id=job_id)
+    
+    if repair_job.is_archived:
+        # Archived jobs are read-only
+        return render(request, 'repairs/job_detail.html', job_detail_context(repair_job))
     
     if request.method == 'POST':
         # Pass request.FILES to the form
@@ -415,7 +500,7 @@ def job_detail(request, job_id):
         if form.is_valid():
             form.save()
             
-            # Handle additional photo uploads
+            # Photos sent with the form when JavaScript is unavailable
             photos = request.FILES.getlist('additional_photos')
             photo_count = 0
             for photo in photos:
@@ -433,11 +518,7 @@ def job_detail(request, job_id):
             if is_htmx_request(request):
                 # Return updated form and sidebar for HTMX
                 messages.success(request, success_message)
-                context = {
-                    'repair_job': repair_job,
-                    'form': AdminStatusUpdateForm(instance=repair_job),
-                    'photos': repair_job.photos.all(),
-                }
+                context = job_detail_context(repair_job, form=AdminStatusUpdateForm(instance=repair_job))
                 # To refresh the whole detail page content, we can re-render the main template part
                 return render(request, 'repairs/job_detail.html', context)
             else:
@@ -449,19 +530,35 @@ def job_detail(request, job_id):
                 context = {
                     'repair_job': repair_job,
                     'form': form,
-                    'photos': repair_job.photos.all(),
                 }
                 return render(request, 'repairs/partials/job_update_form.html', context)
     else:
         form = AdminStatusUpdateForm(instance=repair_job)
     
-    context = {
-        'repair_job': repair_job,
-        'form': form,
-        'photos': repair_job.photos.all(),
-    }
-    
-    return render(request, 'repairs/job_detail.html', context)
+    return render(request, 'repairs/job_detail.html', job_detail_context(repair_job, form=form))
+
+@session_read_only
+@staff_member_required
+def job_photos(request, job_id):
+    """HTMX endpoint with the next page of a job's photo grid, loaded as it is scrolled into view"""
+    repair_job = archive.get_job_or_404(job_id=job_id)
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+    except ValueError:
+        offset = 0
+    photos, next_offset = gallery.photo_page(repair_job, offset)
+    context = {'repair_job': repair_job, 'photos': photos, 'next_photo_offset': next_offset}
+    return render(request, 'repairs/partials/photo_grid.html', context)
+
+@session_read_only
+@staff_member_required
+def job_photo(request, job_id, index):
+    """One photo of a job by its position, for the modal when it is not in the grid yet"""
+    repair_job = archive.get_job_or_404(job_id=job_id)
+    photos, _ = gallery.photo_page(repair_job, index, per_page=1)
+    if not photos:
+        return JsonResponse({'error': 'No such photo'}, status=404)
+    return JsonResponse(photos[0])
 
 @staff_member_required
 def job_quick_action(request, job_id):
@@ -483,15 +580,61 @@ def job_quick_action(request, job_id):
         
         # We need to re-render the whole job detail view to update everything
         form = AdminStatusUpdateForm(instance=repair_job)
-        context = {
-            'repair_job': repair_job,
-            'form': form,
-            'photos': repair_job.photos.all(),
-        }
-        return render(request, 'repairs/job_detail.html', context)
+        return render(request, 'repairs/job_detail.html', job_detail_context(repair_job, form=form))
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+def board_context(**context):
+    now = timezone.now()
+    return {'now': now, 'today_end': due.due_today_end(now), 'completed_days': board.BOARD_COMPLETED_DAYS, **context}
+
+@staff_member_required
+def status_board(request):
+    """Status board for the workshop screen: one column per status"""
+    return render(request, 'repairs/board.html', board_context(columns=board.board_columns()))
+
+@session_read_only
+@staff_member_required
+def status_board_content(request):
+    """HTMX endpoint refreshing every column of the status board"""
+    return render(request, 'repairs/partials/board_columns.html', board_context(columns=board.board_columns()))
+
+@session_read_only
+@staff_member_required
+def status_board_cards(request):
+    """HTMX endpoint with the next cards of one column, loaded as the column is scrolled"""
+    status = request.GET.get('status')
+    if status not in dict(RepairJob.STATUS_CHOICES):
+        return JsonResponse({'error': 'Unknown status'}, status=400)
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+    except ValueError:
+        offset = 0
+    jobs, next_offset = board.column_page(status, offset)
+    context = board_context(jobs=jobs, status=status, next_offset=next_offset)
+    return render(request, 'repairs/partials/board_cards.html', context)
+
+@staff_member_required
+@require_http_methods(["POST"])
+def job_status_update(request, job_id):
+    """Status-only update, for moving a card between status board columns"""
+    status = request.POST.get('status')
+    if status not in dict(RepairJob.STATUS_CHOICES):
+        return JsonResponse({'error': 'Unknown status'}, status=400)
+    
+    # Only what save() needs to keep the customer link and due date right
+    repair_job = get_object_or_404(
+        RepairJob.objects.only('job_id', 'phone_number', 'status', 'estimated_repair_time', 'due_at'),
+        job_id=job_id,
+    )
+    if repair_job.status != status:
+        repair_job.status = status
+        repair_job.save(update_fields=['status', 'updated_at'])
+    
+    response = HttpResponse(status=204)
+    response['HX-Trigger'] = 'board-changed'
+    return response
+
 @staff_member_required
 def job_delete_confirm(request, job_id):
     """HTMX endpoint for job deletion confirmation modal"""
@@ -507,6 +650,7 @@ def job_delete_confirm(request, job_id):
 
 @staff_member_required
 @require_http_methods(["DELETE"])
+@vary_on_headers('HX-Request')
 def job_delete(request, job_id):
     """Delete a repair job and all associated data"""
     repair_job = get_object_or_404(RepairJob, job_id=job_id)
@@ -514,30 +658,21 @@ def job_delete(request, job_id):
     try:
         # Store info for success message
         customer_name = repair_job.customer_name
-        photo_count = repair_job.photos.count()
-        
-        # Get all photo files for deletion
-        photo_files = []
-        for photo in repair_job.photos.all():
-            if photo.photo and os.path.exists(photo.photo.path):
-                photo_files.append(photo.photo.path)
+        photos = list(repair_job.photos.all())
+        photo_count = len(photos)
         
-        # Delete the repair job (this will cascade delete photos due to ForeignKey)
-        repair_job.delete()
-        
-        # Delete physical photo files
-        deleted_files = 0
-        for file_path in photo_files:
-            try:
-                os.remove(file_path)
-                deleted_files += 1
-            except OSError:
-                pass  # File might already be deleted or inaccessible
+        with transaction.atomic():
+            # Delete the repair job (this will cascade delete photos due to ForeignKey)
+            repair_job.delete()
+            tasks.refresh_rollup_days([timezone.localtime(repair_job.created_at).date()])
+            
+            # Files shared with other photos stay until their last reference goes
+            blobs.release_photos(photos)
         
         # Create success message
         success_message = f'Job {job_id} ({customer_name}) has been permanently deleted.'
         if photo_count > 0:
-            success_message += f' Removed {photo_count} photo(s) and {deleted_files} file(s).'
+            success_message += f' Removed {photo_count} photo(s).'
         
         messages.success(request, success_message)
         
@@ -560,9 +695,8 @@ def job_delete(request, job_id):
         else:
             return redirect('job_detail', job_id=job_id)
 
-@staff_member_required
-def total_summary(request):
-    """Enhanced total summary page with date filtering"""
+def parse_summary_filter(request):
+    """Filter type, requested dates and the resulting date range from the summary query string"""
     filter_type = request.GET.get('filter', 'all')
     start_date_str = request.GET.get('start_date')
     end_date_str = request.GET.get('end_date')
@@ -583,6 +717,13 @@ def total_summary(request):
     
     # Get date range based on filter type
     filter_start, filter_end = get_date_range(filter_type, start_date, end_date)
+    return filter_type, start_date, end_date, filter_start, filter_end
+
+@staff_member_required
+@reporting_reads
+def total_summary(request):
+    """Enhanced total summary page with date filtering"""
+    filter_type, start_date, end_date, filter_start, filter_end = parse_summary_filter(request)
     
     # Set default dates for display
     if filter_start and filter_end:
@@ -607,113 +748,68 @@ def total_summary(request):
     
     return render(request, 'repairs/total_summary.html', context)
 
+@session_read_only
 @staff_member_required
-def total_summary_filtered(request):
+@reporting_reads
+async def total_summary_filtered(request):
     """HTMX endpoint for filtered summary data"""
-    filter_type = request.GET.get('filter', 'all')
-    start_date_str = request.GET.get('start_date')
-    end_date_str = request.GET.get('end_date')
-    
-    # Parse custom dates if provided
-    start_date = None
-    end_date = None
-    if start_date_str:
-        try:
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
-    if end_date_str:
-        try:
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-        except ValueError:
-            pass
-    
-    # Get date range based on filter type
-    filter_start, filter_end = get_date_range(filter_type, start_date, end_date)
-    
-    # Base queryset
-    jobs = RepairJob.objects.all()
-    
-    # Apply date filtering
-    if filter_start and filter_end:
-        jobs = jobs.filter(created_at__date__gte=filter_start, created_at__date__lte=filter_end)
-    
-    # Calculate totals
-    jobs_with_cost = jobs.filter(estimated_cost__isnull=False)
-    total_cost = jobs_with_cost.aggregate(Sum('estimated_cost'))['estimated_cost__sum'] or 0
-    jobs_with_cost_count = jobs_with_cost.count()
-    total_jobs_count = jobs.count()
-    
-    # Calculate average cost
-    average_cost = jobs_with_cost.aggregate(Avg('estimated_cost'))['estimated_cost__avg'] or 0
-    
-    # Daily breakdown for shorter periods
-    daily_breakdown = None
-    if filter_start and filter_end and (filter_end - filter_start).days <= 31:
-        daily_data = jobs.filter(estimated_cost__isnull=False).extra({
-            'date': 'DATE(created_at)'
-        }).values('date').annotate(
-            total=Sum('estimated_cost'),
-            count=Count('id')
-        ).order_by('date')
+    filter_type, start_date, end_date, filter_start, filter_end = parse_summary_filter(request)
+    
+    # Totals cover active and archived jobs; the daily breakdown only for shorter periods
+    show_daily = filter_start and filter_end and (filter_end - filter_start).days <= 31
+    
+    async def summary_content():
+        # Bikes currently in storage (active READY jobs) are counted alongside, in one aggregate
+        summary, storage = await asyncio.gather(
+            reports.aperiod_summary(filter_start, filter_end, daily=show_daily),
+            RepairJob.objects.filter(status='READY').with_storage().aaggregate(
+                fees_outstanding=Sum('storage_fee'),
+                overdue_count=Count('id', filter=Q(is_overdue=True)),
+                abandoned_count=Count('id', filter=Q(is_abandoned=True)),
+            ),
+        )
         
-        daily_breakdown = []
-        for item in daily_data:
-            daily_breakdown.append({
-                'date': datetime.strptime(item['date'], '%Y-%m-%d').date(),
-                'total': item['total'],
-                'count': item['count']
-            })
-    
-    # High-value jobs (€100+) in the period
-    high_value_jobs = jobs.filter(
-        estimated_cost__gte=100
-    ).order_by('-estimated_cost')[:10]
-    
-    # Additional statistics
-    cost_values = list(jobs_with_cost.values_list('estimated_cost', flat=True))
-    highest_job_cost = max(cost_values) if cost_values else 0
-    lowest_job_cost = min(cost_values) if cost_values else 0
-    median_cost = statistics.median(cost_values) if cost_values else 0
-    
-    context = {
-        'filter_type': filter_type,
-        'start_date': filter_start or start_date,
-        'end_date': filter_end or end_date,
-        'total_cost': total_cost,
-        'jobs_with_cost_count': jobs_with_cost_count,
-        'total_jobs_count': total_jobs_count,
-        'average_cost': average_cost,
-        'daily_breakdown': daily_breakdown,
-        'high_value_jobs': high_value_jobs,
-        'highest_job_cost': highest_job_cost,
-        'lowest_job_cost': lowest_job_cost,
-        'median_cost': median_cost,
-    }
+        context = {
+            'filter_type': filter_type,
+            'start_date': filter_start or start_date,
+            'end_date': filter_end or end_date,
+            **summary,
+            'storage_fees_outstanding': storage['fees_outstanding'] or 0,
+            'overdue_count': storage['overdue_count'],
+            'abandoned_count': storage['abandoned_count'],
+        }
+        return await arender_to_string(request, 'repairs/partials/summary_content.html', context)
     
-    return render(request, 'repairs/partials/summary_content.html', context)
+    # Summary tabs left open on the same period poll together
+    html = await single_flight.run(
+        'total_summary_filtered', summary_content, filter_type=filter_type,
+        start=filter_start or start_date, end=filter_end or end_date, filter_start=filter_start, filter_end=filter_end,
+        reads=current_reporting_alias(),
+    )
+    return HttpResponse(html)
 
-def send_sms_notification(phone_number, message):
-    """Send SMS using sms-gate.app"""
-    if not settings.SMS_GATEWAY_USERNAME or not settings.SMS_GATEWAY_PASSWORD:
-        return False, "SMS credentials not configured"
-    
-    headers = {'Content-Type': 'application/json'}
-    data = {'message': message, 'phoneNumbers': [phone_number]}
+@staff_member_required
+@reporting_reads
+def summary_report(request):
+    """Printable PDF revenue report for the summary filter, streamed from disk"""
+    filter_type, start_date, end_date, filter_start, filter_end = parse_summary_filter(request)
+    report, filename = reports.period_report(filter_start, filter_end)
+    return FileResponse(report, as_attachment=True, filename=filename, content_type='application/pdf')
+
+@staff_member_required
+@reporting_reads
+def photo_archive(request):
+    """ZIP of one job's photos (?job_id=) or of the jobs in the summary filter, streamed as it is built"""
+    job_id = request.GET.get('job_id')
+    if job_id:
+        job = archive.get_job_or_404(job_id=job_id)
+        photos = photo_zip.job_photos(job)
+        filename = photo_zip.zip_filename(job_id=job.job_id)
+    else:
+        filter_type, start_date, end_date, filter_start, filter_end = parse_summary_filter(request)
+        photos = photo_zip.period_photos(filter_start, filter_end)
+        filename = photo_zip.zip_filename(start=filter_start, end=filter_end)
     
-    try:
-        response = requests.post(
-            settings.SMS_GATEWAY_URL,
-            headers=headers,
-            auth=(settings.SMS_GATEWAY_USERNAME, settings.SMS_GATEWAY_PASSWORD),
-            json=data,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            return True, "SMS sent successfully"
-        else:
-            return False, f"SMS failed: {response.status_code}"
-            
-    except Exception as e:
-        return False, f"SMS error: {str(e)}"
+    response = StreamingHttpResponse(photo_zip.stream_zip(photos), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response